@@ -26,7 +26,7 @@ from django.utils.safestring import mark_safe
 from django.utils.timezone import now
 from django.views.decorators.csrf import csrf_exempt
 from django.template.loader import render_to_string
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
 from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import ugettext_lazy as _
 
@@ -57,7 +57,6 @@ from social_core.backends.utils import load_backends
 from oauth2_provider.models import get_access_token_model
 
 import pytz
-from wsgiref.util import FileWrapper
 
 # AWX
 from awx.main.tasks import send_notifications, handle_ha_toplogy_changes
@@ -77,6 +76,7 @@ from awx.main.utils import (
 from awx.main.utils.encryption import encrypt_value
 from awx.main.utils.filters import SmartFilter
 from awx.main.utils.insights import filter_insights_api_response
+from awx.main.utils.inventory_script import open_script_data
 from awx.main.redact import UriCleaner
 from awx.api.permissions import (
     JobTemplateCallbackPermission,
@@ -2655,6 +2655,10 @@ class InventoryScriptView(RetrieveAPIView):
                 hosts_q['enabled'] = True
             host = get_object_or_404(obj.hosts, **hosts_q)
             return Response(host.variables_dict)
+        if request.accepted_renderer.format == 'json':
+            cached = open_script_data(obj, hostvars=hostvars, towervars=towervars, show_all=show_all)
+            if cached is not None:
+                return FileResponse(cached, content_type='application/json')
         return Response(obj.get_script_data(
             hostvars=hostvars,
             towervars=towervars,
@@ -4730,28 +4734,19 @@ def redact_ansi(line):
 
 
 class StdoutFilter(object):
+    '''
+    Iterable which applies the registered functions to each chunk of
+    unicode stdout and yields it utf-8 encoded, suitable for a
+    StreamingHttpResponse.
+    '''
 
-    def __init__(self, fileobj):
+    def __init__(self, chunks):
         self._functions = []
-        self.fileobj = fileobj
-        self.extra_data = ''
-        if hasattr(fileobj, 'close'):
-            self.close = fileobj.close
-
-    def read(self, size=-1):
-        data = self.extra_data
-        while size > 0 and len(data) < size:
-            line = self.fileobj.readline(size)
-            if not line:
-                break
-            line = self.process_line(line)
-            data += line
-        if size > 0 and len(data) > size:
-            self.extra_data = data[size:]
-            data = data[:size]
-        else:
-            self.extra_data = ''
-        return data
+        self.chunks = chunks
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield self.process_line(chunk).encode('utf-8')
 
     def register(self, func):
         self._functions.append(func)
@@ -4816,13 +4811,12 @@ class UnifiedJobStdout(RetrieveAPIView):
                     pk=unified_job.id,
                     suffix='.ansi' if target_format == 'ansi_download' else ''
                 )
-                content_fd = unified_job.result_stdout_raw_handle(enforce_max_bytes=False)
-                redactor = StdoutFilter(content_fd)
+                redactor = StdoutFilter(unified_job.result_stdout_raw_chunks())
                 if target_format == 'txt_download':
                     redactor.register(redact_ansi)
                 if type(unified_job) == ProjectUpdate:
                     redactor.register(UriCleaner.remove_sensitive)
-                response = HttpResponse(FileWrapper(redactor), content_type='text/plain')
+                response = StreamingHttpResponse(redactor, content_type='text/plain')
                 response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
                 return response
             else:
@@ -1,6 +1,7 @@
 # Python
 from collections import namedtuple
 import contextlib
+import copy
 import logging
 import sys
 import threading
@@ -57,7 +58,14 @@ SETTING_CACHE_TIMEOUT = 60
 # Flag indicating whether to store field default values in the cache.
 SETTING_CACHE_DEFAULTS = True
 
-__all__ = ['SettingsWrapper', 'get_settings_to_cache', 'SETTING_CACHE_NOTSET']
+# Cache key of the counter bumped whenever settings change.
+SETTING_CACHE_VERSION_KEY = '_awx_conf_settings_version'
+
+# Check the settings version in the cache at most every this many seconds.
+SETTING_VERSION_CHECK_INTERVAL = 1
+
+__all__ = ['SettingsWrapper', 'get_settings_to_cache', 'bump_settings_version',
+           'SETTING_CACHE_NOTSET']
 
 
 @contextlib.contextmanager
@@ -203,6 +211,24 @@ def get_cache_value(value):
     return value
 
 
+def bump_settings_version(cache=None):
+    '''
+    Mark settings as changed, so every process drops its local snapshot of
+    them on its next check of the version.
+    '''
+    cache = cache or django_cache
+    try:
+        cache.incr(SETTING_CACHE_VERSION_KEY)
+    except ValueError:
+        # The counter was never set or has been evicted; start from a value
+        # that no process can have taken a snapshot of.
+        cache.set(SETTING_CACHE_VERSION_KEY, int(time.time() * 1000), None)
+    settings_wrapper = getattr(settings, '_awx_conf_settings', None)
+    if settings_wrapper:
+        # Let this process see the change right away.
+        settings_wrapper.__dict__['_awx_conf_snapshot_check'] = 0
+
+
 class SettingsWrapper(UserSettingsHolder):
 
     @classmethod
@@ -238,6 +264,10 @@ class SettingsWrapper(UserSettingsHolder):
         self.__dict__['_awx_conf_preload_expires'] = None
         self.__dict__['_awx_conf_preload_lock'] = threading.RLock()
         self.__dict__['_awx_conf_init_readonly'] = False
+        self.__dict__['_awx_conf_snapshot'] = {}
+        self.__dict__['_awx_conf_snapshot_version'] = None
+        self.__dict__['_awx_conf_snapshot_expires'] = 0
+        self.__dict__['_awx_conf_snapshot_check'] = 0
         self.__dict__['cache'] = EncryptedCacheProxy(cache, registry)
         self.__dict__['registry'] = registry
 
@@ -388,6 +418,41 @@ class SettingsWrapper(UserSettingsHolder):
                     value, name, exc_info=True)
         return empty
 
+    def _get_snapshot(self):
+        now = time.time()
+        if now < self._awx_conf_snapshot_check:
+            return self._awx_conf_snapshot
+        with self._awx_conf_preload_lock:
+            cache = self.cache.cache
+            version = cache.get(SETTING_CACHE_VERSION_KEY)
+            if version is None:
+                # A flushed cache does not mean settings have changed; put
+                # back the version of our snapshot (or start a new one).
+                cache.add(SETTING_CACHE_VERSION_KEY, self._awx_conf_snapshot_version or int(now * 1000), None)
+                version = cache.get(SETTING_CACHE_VERSION_KEY)
+            # Drop all values at once when settings change, and after the
+            # cache timeout to pick up changes made on other cluster nodes.
+            if version != self._awx_conf_snapshot_version or now >= self._awx_conf_snapshot_expires:
+                self.__dict__['_awx_conf_snapshot'] = {}
+                self.__dict__['_awx_conf_snapshot_version'] = version
+                self.__dict__['_awx_conf_snapshot_expires'] = now + SETTING_CACHE_TIMEOUT
+            self.__dict__['_awx_conf_snapshot_check'] = now + SETTING_VERSION_CHECK_INTERVAL
+            return self._awx_conf_snapshot
+
+    def _get_snapshot_value(self, name):
+        snapshot = self._get_snapshot()
+        try:
+            value = snapshot[name]
+        except KeyError:
+            value = empty
+            with _log_database_error():
+                value = self._get_local(name)
+                snapshot[name] = value
+        if isinstance(value, (list, dict)):
+            # Callers may modify the value they get.
+            value = copy.deepcopy(value)
+        return value
+
     def _get_default(self, name):
         return getattr(self.default_settings, name)
 
@@ -398,8 +463,7 @@ class SettingsWrapper(UserSettingsHolder):
     def __getattr__(self, name):
         value = empty
         if name in self.all_supported_settings:
-            with _log_database_error():
-                value = self._get_local(name)
+            value = self._get_snapshot_value(name)
         if value is not empty:
             return value
         return self._get_default(name)
@@ -12,6 +12,7 @@ from django.dispatch import receiver
 import awx.main.signals
 from awx.conf import settings_registry
 from awx.conf.models import Setting
+from awx.conf.settings import bump_settings_version
 from awx.conf.serializers import SettingSerializer
 
 logger = logging.getLogger('awx.conf.signals')
@@ -31,6 +32,7 @@ def handle_setting_change(key, for_delete=False):
     # NOTE: This block is probably duplicated.
     cache_keys = set([Setting.get_cache_key(k) for k in setting_keys])
     cache.delete_many(cache_keys)
+    bump_settings_version()
 
     # Send setting_changed signal with new value for each setting.
     for setting_key in setting_keys:
@@ -15,7 +15,8 @@ import pytest
 import six
 
 from awx.conf import models, fields
-from awx.conf.settings import SettingsWrapper, EncryptedCacheProxy, SETTING_CACHE_NOTSET
+from awx.conf.settings import (SettingsWrapper, EncryptedCacheProxy, SETTING_CACHE_NOTSET,
+                               bump_settings_version)
 from awx.conf.registry import SettingsRegistry
 
 from awx.main.utils import encrypt_field, decrypt_field
@@ -404,6 +405,66 @@ def test_settings_use_cache(settings, mocker):
     getattr(settings, 'AWX_VAR')
 
 
+def test_settings_use_local_snapshot(settings, mocker):
+    "settings are read from the cache once per settings version"
+    settings.registry.register(
+        'AWX_SOME_SETTING',
+        field_class=fields.CharField,
+        category=_('System'),
+        category_slug='system',
+        default='DEFAULT'
+    )
+
+    now = time.time()
+    settings_to_cache = mocker.Mock(**{'order_by.return_value': []})
+    with mocker.patch('awx.conf.models.Setting.objects.filter', return_value=settings_to_cache):
+        assert settings.AWX_SOME_SETTING == 'DEFAULT'
+        settings.cache.set('AWX_SOME_SETTING', 'CHANGED')
+        assert settings.AWX_SOME_SETTING == 'DEFAULT'
+
+        with mocker.patch('awx.conf.settings.time.time', return_value=now + 2):
+            assert settings.AWX_SOME_SETTING == 'DEFAULT'
+        bump_settings_version(cache=settings.cache.cache)
+        with mocker.patch('awx.conf.settings.time.time', return_value=now + 4):
+            assert settings.AWX_SOME_SETTING == 'CHANGED'
+
+
+def test_settings_snapshot_survives_cache_flush(settings, mocker):
+    settings.registry.register(
+        'AWX_SOME_SETTING',
+        field_class=fields.CharField,
+        category=_('System'),
+        category_slug='system',
+        default='DEFAULT'
+    )
+
+    now = time.time()
+    settings_to_cache = mocker.Mock(**{'order_by.return_value': []})
+    with mocker.patch('awx.conf.models.Setting.objects.filter', return_value=settings_to_cache):
+        assert settings.AWX_SOME_SETTING == 'DEFAULT'
+    version = settings.cache.get('_awx_conf_settings_version')
+    settings.cache.clear()
+    # Will fail test if database is used
+    with mocker.patch('awx.conf.settings.time.time', return_value=now + 2):
+        assert settings.AWX_SOME_SETTING == 'DEFAULT'
+    assert settings.cache.get('_awx_conf_settings_version') == version
+
+
+def test_settings_snapshot_values_are_copied(settings):
+    settings.registry.register(
+        'AWX_SOME_LIST',
+        field_class=fields.StringListField,
+        category=_('System'),
+        category_slug='system',
+        default=['a']
+    )
+
+    settings.cache.set('AWX_SOME_LIST', ['a'])
+    settings.cache.set('_awx_conf_preload_expires', 100)
+    settings.AWX_SOME_LIST.append('b')
+    assert settings.AWX_SOME_LIST == ['a']
+
+
 def test_settings_use_an_encrypted_cache(settings, mocker):
     settings.registry.register(
         'AWX_ENCRYPTED',
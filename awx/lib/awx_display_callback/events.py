@@ -24,7 +24,9 @@ import datetime
 import json
 import multiprocessing
 import os
+import socket
 import stat
+import struct
 import threading
 import uuid
 import memcache
@@ -56,6 +58,57 @@ class IsolatedFileWrite:
         os.rename(write_location, dropoff_location)
 
 
+class SocketEventWrite(object):
+    '''
+    Stand-in class that sends partial event data to the process running the
+    job over the Unix socket it listens on (see
+    awx.main.utils.callback_socket), falling back to memcache whenever that
+    fails.
+    '''
+
+    def __init__(self, path, fallback):
+        self.path = path
+        self.fallback = fallback
+        self.pid = None
+
+    def _send(self, record):
+        if self.sock is None:
+            if self.failed:
+                raise socket.error('not connected to {}'.format(self.path))
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except socket.error:
+                sock.close()
+                self.failed = True
+                raise
+            self.sock = sock
+        try:
+            self.sock.sendall(struct.pack('!I', len(record)) + record)
+        except socket.error:
+            self.sock.close()
+            self.sock = None
+            self.failed = True
+            raise
+
+    def set(self, key, value):
+        if self.pid != os.getpid():
+            # Never share the connection (or a lock another thread may have
+            # held while forking) with the process we were forked from.
+            self.pid = os.getpid()
+            self.lock = threading.Lock()
+            self.sock = None
+            self.failed = False
+        record = json.dumps(value)
+        if not isinstance(record, bytes):
+            record = record.encode('utf-8')
+        try:
+            with self.lock:
+                self._send(record)
+        except socket.error:
+            self.fallback.set(key, value)
+
+
 class EventContext(object):
     '''
     Store global and local (per thread/process) data associated with callback
@@ -69,6 +122,8 @@ class EventContext(object):
             self.cache = IsolatedFileWrite()
         else:
             self.cache = memcache.Client([cache_actual], debug=0)
+            if os.getenv('AWX_CALLBACK_SOCKET', False):
+                self.cache = SocketEventWrite(os.getenv('AWX_CALLBACK_SOCKET'), self.cache)
 
     def add_local(self, **kwargs):
         if not hasattr(self, '_local'):
@@ -1,9 +1,13 @@
 import json
 import logging
+import time
+from collections import OrderedDict
 
 from channels import Group
 from channels.auth import channel_session_user_from_http, channel_session_user
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.serializers.json import DjangoJSONEncoder
 
 
@@ -35,9 +39,41 @@ def ws_disconnect(message):
     discard_groups(message)
 
 
+def access_cache_key(user_id, group_name, oid):
+    return 'awx_ws_access_{}_{}_{}'.format(user_id, group_name, oid)
+
+
+def accessible_ids(user, group_name, oids):
+    '''
+    Return the subset of object ids `oids` of `group_name` that `user` may
+    subscribe to.  Ids not checked within the last
+    WEBSOCKET_ACCESS_CACHE_TIMEOUT seconds are checked with one query.
+    '''
+    from awx.main.access import consumer_access
+    access_cls = consumer_access(group_name)
+    if access_cls is None:
+        return set(oids)
+    keys = {}
+    for oid in oids:
+        try:
+            keys[oid] = access_cache_key(user.id, group_name, int(oid))
+        except (TypeError, ValueError):
+            pass
+    cached = cache.get_many(keys.values())
+    allowed = set(oid for oid, key in keys.items() if cached.get(key) is True)
+    unchecked = [oid for oid, key in keys.items() if key not in cached]
+    if unchecked:
+        pks = set(access_cls(user).get_queryset().filter(
+            pk__in=set(int(oid) for oid in unchecked)
+        ).values_list('pk', flat=True))
+        cache.set_many(dict((keys[oid], int(oid) in pks) for oid in unchecked),
+                       settings.WEBSOCKET_ACCESS_CACHE_TIMEOUT)
+        allowed.update(oid for oid in unchecked if int(oid) in pks)
+    return allowed
+
+
 @channel_session_user
 def ws_receive(message):
-    from awx.main.access import consumer_access
     user = message.user
     raw_data = message.content['text']
     data = json.loads(raw_data)
@@ -48,15 +84,13 @@ def ws_receive(message):
         current_groups = set(message.channel_session.pop('groups') if 'groups' in message.channel_session else [])
         for group_name,v in groups.items():
             if type(v) is list:
+                allowed = accessible_ids(user, group_name, v)
                 for oid in v:
                     name = '{}-{}'.format(group_name, oid)
-                    access_cls = consumer_access(group_name)
-                    if access_cls is not None:
-                        user_access = access_cls(user)
-                        if not user_access.get_queryset().filter(pk=oid).exists():
-                            message.reply_channel.send({"text": json.dumps(
-                                {"error": "access denied to channel {0} for resource id {1}".format(group_name, oid)})})
-                            continue
+                    if oid not in allowed:
+                        message.reply_channel.send({"text": json.dumps(
+                            {"error": "access denied to channel {0} for resource id {1}".format(group_name, oid)})})
+                        continue
                     current_groups.add(name)
                     Group(name).add(message.reply_channel)
             else:
@@ -70,3 +104,117 @@ def emit_channel_notification(group, payload):
         Group(group).send({"text": json.dumps(payload, cls=DjangoJSONEncoder)})
     except ValueError:
         logger.error("Invalid payload emitting channel {} on topic: {}".format(group, payload))
+
+
+class EventFrameBatcher(object):
+    '''
+    Per-group holding area for websocket event payloads.
+
+    Each group is sent at most `max_frame_rate` frames per second; events
+    arriving in between are sent together in one frame.  A group with more
+    than `summary_threshold` events waiting is lagging behind, and its next
+    frame carries per event type counters instead of the events.
+    '''
+
+    def __init__(self, max_frame_rate, summary_threshold):
+        self.interval = 1.0 / max_frame_rate
+        self.summary_threshold = summary_threshold
+        self.events = OrderedDict()
+        self.frame_fields = {}
+        self.last_sent = {}
+        self.frames_sent = 0
+        self.events_summarized = 0
+
+    def add(self, group, payload, frame_fields, now):
+        self.events.setdefault(group, []).append(payload)
+        self.frame_fields[group] = frame_fields
+        if now - self.last_sent.get(group, 0) >= self.interval:
+            self.send(group, now)
+
+    def due(self, now):
+        return [group for group in self.events if now - self.last_sent.get(group, 0) >= self.interval]
+
+    def timeout(self, now):
+        # how long until the first group with waiting events may be sent
+        if not self.events:
+            return None
+        return max(0, min(self.last_sent.get(group, 0) for group in self.events) + self.interval - now)
+
+    def frame(self, group, events):
+        if len(events) == 1:
+            return events[0]
+        frame = dict(self.frame_fields[group])
+        if len(events) > self.summary_threshold:
+            counts = {}
+            for event in events:
+                name = event.get('event', '')
+                counts[name] = counts.get(name, 0) + 1
+            frame['summary'] = dict(
+                count=len(events),
+                events=counts,
+                first_counter=min(event.get('counter', 0) for event in events),
+                counter=max(event.get('counter', 0) for event in events),
+            )
+            self.events_summarized += len(events)
+        else:
+            frame['events'] = events
+        return frame
+
+    def send(self, group, now):
+        events = self.events.pop(group, [])
+        self.last_sent[group] = now
+        if not events:
+            return
+        emit_channel_notification(group, self.frame(group, events))
+        self.frames_sent += 1
+
+    def flush(self, now=None, groups=None):
+        now = time.time() if now is None else now
+        for group in (self.due(now) if groups is None else groups):
+            self.send(group, now)
+        # forget groups that have been quiet for a while
+        for group, last_sent in list(self.last_sent.items()):
+            if group not in self.events and now - last_sent >= 60:
+                self.last_sent.pop(group)
+                self.frame_fields.pop(group, None)
+
+
+event_frame_batcher = None
+
+
+def start_event_batching(max_frame_rate, summary_threshold):
+    '''
+    Batch the event notifications sent by this process.  The caller must
+    call flush_event_notifications() regularly to send waiting events.
+    '''
+    global event_frame_batcher
+    if max_frame_rate > 0:
+        event_frame_batcher = EventFrameBatcher(max_frame_rate, summary_threshold)
+    return event_frame_batcher
+
+
+def emit_event_notification(group, payload, frame_fields):
+    '''
+    Send the websocket payload of a saved event to `group`.  `frame_fields`
+    identify the group in frames carrying several events.
+    '''
+    if event_frame_batcher is None:
+        emit_channel_notification(group, payload)
+    else:
+        event_frame_batcher.add(group, payload, frame_fields, time.time())
+
+
+def flush_event_notifications(related_id=None):
+    '''
+    Send the waiting events of every group allowed to send a frame now, or
+    all waiting events of the groups of job `related_id`, and return the
+    seconds until the next flush is due.
+    '''
+    if event_frame_batcher is None:
+        return None
+    groups = None
+    if related_id is not None:
+        suffix = '-{}'.format(related_id)
+        groups = [group for group in event_frame_batcher.events if group.endswith(suffix)]
+    event_frame_batcher.flush(groups=groups)
+    return event_frame_batcher.timeout(time.time())
@@ -1,11 +1,15 @@
 import base64
 import codecs
+import errno
+import hashlib
 import StringIO
 import json
 import os
 import shutil
 import stat
+import subprocess
 import tempfile
+import threading
 import time
 import logging
 from distutils.version import LooseVersion as Version
@@ -21,6 +25,108 @@ logger = logging.getLogger('awx.isolated.manager')
 playbook_logger = logging.getLogger('awx.isolated.manager.playbooks')
 
 
+class IsolatedControlSessionError(Exception):
+    pass
+
+
+class IsolatedControlSession(object):
+    '''
+    Run commands on an isolated host over SSH.
+
+    All of this node's connections to a host share one SSH connection through
+    OpenSSH connection multiplexing (ControlMaster); it is opened by the first
+    command and closed AWX_ISOLATED_CONTROL_PERSIST seconds after the last,
+    so checking on the jobs running there does not authenticate (or start
+    ansible) every time.
+    '''
+
+    def __init__(self, host):
+        self.host = host
+        control_dir = os.path.join(settings.AWX_PROOT_BASE_PATH, 'awx_isolated_control')
+        try:
+            os.mkdir(control_dir, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # socket paths are limited to ~100 characters
+        digest = hashlib.sha1('{}@{}'.format(settings.AWX_ISOLATED_USERNAME, host)).hexdigest()
+        self.control_path = os.path.join(control_dir, digest[:16])
+
+    def ssh_args(self, identity_file=None):
+        args = [
+            'ssh', '-T',
+            '-o', 'BatchMode=yes',
+            '-o', 'StrictHostKeyChecking=no',
+            '-o', 'ConnectTimeout={}'.format(settings.AWX_ISOLATED_CONNECTION_TIMEOUT),
+            '-o', 'ControlMaster=auto',
+            '-o', 'ControlPath={}'.format(self.control_path),
+            '-o', 'ControlPersist={}'.format(settings.AWX_ISOLATED_CONTROL_PERSIST),
+            '-l', settings.AWX_ISOLATED_USERNAME,
+        ]
+        if identity_file:
+            args.extend(['-i', identity_file, '-o', 'IdentitiesOnly=yes'])
+        args.append(self.host)
+        return args
+
+    def run(self, args, timeout):
+        '''
+        Run `args` on the host and return its stdout, or raise
+        IsolatedControlSessionError if it cannot be run or fails.
+        '''
+        identity_dir = None
+        try:
+            identity_file = None
+            if all([
+                getattr(settings, 'AWX_ISOLATED_KEY_GENERATION', False) is True,
+                getattr(settings, 'AWX_ISOLATED_PRIVATE_KEY', None)
+            ]):
+                # only needed when the shared connection has to be opened
+                identity_dir = tempfile.mkdtemp(prefix='awx_isolated', dir=settings.AWX_PROOT_BASE_PATH)
+                identity_file = os.path.join(identity_dir, '.isolated')
+                with os.fdopen(os.open(identity_file, os.O_WRONLY | os.O_CREAT, stat.S_IRUSR | stat.S_IWUSR), 'w') as f:
+                    f.write(settings.AWX_ISOLATED_PRIVATE_KEY)
+            # stderr goes to a file: the backgrounded master connection keeps
+            # it open, which would block reading it from a pipe
+            with tempfile.TemporaryFile() as stderr, open(os.devnull, 'r') as stdin:
+                try:
+                    proc = subprocess.Popen(
+                        self.ssh_args(identity_file) + [run.args2cmdline(*args)],
+                        stdin=stdin, stdout=subprocess.PIPE, stderr=stderr, close_fds=True
+                    )
+                except OSError as e:
+                    raise IsolatedControlSessionError('Could not run ssh: {}'.format(e))
+                timer = threading.Timer(timeout, proc.kill)
+                timer.start()
+                try:
+                    stdout = proc.communicate()[0]
+                finally:
+                    timer.cancel()
+                if proc.returncode != 0:
+                    stderr.seek(0)
+                    raise IsolatedControlSessionError('`{}` on {} exited with {}: {}'.format(
+                        ' '.join(args), self.host, proc.returncode, stderr.read().strip()))
+            return stdout
+        finally:
+            if identity_dir:
+                shutil.rmtree(identity_dir)
+
+    def check(self, private_data_dir, stdout_offset, events_since):
+        '''
+        Return what `awx-expect check` reports about the job in
+        private_data_dir; see awx.main.expect.run.check_isolated_job.
+        '''
+        output = self.run([
+            'awx-expect', 'check', private_data_dir,
+            '--stdout-offset', str(stdout_offset),
+            '--events-since', repr(events_since),
+        ], timeout=max(60, 2 * settings.AWX_ISOLATED_CONNECTION_TIMEOUT))
+        try:
+            return json.loads(output)
+        except ValueError:
+            raise IsolatedControlSessionError('Unexpected `awx-expect check` output from {}: {}'.format(
+                self.host, output[:1024]))
+
+
 class IsolatedManager(object):
 
     def __init__(self, args, cwd, env, stdout_handle, ssh_key_path,
@@ -267,6 +373,12 @@ class IsolatedManager(object):
         On failure, continue to poll the isolated node (until the job timeout
         is exceeded).
 
+        While the job runs, its new stdout and event data are fetched with
+        `awx-expect check` over an IsolatedControlSession (when
+        AWX_ISOLATED_CONTROL_SESSION is enabled); the `check_isolated.yml`
+        playbook then copies the final artifacts once it has exited, or
+        polls on its own if the session fails.
+
         For a completed job run, this function returns (status, rc),
         representing the status and return code of the isolated
         `ansible-playbook` run.
@@ -279,12 +391,17 @@ class IsolatedManager(object):
         if self.instance.verbosity:
             args.append('-%s' % ('v' * min(5, self.instance.verbosity)))
 
+        session = None
+        if getattr(settings, 'AWX_ISOLATED_CONTROL_SESSION', False):
+            session = IsolatedControlSession(self.host)
         status = 'failed'
         output = ''
         rc = None
         buff = StringIO.StringIO()
         last_check = time.time()
-        seek = 0
+        self.stdout_offset = 0
+        self.stdout_decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.events_since = 0
         job_timeout = remaining = self.job_timeout
         while status == 'failed':
             if job_timeout != 0:
@@ -303,6 +420,19 @@ class IsolatedManager(object):
                 time.sleep(1)
                 continue
 
+            if session is not None and not canceled:
+                try:
+                    alive = self.check_control_session(session)
+                except IsolatedControlSessionError as e:
+                    logger.warning('Could not check on isolated job {} over SSH, using `check_isolated.yml`: {}'.format(
+                        self.instance.id, e))
+                    alive = False
+                    session = None
+                last_check = time.time()
+                if alive:
+                    continue
+                # the job is done; the playbook copies its final artifacts
+
             buff = StringIO.StringIO()
             logger.debug('Checking on isolated job {} with `check_isolated.yml`.'.format(self.instance.id))
             status, rc = IsolatedManager.run_pexpect(
@@ -318,11 +448,9 @@ class IsolatedManager(object):
 
             path = self.path_to('artifacts', 'stdout')
             if os.path.exists(path):
-                with codecs.open(path, 'r', encoding='utf-8') as f:
-                    f.seek(seek)
-                    for line in f:
-                        self.stdout_handle.write(line)
-                        seek += len(line)
+                with open(path, 'rb') as f:
+                    f.seek(self.stdout_offset)
+                    self.write_stdout(f.read())
 
             last_check = time.time()
 
@@ -344,6 +472,37 @@ class IsolatedManager(object):
 
         return status, rc
 
+    def write_stdout(self, data):
+        self.stdout_offset += len(data)
+        text = self.stdout_decoder.decode(data)
+        if text:
+            self.stdout_handle.write(text)
+
+    def check_control_session(self, session):
+        '''
+        Fetch the stdout and event data the isolated job has written since
+        the last check, and return whether it is still running.
+        '''
+        events_dir = self.path_to('artifacts', 'job_events')
+        while True:
+            result = session.check(self.private_data_dir, self.stdout_offset, self.events_since)
+            # a second of overlap covers event data written while checking
+            self.events_since = result['time'] - 1
+            for filename, data in result['job_events'].items():
+                # written before the stdout that refers to the event
+                filename = os.path.basename(filename)
+                if not filename.endswith('-partial.json'):
+                    continue
+                path = os.path.join(events_dir, filename)
+                if os.path.exists(path):
+                    continue
+                with codecs.open(path + '.tmp', 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.rename(path + '.tmp', path)
+            self.write_stdout(base64.b64decode(result['stdout']))
+            if self.stdout_offset >= result['stdout_size']:
+                return result['alive']
+
     def cleanup(self):
         # If the job failed for any reason, make a last-ditch effort at cleanup
         extra_vars = {
@@ -5,12 +5,14 @@ import base64
 import codecs
 import collections
 import cStringIO
+import errno
 import logging
 import json
 import os
 import stat
 import pipes
 import re
+import select
 import signal
 import sys
 import thread
@@ -22,6 +24,15 @@ import psutil
 
 logger = logging.getLogger('awx.main.utils.expect')
 
+# bytes read from the child per read
+READ_SIZE = 65536
+
+# characters of trailing output searched for password prompts
+PROMPT_SEARCH_WINDOW = 100
+
+# bytes of stdout returned by one `awx-expect check`
+CHECK_MAX_STDOUT_BYTES = 4 * 1024 * 1024
+
 
 def args2cmdline(*args):
     return ' '.join([pipes.quote(a) for a in args])
@@ -54,7 +65,8 @@ def open_fifo_write(path, data):
 def run_pexpect(args, cwd, env, logfile,
                 cancelled_callback=None, expect_passwords={},
                 extra_update_fields=None, idle_timeout=None, job_timeout=0,
-                pexpect_timeout=5, proot_cmd='bwrap'):
+                pexpect_timeout=5, proot_cmd='bwrap', cancel_fd=None,
+                cancel_poll_interval=None):
     '''
     Run the given command using pexpect to capture output and provide
     passwords when requested.
@@ -80,24 +92,30 @@ def run_pexpect(args, cwd, env, logfile,
                                 will be terminated
     :param job_timeout          a timeout (in seconds); if the total job runtime
                                 exceeds this, the process will be killed
-    :param pexpect_timeout      a timeout (in seconds) to wait on
-                                `pexpect.spawn().expect()` calls
+    :param pexpect_timeout      the interval (in seconds) between calls to
+                                `cancelled_callback`
     :param proot_cmd            the command used to isolate processes, `bwrap`
+    :param cancel_fd            a file descriptor that becomes readable when
+                                the job may have been cancelled;
+                                `cancelled_callback` is called right away when
+                                it does (and must consume what was written to
+                                it), and otherwise only every
+                                `cancel_poll_interval` seconds
+    :param cancel_poll_interval the interval (in seconds) between calls to
+                                `cancelled_callback` while `cancel_fd` is
+                                watched; defaults to `pexpect_timeout`
 
     Returns a tuple (status, return_code) i.e., `('successful', 0)`
     '''
-    expect_passwords[pexpect.TIMEOUT] = None
-    expect_passwords[pexpect.EOF] = None
-
     if not isinstance(expect_passwords, collections.OrderedDict):
-        # We iterate over `expect_passwords.keys()` and
-        # `expect_passwords.values()` separately to map matched inputs to
-        # patterns and choose the proper string to send to the subprocess;
-        # enforce usage of an OrderedDict so that the ordering of elements in
-        # `keys()` matches `values()`.
+        # Patterns are tried in order; enforce usage of an OrderedDict so that
+        # the caller decides which of several matching prompts is answered.
         expect_passwords = collections.OrderedDict(expect_passwords)
-    password_patterns = expect_passwords.keys()
-    password_values = expect_passwords.values()
+    password_patterns = [
+        (pattern if hasattr(pattern, 'search') else re.compile(pattern, re.DOTALL), password)
+        for pattern, password in expect_passwords.items()
+        if password is not None
+    ]
 
     child = pexpect.spawn(
         args[0], args[1:], cwd=cwd, env=env, ignore_sighup=True,
@@ -108,15 +126,83 @@ def run_pexpect(args, cwd, env, logfile,
     timed_out = False
     errored = False
     last_stdout_update = time.time()
+    # the output a password prompt is searched for in
+    prompt_window = ''
+
+    if cancel_fd is None or cancel_poll_interval is None:
+        cancel_poll_interval = pexpect_timeout
+    poller = select.poll()
+    poller.register(child.child_fd, select.POLLIN)
+    if cancel_fd is not None:
+        poller.register(cancel_fd, select.POLLIN)
 
     job_start = time.time()
-    while child.isalive():
-        result_id = child.expect(password_patterns, timeout=pexpect_timeout, searchwindowsize=100)
-        password = password_values[result_id]
-        if password is not None:
-            child.sendline(password)
-            last_stdout_update = time.time()
-        if cancelled_callback:
+    next_cancel_check = job_start + cancel_poll_interval
+    next_termination = None
+    eof = False
+    while True:
+        events = {}
+        finished = not child.isalive()
+        if finished:
+            if not eof and not child.closed:
+                # read what the child wrote before it exited
+                try:
+                    while child.read_nonblocking(READ_SIZE, timeout=0):
+                        pass
+                except (pexpect.TIMEOUT, pexpect.EOF):
+                    pass
+        else:
+            now = time.time()
+            deadlines = [next_cancel_check if cancelled_callback else now + pexpect_timeout]
+            if next_termination is not None:
+                deadlines.append(next_termination)
+            if job_timeout != 0:
+                deadlines.append(job_start + job_timeout)
+            if idle_timeout:
+                deadlines.append(last_stdout_update + idle_timeout)
+            if eof:
+                # the child closed its output; wait for it to exit
+                deadlines.append(now + 0.1)
+            try:
+                events = dict(poller.poll(max(0, min(deadlines) - now) * 1000))
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+
+        # a job cancelled as it finished is still reported as cancelled
+        check_cancel = finished or time.time() >= next_cancel_check
+        if events.get(child.child_fd):
+            try:
+                data = child.read_nonblocking(READ_SIZE, timeout=0)
+            except pexpect.TIMEOUT:
+                data = ''
+            except pexpect.EOF:
+                data = ''
+                eof = True
+                poller.unregister(child.child_fd)
+            if data:
+                last_stdout_update = time.time()
+            # A prompt blocks the child until it is answered, so prompts are
+            # only looked for at the end of an incomplete line of output.
+            if data and password_patterns:
+                prompt_window = (prompt_window + data)[-PROMPT_SEARCH_WINDOW:]
+                if not prompt_window.endswith('\n'):
+                    for pattern, password in password_patterns:
+                        if pattern.search(prompt_window):
+                            child.sendline(password)
+                            prompt_window = ''
+                            break
+        if cancel_fd is not None and cancel_fd in events:
+            if events[cancel_fd] & (select.POLLERR | select.POLLHUP | select.POLLNVAL):
+                # fall back to checking every pexpect_timeout seconds
+                poller.unregister(cancel_fd)
+                cancel_fd = None
+                cancel_poll_interval = pexpect_timeout
+            else:
+                check_cancel = True
+
+        if cancelled_callback and check_cancel and not (canceled or errored):
+            next_cancel_check = time.time() + cancel_poll_interval
             try:
                 canceled = cancelled_callback()
             except Exception:
@@ -124,14 +210,20 @@ def run_pexpect(args, cwd, env, logfile,
                 if isinstance(extra_update_fields, dict):
                     extra_update_fields['job_explanation'] = "System error during job execution, check system logs"
                 errored = True
-        else:
-            canceled = False
-        if not canceled and job_timeout != 0 and (time.time() - job_start) > job_timeout:
+        if cancel_fd is not None and (canceled or errored):
+            # the callback is not asked again, so a repeated notification
+            # would leave cancel_fd readable and poll() returning at once
+            poller.unregister(cancel_fd)
+            cancel_fd = None
+        if finished:
+            break
+        if not canceled and not timed_out and job_timeout != 0 and (time.time() - job_start) > job_timeout:
             timed_out = True
             if isinstance(extra_update_fields, dict):
                 extra_update_fields['job_explanation'] = "Job terminated due to timeout"
-        if canceled or timed_out or errored:
+        if (canceled or timed_out or errored) and (next_termination is None or time.time() >= next_termination):
             handle_termination(child.pid, child.args, proot_cmd, is_cancel=canceled)
+            next_termination = time.time() + pexpect_timeout
         if idle_timeout and (time.time() - last_stdout_update) > idle_timeout:
             child.close(True)
             canceled = True
@@ -239,6 +331,75 @@ def handle_termination(pid, args, proot_cmd, is_cancel=True):
         logger.warn("Attempted to %s already finished job, ignoring" % keyword)
 
 
+def is_alive(private_data_dir):
+    '''
+    Return True if the daemon started by `awx-expect start` is running.
+    '''
+    try:
+        with open(os.path.join(private_data_dir, 'pid'), 'r') as f:
+            pid = int(f.readline())
+        os.kill(pid, signal.SIG_DFL)
+        return True
+    except (IOError, OSError, ValueError):
+        return False
+
+
+def check_isolated_job(private_data_dir, stdout_offset=0, events_since=0,
+                       max_bytes=CHECK_MAX_STDOUT_BYTES):
+    '''
+    Report on a job launched with `awx-expect start`, returning only what the
+    controlling node has not seen yet.
+
+    :param private_data_dir: the directory the job was started in
+    :param stdout_offset:    the number of bytes of `artifacts/stdout` the
+                             caller already has
+    :param events_since:     the `time` returned by an earlier check; event
+                             data written since then is returned
+    :param max_bytes:        the maximum number of bytes of stdout to return
+
+    Returns a dict with `alive`, `time`, the (base64 encoded) stdout that
+    follows `stdout_offset` with the new `stdout_offset` and the
+    `stdout_size`, and `job_events`, which maps the names of new event data
+    files to their contents.
+    '''
+    artifacts_dir = os.path.join(private_data_dir, 'artifacts')
+    result = {
+        # checked first, so a job that is no longer alive has written all of
+        # the stdout read below
+        'alive': is_alive(private_data_dir),
+        'time': time.time(),
+        'stdout': '',
+        'stdout_offset': stdout_offset,
+        'stdout_size': 0,
+        'job_events': {},
+    }
+    stdout_path = os.path.join(artifacts_dir, 'stdout')
+    if os.path.exists(stdout_path):
+        with open(stdout_path, 'rb') as f:
+            f.seek(stdout_offset)
+            data = f.read(max_bytes)
+            result['stdout_size'] = os.fstat(f.fileno()).st_size
+        result['stdout'] = base64.b64encode(data)
+        result['stdout_offset'] = stdout_offset + len(data)
+
+    # Event data is written before the event reaches stdout, so listing it
+    # after reading stdout finds the data of every event read above.
+    events_dir = os.path.join(artifacts_dir, 'job_events')
+    if os.path.isdir(events_dir):
+        for filename in os.listdir(events_dir):
+            if not filename.endswith('-partial.json'):
+                continue
+            path = os.path.join(events_dir, filename)
+            try:
+                if os.stat(path).st_mtime < events_since:
+                    continue
+                with codecs.open(path, 'r', encoding='utf-8') as f:
+                    result['job_events'][filename] = f.read()
+            except (IOError, OSError):
+                continue
+    return result
+
+
 def __run__(private_data_dir):
     buff = cStringIO.StringIO()
     with open(os.path.join(private_data_dir, 'env'), 'r') as f:
@@ -272,13 +433,21 @@ if __name__ == '__main__':
     __version__ = awx.__version__
     parser = argparse.ArgumentParser(description='manage a daemonized, isolated ansible playbook')
     parser.add_argument('--version', action='version', version=__version__ + '-isolated')
-    parser.add_argument('command', choices=['start', 'stop', 'is-alive'])
+    parser.add_argument('command', choices=['start', 'stop', 'is-alive', 'check'])
     parser.add_argument('private_data_dir')
+    parser.add_argument('--stdout-offset', type=int, default=0,
+                        help='(check) bytes of stdout the caller already has')
+    parser.add_argument('--events-since', type=float, default=0,
+                        help='(check) the time reported by the previous check')
     args = parser.parse_args()
 
     private_data_dir = args.private_data_dir
     pidfile = os.path.join(private_data_dir, 'pid')
 
+    if args.command == 'check':
+        print(json.dumps(check_isolated_job(private_data_dir, args.stdout_offset, args.events_since)))
+        sys.exit(0)
+
     if args.command == 'start':
         # create a file to log stderr in case the daemonized process throws
         # an exception before it gets to `pexpect.spawn`
@@ -0,0 +1,51 @@
+# Copyright (c) 2018 Ansible by Red Hat
+# All Rights Reserved
+
+# Python
+import json
+import time
+
+# Django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+# AWX
+from awx.main.management.commands.run_callback_receiver import stats_cache_key
+
+
+class Command(BaseCommand):
+    '''
+    Display the per-worker queue depth, throughput, latency and drop
+    counters most recently published by the callback receiver.
+    '''
+
+    help = 'Display callback receiver worker statistics'
+
+    COLUMNS = [
+        ('worker', '{:>6}'), ('pid', '{:>7}'), ('depth', '{:>7}'), ('jobs', '{:>5}'),
+        ('enqueued', '{:>10}'), ('processed', '{:>10}'), ('blocked', '{:>8}'),
+        ('dropped', '{:>8}'), ('latency_avg', '{:>12.3f}'), ('latency_max', '{:>12.3f}'),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hostname', dest='hostname', type=str, default=None,
+                            help='Callback receiver node to report on (defaults to this node)')
+        parser.add_argument('--json', dest='json', action='store_true',
+                            help='Output the statistics as JSON')
+
+    def handle(self, *args, **options):
+        hostname = options['hostname'] or settings.CLUSTER_HOST_ID
+        stats = cache.get(stats_cache_key(hostname))
+        if not stats:
+            raise CommandError('No callback receiver statistics found for {}'.format(hostname))
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=4, sort_keys=True))
+            return
+        self.stdout.write('{}: {} messages ({} events) received, {} active jobs, updated {:.0f}s ago'.format(
+            hostname, stats['total_messages'], stats.get('total_events', stats['total_messages']),
+            stats['jobs'], time.time() - stats['timestamp']
+        ))
+        self.stdout.write(' '.join('{:>{}}'.format(name, len(fmt.format(0))) for name, fmt in self.COLUMNS))
+        for worker in stats['workers']:
+            self.stdout.write(' '.join(fmt.format(worker[name]) for name, fmt in self.COLUMNS))
@@ -8,16 +8,20 @@ import os
 import re
 import subprocess
 import sys
+import tempfile
 import time
 import traceback
 import shutil
+from contextlib import contextmanager
 
 # Django
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.core.exceptions import ImproperlyConfigured
 from django.db import connection, transaction
+from django.db.models import Case, Value, When
 from django.utils.encoding import smart_text
+from django.utils.timezone import now
 
 # AWX
 from awx.main.models import * # noqa
@@ -28,7 +32,8 @@ from awx.main.utils import (
     build_proot_temp_dir,
     get_licenser
 )
-from awx.main.utils.mem_inventory import MemInventory, dict_to_mem_data
+from awx.main.utils.inventory_script import bump_script_data_version
+from awx.main.utils.mem_inventory import MemInventory, dict_to_mem_data, load_inventory_json
 from awx.main.signals import disable_activity_stream
 
 logger = logging.getLogger('awx.main.commands.inventory_import')
@@ -142,31 +147,35 @@ class AnsibleInventoryLoader(object):
 
     def command_to_json(self, cmd):
         data = {}
-        stdout, stderr = '', ''
         env = self.build_env()
 
         if ((self.is_custom or 'AWX_PRIVATE_DATA_DIR' in env) and
                 getattr(settings, 'AWX_PROOT_ENABLED', False)):
             cmd = self.get_proot_args(cmd, env)
 
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-        stdout, stderr = proc.communicate()
-
-        if self.tmp_private_dir:
-            shutil.rmtree(self.tmp_private_dir, True)
-        if proc.returncode != 0:
-            raise RuntimeError('%s failed (rc=%d) with stdout:\n%s\nstderr:\n%s' % (
-                self.method, proc.returncode, stdout, stderr))
-
-        for line in stderr.splitlines():
-            logger.error(line)
-        try:
-            data = json.loads(stdout)
-            if not isinstance(data, dict):
-                raise TypeError('Returned JSON must be a dictionary, got %s instead' % str(type(data)))
-        except Exception:
-            logger.error('Failed to load JSON from: %s', stdout)
-            raise
+        # Spool the output to disk and decode it from there, rather than
+        # holding the raw output of large inventories in memory.
+        with tempfile.TemporaryFile() as stdout_file:
+            proc = subprocess.Popen(cmd, stdout=stdout_file, stderr=subprocess.PIPE, env=env)
+            stderr = proc.communicate()[1]
+
+            if self.tmp_private_dir:
+                shutil.rmtree(self.tmp_private_dir, True)
+            stdout_file.seek(0)
+            if proc.returncode != 0:
+                raise RuntimeError('%s failed (rc=%d) with stdout:\n%s\nstderr:\n%s' % (
+                    self.method, proc.returncode, stdout_file.read(), stderr))
+
+            for line in stderr.splitlines():
+                logger.error(line)
+            try:
+                data = load_inventory_json(stdout_file)
+                if not isinstance(data, dict):
+                    raise TypeError('Returned JSON must be a dictionary, got %s instead' % str(type(data)))
+            except Exception:
+                stdout_file.seek(0)
+                logger.error('Failed to load JSON from: %s', stdout_file.read())
+                raise
         return data
 
     def load(self):
@@ -529,6 +538,7 @@ class Command(BaseCommand):
             logger.warning('group deletions took %d queries for %d groups',
                            len(connection.queries) - queries_before,
                            len(all_del_pks))
+        return all_del_pks
 
     def _delete_group_children_and_hosts(self):
         '''
@@ -635,20 +645,9 @@ class Command(BaseCommand):
             group_names = all_group_names[offset:(offset + self._batch_size)]
             for group in self.inventory.groups.filter(name__in=group_names):
                 mem_group = self.all_group.all_groups[group.name]
-                db_variables = group.variables_dict
-                if self.overwrite_vars:
-                    db_variables = mem_group.variables
-                else:
-                    db_variables.update(mem_group.variables)
-                if db_variables != group.variables_dict:
-                    group.variables = json.dumps(db_variables)
-                    group.save(update_fields=['variables'])
-                    if self.overwrite_vars:
-                        logger.info('Group "%s" variables replaced', group.name)
-                    else:
-                        logger.info('Group "%s" variables updated', group.name)
-                else:
-                    logger.info('Group "%s" variables unmodified', group.name)
+                update_fields = self._update_db_group_from_mem_group(group, mem_group)
+                if update_fields:
+                    group.save(update_fields=update_fields)
                 existing_group_names.add(group.name)
                 self._batch_add_m2m(self.inventory_source.groups, group)
         for group_name in all_group_names:
@@ -670,7 +669,38 @@ class Command(BaseCommand):
                            len(connection.queries) - queries_before,
                            len(self.all_group.all_groups))
 
+    def _update_db_group_from_mem_group(self, db_group, mem_group):
+        '''
+        Apply imported variables to db_group (without saving it) and return
+        the list of fields that changed.
+        '''
+        db_variables = db_group.variables_dict
+        if self.overwrite_vars:
+            db_variables = mem_group.variables
+        else:
+            db_variables.update(mem_group.variables)
+        if db_variables == db_group.variables_dict:
+            logger.info('Group "%s" variables unmodified', db_group.name)
+            return []
+        db_group.variables = json.dumps(db_variables)
+        if self.overwrite_vars:
+            logger.info('Group "%s" variables replaced', db_group.name)
+        else:
+            logger.info('Group "%s" variables updated', db_group.name)
+        return ['variables']
+
     def _update_db_host_from_mem_host(self, db_host, mem_host):
+        update_fields = self._diff_db_host_from_mem_host(db_host, mem_host)
+        if update_fields:
+            db_host.save(update_fields=update_fields)
+        self._batch_add_m2m(self.inventory_source.hosts, db_host)
+
+    def _diff_db_host_from_mem_host(self, db_host, mem_host):
+        '''
+        Apply imported variables, enabled state, name and instance_id to
+        db_host (without saving it), log what changed and return the list of
+        fields that changed.
+        '''
         # Update host variables.
         db_variables = db_host.variables_dict
         if self.overwrite_vars:
@@ -697,9 +727,7 @@ class Command(BaseCommand):
             old_instance_id = db_host.instance_id
             db_host.instance_id = instance_id
             update_fields.append('instance_id')
-        # Update host and display message(s) on what changed.
-        if update_fields:
-            db_host.save(update_fields=update_fields)
+        # Display message(s) on what changed.
         if 'name' in update_fields:
             logger.info('Host renamed from "%s" to "%s"', old_name, mem_host.name)
         if 'instance_id' in update_fields:
@@ -719,7 +747,7 @@ class Command(BaseCommand):
                 logger.info('Host "%s" is now enabled', mem_host.name)
             else:
                 logger.info('Host "%s" is now disabled', mem_host.name)
-        self._batch_add_m2m(self.inventory_source.hosts, db_host)
+        return update_fields
 
     def _create_update_hosts(self):
         '''
@@ -868,6 +896,321 @@ class Command(BaseCommand):
             logger.warning('Group-host updates took %d queries for %d group-host relationships',
                            len(connection.queries) - queries_before, group_host_count)
 
+    @contextmanager
+    def _timed_phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self._phase_timings.append((name, time.time() - start))
+
+    def _bulk_create_named(self, model, objs):
+        '''
+        Insert new hosts or groups in batches and return a mapping of their
+        names to primary keys (bulk_create only sets them on PostgreSQL).
+        '''
+        model.objects.bulk_create(objs, batch_size=self._batch_size)
+        name_pk_map = dict((obj.name, obj.pk) for obj in objs if obj.pk)
+        all_names = sorted(obj.name for obj in objs if not obj.pk)
+        for offset in xrange(0, len(all_names), self._batch_size):
+            names = all_names[offset:(offset + self._batch_size)]
+            name_pk_map.update(model.objects.filter(inventory=self.inventory,
+                                                    name__in=names).values_list('name', 'pk'))
+        return name_pk_map
+
+    def _bulk_update(self, model, updates):
+        '''
+        Given a mapping of primary keys to {field: value} changes, issue one
+        UPDATE per field and batch, selecting each row's value with a CASE
+        expression on the primary key.
+        '''
+        field_updates = {}
+        for pk, fields in updates.iteritems():
+            for field_name, value in fields.iteritems():
+                field_updates.setdefault(field_name, {})[pk] = value
+        modified = now()
+        for field_name, values in field_updates.iteritems():
+            output_field = model._meta.get_field(field_name)
+            all_pks = sorted(values.keys())
+            for offset in xrange(0, len(all_pks), self._update_batch_size):
+                pks = all_pks[offset:(offset + self._update_batch_size)]
+                whens = [When(pk=pk, then=Value(values[pk])) for pk in pks]
+                model.objects.filter(pk__in=pks).update(**{
+                    field_name: Case(*whens, output_field=output_field),
+                    'modified': modified,
+                })
+
+    def _bulk_add_links(self, through, source_field, target_field, pairs):
+        objs = [through(**{source_field: source, target_field: target})
+                for source, target in sorted(pairs)]
+        through.objects.bulk_create(objs, batch_size=self._batch_size)
+
+    def _bulk_delete_links(self, through, link_pks):
+        all_link_pks = sorted(link_pks)
+        for offset in xrange(0, len(all_link_pks), self._batch_size):
+            through.objects.filter(pk__in=all_link_pks[offset:(offset + self._batch_size)]).delete()
+
+    def _load_db_snapshot(self):
+        '''
+        Load the existing hosts and groups of the inventory, and which of
+        them belong to the inventory source, once; the bulk sync diffs the
+        imported data against this snapshot instead of querying per object.
+        '''
+        self.db_hosts = dict(
+            (host.pk, host) for host in
+            self.inventory.hosts.order_by().only('pk', 'name', 'instance_id', 'variables', 'enabled')
+        )
+        self.db_groups = dict(
+            (group.pk, group) for group in
+            self.inventory.groups.order_by().only('pk', 'name', 'variables')
+        )
+        self.db_source_host_pks = set(self.inventory_source.hosts.values_list('pk', flat=True))
+        self.db_source_group_pks = set(self.inventory_source.groups.values_list('pk', flat=True))
+
+    def _bulk_delete_hosts(self):
+        '''
+        If overwrite is set, delete each inventory source host that is NOT in
+        the imported data, one DELETE statement per batch of hosts, and return
+        the names of the deleted hosts.
+        '''
+        keep_host_pks = set()
+        if self.instance_id_var:
+            mem_instance_ids = set(self.mem_instance_id_map.keys())
+            keep_host_pks.update(v for k, v in self.db_instance_id_map.items() if k in mem_instance_ids)
+            # Hosts without an instance_id are still matched by name.
+            mem_host_names = set(self.all_group.all_hosts.keys()) - set(self.mem_instance_id_map.values())
+        else:
+            mem_instance_ids = set()
+            mem_host_names = set(self.all_group.all_hosts.keys())
+        del_host_pks = []
+        for host_pk in sorted(self.db_source_host_pks):
+            db_host = self.db_hosts[host_pk]
+            if host_pk in keep_host_pks or db_host.name in mem_host_names:
+                continue
+            if db_host.instance_id and db_host.instance_id in mem_instance_ids:
+                continue
+            del_host_pks.append(host_pk)
+        del_host_names = []
+        for offset in xrange(0, len(del_host_pks), self._batch_size):
+            del_pks = del_host_pks[offset:(offset + self._batch_size)]
+            Host.objects.filter(pk__in=del_pks).delete()
+            for host_pk in del_pks:
+                host_name = self.db_hosts.pop(host_pk).name
+                logger.info('Deleted host "%s"', host_name)
+                del_host_names.append(host_name)
+                self.db_source_host_pks.discard(host_pk)
+        return del_host_names
+
+    def _bulk_upsert_groups(self):
+        '''
+        Create imported groups missing from the database in bulk, update the
+        variables of existing ones in bulk and associate all of them with the
+        inventory source.
+        '''
+        db_group_name_map = dict((group.name, group) for group in self.db_groups.values())
+        self.mem_group_pk_map = {}
+        group_updates = {}
+        new_groups = []
+        created = now()
+        for group_name in sorted(self.all_group.all_groups.keys()):
+            mem_group = self.all_group.all_groups[group_name]
+            db_group = db_group_name_map.get(group_name)
+            if db_group is None:
+                new_groups.append(Group(inventory=self.inventory, name=group_name,
+                                        variables=json.dumps(mem_group.variables),
+                                        description='imported', created=created, modified=created))
+                logger.info('Group "%s" added', group_name)
+                continue
+            if self._update_db_group_from_mem_group(db_group, mem_group):
+                group_updates[db_group.pk] = {'variables': db_group.variables}
+            self.mem_group_pk_map[group_name] = db_group.pk
+        self._bulk_update(Group, group_updates)
+        self.mem_group_pk_map.update(self._bulk_create_named(Group, new_groups))
+        source_links = set((self.inventory_source.pk, group_pk) for group_pk in self.mem_group_pk_map.values()
+                           if group_pk not in self.db_source_group_pks)
+        self._bulk_add_links(Group.inventory_sources.through, 'inventorysource_id', 'group_id', source_links)
+
+    def _bulk_upsert_hosts(self):
+        '''
+        Match imported hosts to existing ones (by the pk of hosts whose
+        instance_id is only in their variables, then by instance_id, then by
+        name), update the matched hosts in bulk, create the rest in bulk and
+        associate all of them with the inventory source.  Return the primary
+        keys of the created and updated hosts.
+        '''
+        db_host_instance_id_map = {}
+        db_host_name_map = {}
+        for host_pk in sorted(self.db_hosts.keys()):
+            db_host = self.db_hosts[host_pk]
+            if db_host.instance_id:
+                db_host_instance_id_map.setdefault(db_host.instance_id, db_host)
+            db_host_name_map[db_host.name] = db_host
+
+        self.mem_host_pk_map = {}
+        matched_host_pks = set()
+        host_updates = {}
+        new_hosts = []
+        created = now()
+        for mem_host_name in sorted(self.all_group.all_hosts.keys()):
+            mem_host = self.all_group.all_hosts[mem_host_name]
+            instance_id = self._get_instance_id(mem_host.variables)
+            candidates = []
+            if instance_id in self.db_instance_id_map:
+                candidates.append(self.db_hosts.get(self.db_instance_id_map[instance_id]))
+            elif instance_id:
+                candidates.append(db_host_instance_id_map.get(instance_id))
+            candidates.append(db_host_name_map.get(mem_host_name))
+            db_host = next((h for h in candidates if h is not None and h.pk not in matched_host_pks), None)
+            name_host = candidates[-1]
+            if db_host is None and name_host is not None and name_host.name == mem_host_name:
+                # The host named like this one was already matched (by
+                # instance_id) to another imported host and keeps the name,
+                # e.g. when EC2 reuses a hostname; update it like
+                # update_or_create(name=...) would instead of inserting a
+                # duplicate name.
+                db_host = name_host
+            if db_host is not None:
+                matched_host_pks.add(db_host.pk)
+                update_fields = set(self._diff_db_host_from_mem_host(db_host, mem_host))
+                update_fields.update(host_updates.get(db_host.pk, {}))
+                if update_fields:
+                    host_updates[db_host.pk] = dict((f, getattr(db_host, f)) for f in update_fields)
+                self.mem_host_pk_map[mem_host_name] = db_host.pk
+                continue
+            db_host = Host(inventory=self.inventory, name=mem_host_name,
+                           variables=json.dumps(mem_host.variables),
+                           description='imported', created=created, modified=created)
+            enabled = self._get_enabled(mem_host.variables)
+            if enabled is not None:
+                db_host.enabled = enabled
+            if self.instance_id_var:
+                db_host.instance_id = instance_id
+            new_hosts.append(db_host)
+            if enabled is False:
+                logger.info('Host "%s" added (disabled)', mem_host_name)
+            else:
+                logger.info('Host "%s" added', mem_host_name)
+        self._bulk_update(Host, host_updates)
+        new_host_pk_map = self._bulk_create_named(Host, new_hosts)
+        self.mem_host_pk_map.update(new_host_pk_map)
+        source_links = set((self.inventory_source.pk, host_pk) for host_pk in self.mem_host_pk_map.values()
+                           if host_pk not in self.db_source_host_pks)
+        self._bulk_add_links(Host.inventory_sources.through, 'inventorysource_id', 'host_id', source_links)
+        return set(host_updates.keys()) | set(new_host_pk_map.values())
+
+    def _bulk_sync_group_links(self):
+        '''
+        Diff the imported parent/child group and group/host relationships
+        against the database and add the missing ones in bulk.  If overwrite
+        is set, also remove the relationships of inventory source groups that
+        are not in the imported data.  Return the primary keys of the hosts
+        whose groups changed.
+        '''
+        group_names = dict((pk, name) for name, pk in self.mem_group_pk_map.items())
+        group_names.update((pk, group.name) for pk, group in self.db_groups.items())
+        host_names = dict((pk, name) for name, pk in self.mem_host_pk_map.items())
+        host_names.update((pk, host.name) for pk, host in self.db_hosts.items())
+
+        mem_children = set()
+        mem_hosts = set()
+        for group_name, mem_group in self.all_group.all_groups.iteritems():
+            group_pk = self.mem_group_pk_map[group_name]
+            for mem_child in mem_group.children:
+                if mem_child.name in self.mem_group_pk_map:
+                    mem_children.add((group_pk, self.mem_group_pk_map[mem_child.name]))
+            for mem_host in mem_group.hosts:
+                if mem_host.name in self.mem_host_pk_map:
+                    mem_hosts.add((group_pk, self.mem_host_pk_map[mem_host.name]))
+
+        # Relationships are read after deleting groups, which moves the
+        # children and hosts of a deleted group to its parents.
+        children_through = Group.parents.through
+        db_children = dict(
+            ((parent_pk, child_pk), link_pk) for link_pk, parent_pk, child_pk in
+            children_through.objects.filter(to_group__inventory=self.inventory).values_list(
+                'pk', 'to_group_id', 'from_group_id')
+        )
+        hosts_through = Group.hosts.through
+        db_hosts = dict(
+            ((group_pk, host_pk), link_pk) for link_pk, group_pk, host_pk in
+            hosts_through.objects.filter(group__inventory=self.inventory).values_list(
+                'pk', 'group_id', 'host_id')
+        )
+
+        if self.overwrite:
+            overwrite_group_pks = set(self.db_source_group_pks)
+            if self.inventory_source.deprecated_group_id in overwrite_group_pks:  # TODO: remove in 3.3
+                logger.info(
+                    'Group "%s" from v1 API child group/host connections preserved',
+                    group_names.get(self.inventory_source.deprecated_group_id)
+                )
+                overwrite_group_pks.discard(self.inventory_source.deprecated_group_id)
+            del_children = sorted(k for k in db_children if k[0] in overwrite_group_pks and k not in mem_children)
+            for parent_pk, child_pk in del_children:
+                logger.info('Group "%s" removed from group "%s"', group_names[child_pk], group_names[parent_pk])
+            self._bulk_delete_links(children_through, [db_children[k] for k in del_children])
+            del_hosts = sorted(k for k in db_hosts if k[0] in overwrite_group_pks and k not in mem_hosts)
+            for group_pk, host_pk in del_hosts:
+                logger.info('Host "%s" removed from group "%s"', host_names[host_pk], group_names[group_pk])
+            self._bulk_delete_links(hosts_through, [db_hosts[k] for k in del_hosts])
+
+        new_children = sorted(mem_children - set(db_children))
+        for parent_pk, child_pk in new_children:
+            logger.info('Group "%s" added as child of "%s"', group_names[child_pk], group_names[parent_pk])
+        self._bulk_add_links(children_through, 'to_group_id', 'from_group_id', new_children)
+        new_hosts = sorted(mem_hosts - set(db_hosts))
+        for group_pk, host_pk in new_hosts:
+            logger.info('Host "%s" added to group "%s"', host_names[host_pk], group_names[group_pk])
+        self._bulk_add_links(hosts_through, 'group_id', 'host_id', new_hosts)
+        changed_host_pks = set(host_pk for group_pk, host_pk in new_hosts)
+        if self.overwrite:
+            changed_host_pks.update(host_pk for group_pk, host_pk in del_hosts)
+        return changed_host_pks
+
+    def _update_host_smart_inventory_memberships(self, since, host_names):
+        # Host.save() and Host.delete() schedule this for every host; the
+        # bulk statements bypass them, so schedule it once for the hosts
+        # modified since the import started and the other hosts named.
+        if settings.AWX_REBUILD_SMART_MEMBERSHIP:
+            def on_commit():
+                from awx.main.tasks import update_host_smart_inventory_memberships
+                update_host_smart_inventory_memberships.delay(host_names=sorted(host_names),
+                                                              since=since.isoformat())
+            connection.on_commit(on_commit)
+
+    def bulk_load_into_database(self):
+        '''
+        Load inventory from in-memory groups to the database by diffing it
+        against a snapshot of the existing rows and applying inserts,
+        updates, deletes and relationship changes with bulk statements.
+        '''
+        started = now()
+        with self._timed_phase('snapshot'):
+            self._build_db_instance_id_map()
+            self._build_mem_instance_id_map()
+            self._load_db_snapshot()
+        del_host_names = []
+        if self.overwrite:
+            with self._timed_phase('delete hosts'):
+                del_host_names = self._bulk_delete_hosts()
+            with self._timed_phase('delete groups'):
+                for group_pk in self._delete_groups():
+                    self.db_groups.pop(group_pk, None)
+                    self.db_source_group_pks.discard(group_pk)
+        with self._timed_phase('update inventory'):
+            self._update_inventory()
+        with self._timed_phase('create/update groups'):
+            self._bulk_upsert_groups()
+        with self._timed_phase('create/update hosts'):
+            upserted_host_pks = self._bulk_upsert_hosts()
+        with self._timed_phase('group relationships'):
+            regrouped_host_pks = self._bulk_sync_group_links() - upserted_host_pks
+        if del_host_names or upserted_host_pks or regrouped_host_pks:
+            # Created and updated hosts are found by their modified time.
+            host_names = set(del_host_names)
+            host_names.update(self.db_hosts[host_pk].name for host_pk in regrouped_host_pks)
+            self._update_host_smart_inventory_memberships(started, host_names)
+
     def load_into_database(self):
         '''
         Load inventory from in-memory groups to the database, overwriting or
@@ -876,17 +1219,31 @@ class Command(BaseCommand):
         # FIXME: Attribute changes to superuser?
         # Perform __in queries in batches (mainly for unit tests using SQLite).
         self._batch_size = 500
-        self._build_db_instance_id_map()
-        self._build_mem_instance_id_map()
+        # Bulk updates bind three parameters per row.
+        self._update_batch_size = 100
+        if not getattr(settings, 'ACTIVITY_STREAM_ENABLED_FOR_INVENTORY_SYNC', True):
+            return self.bulk_load_into_database()
+        # Activity stream entries are recorded by model signals, which bulk
+        # statements do not send, so save each object individually.
+        with self._timed_phase('snapshot'):
+            self._build_db_instance_id_map()
+            self._build_mem_instance_id_map()
         if self.overwrite:
-            self._delete_hosts()
-            self._delete_groups()
-            self._delete_group_children_and_hosts()
-        self._update_inventory()
-        self._create_update_groups()
-        self._create_update_hosts()
-        self._create_update_group_children()
-        self._create_update_group_hosts()
+            with self._timed_phase('delete hosts'):
+                self._delete_hosts()
+            with self._timed_phase('delete groups'):
+                self._delete_groups()
+            with self._timed_phase('delete group relationships'):
+                self._delete_group_children_and_hosts()
+        with self._timed_phase('update inventory'):
+            self._update_inventory()
+        with self._timed_phase('create/update groups'):
+            self._create_update_groups()
+        with self._timed_phase('create/update hosts'):
+            self._create_update_hosts()
+        with self._timed_phase('group relationships'):
+            self._create_update_group_children()
+            self._create_update_group_hosts()
 
     def check_license(self):
         license_info = get_licenser().validate()
@@ -970,6 +1327,7 @@ class Command(BaseCommand):
             raise e
 
         status, tb, exc = 'error', '', None
+        self._phase_timings = []
         try:
             if settings.SQL_DEBUG:
                 queries_before = len(connection.queries)
@@ -1013,12 +1371,17 @@ class Command(BaseCommand):
                         else:
                             with disable_activity_stream():
                                 self.load_into_database()
+                        # bulk statements send no signals
+                        bump_script_data_version(self.inventory.pk)
                         if settings.SQL_DEBUG:
                             queries_before2 = len(connection.queries)
-                        self.inventory.update_computed_fields()
+                        with self._timed_phase('update computed fields'):
+                            self.inventory.update_computed_fields()
                         if settings.SQL_DEBUG:
                             logger.warning('update computed fields took %d queries',
                                            len(connection.queries) - queries_before2)
+                        for phase, elapsed in self._phase_timings:
+                            logger.info('Inventory import phase "%s" took %0.3fs', phase, elapsed)
                     try:
                         self.check_license()
                     except CommandError as e:
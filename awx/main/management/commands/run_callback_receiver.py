@@ -6,8 +6,9 @@ import logging
 import os
 import signal
 import time
-from uuid import UUID
-from multiprocessing import Process
+from collections import OrderedDict
+from multiprocessing import Process, active_children
+from multiprocessing import Array as MPArray
 from multiprocessing import Queue as MPQueue
 from Queue import Empty as QueueEmpty
 from Queue import Full as QueueFull
@@ -25,7 +26,10 @@ from django.core.cache import cache as django_cache
 
 # AWX
 from awx.main.models import * # noqa
-from awx.main.consumers import emit_channel_notification
+from awx.main.consumers import (
+    emit_channel_notification, flush_event_notifications, start_event_batching
+)
+from awx.main.queue import EVENT_BATCH_KEY
 
 logger = logging.getLogger('awx.main.commands.run_callback_receiver')
 
@@ -41,43 +45,171 @@ class WorkerSignalHandler:
         self.kill_now = True
 
 
+class EventBuffer(object):
+    '''
+    Per-job holding area for events waiting to be bulk inserted.
+
+    Events are grouped by (event class, job id); a group should be flushed
+    when it reaches `max_events` or when its oldest event is `max_age`
+    seconds old.
+    '''
+
+    def __init__(self, max_events, max_age):
+        self.max_events = max_events
+        self.max_age = max_age
+        self.events = OrderedDict()
+        self.started = {}
+
+    @property
+    def enabled(self):
+        return self.max_events > 1
+
+    def keys(self):
+        return list(self.events.keys())
+
+    def add(self, key, body, now):
+        if key not in self.events:
+            self.events[key] = []
+            self.started[key] = now
+        self.events[key].append(body)
+        return len(self.events[key]) >= self.max_events
+
+    def pop(self, key):
+        self.started.pop(key, None)
+        return self.events.pop(key, [])
+
+    def expired(self, now):
+        return [key for key, started in self.started.items() if now - started >= self.max_age]
+
+    def timeout(self, now):
+        # how long the worker may block waiting for new events before the
+        # oldest buffered group is due to be flushed
+        if not self.started:
+            return 1
+        return min(1, max(0, min(self.started.values()) + self.max_age - now))
+
+
+class WorkerState(object):
+    '''
+    The consumer's view of one callback worker process: its queue, the jobs
+    routed to it, and its throughput/backpressure counters.  `stats` is
+    shared with the worker process, which records how many events it has
+    processed and how long they waited in its queue.
+    '''
+
+    def __init__(self, idx, queue, process, stats):
+        self.idx = idx
+        self.queue = queue
+        self.process = process
+        self.stats = stats
+        self.jobs = set()
+        self.enqueued = 0
+        self.blocked = 0
+        self.dropped = 0
+        self.idle_since = time.time()
+
+    @property
+    def depth(self):
+        try:
+            return self.queue.qsize()
+        except NotImplementedError:
+            return 0
+
+    def snapshot(self):
+        processed, latency_total, latency_max = self.stats[:]
+        return {
+            'worker': self.idx,
+            'pid': self.process.pid if self.process else None,
+            'depth': self.depth,
+            'jobs': len(self.jobs),
+            'enqueued': self.enqueued,
+            'processed': int(processed),
+            'blocked': self.blocked,
+            'dropped': self.dropped,
+            'latency_avg': latency_total / processed if processed else 0.0,
+            'latency_max': latency_max,
+        }
+
+
+def stats_cache_key(hostname):
+    return 'awx_callback_receiver_stats_{}'.format(hostname)
+
+
 class CallbackBrokerWorker(ConsumerMixin):
 
     MAX_RETRIES = 2
 
+    # attempts (of 5 seconds each) to write to a full worker queue before
+    # an event is dropped
+    PUT_ATTEMPTS = 3
+
+    # seconds without an event before a job's worker assignment is
+    # forgotten (e.g., a job that never sent EOF)
+    JOB_AFFINITY_TIMEOUT = 600
+
+    # seconds between publishing worker statistics to the cache
+    STATS_INTERVAL = 5
+
+    EVENT_MAP = (
+        ('job_id', JobEvent),
+        ('ad_hoc_command_id', AdHocCommandEvent),
+        ('project_update_id', ProjectUpdateEvent),
+        ('inventory_update_id', InventoryUpdateEvent),
+        ('system_job_id', SystemJobEvent),
+    )
+
     def __init__(self, connection, use_workers=True):
         self.connection = connection
-        self.worker_queues = []
+        self.workers = []
+        self.job_workers = {}
+        self.job_last_seen = {}
         self.total_messages = 0
+        self.total_events = 0
+        self.next_worker_idx = 0
+        self.last_maintenance = self.last_stats = time.time()
         self.init_workers(use_workers)
 
     def init_workers(self, use_workers=True):
-        def shutdown_handler(active_workers):
-            def _handler(signum, frame):
-                try:
-                    for active_worker in active_workers:
-                        active_worker.terminate()
-                    signal.signal(signum, signal.SIG_DFL)
-                    os.kill(os.getpid(), signum) # Rethrow signal, this time without catching it
-                except Exception:
-                    logger.exception('Error in shutdown_handler')
-            return _handler
+        def shutdown_handler(signum, frame):
+            try:
+                for worker in self.workers:
+                    worker.process.terminate()
+                signal.signal(signum, signal.SIG_DFL)
+                os.kill(os.getpid(), signum) # Rethrow signal, this time without catching it
+            except Exception:
+                logger.exception('Error in shutdown_handler')
 
         if use_workers:
-            django_connection.close()
-            django_cache.close()
             for idx in range(settings.JOB_EVENT_WORKERS):
-                queue_actual = MPQueue(settings.JOB_EVENT_MAX_QUEUE_SIZE)
-                w = Process(target=self.callback_worker, args=(queue_actual, idx,))
-                w.start()
-                if settings.DEBUG:
-                    logger.info('Started worker %s' % str(idx))
-                self.worker_queues.append([0, queue_actual, w])
+                self.start_worker()
         elif settings.DEBUG:
             logger.warn('Started callback receiver (no workers)')
 
-        signal.signal(signal.SIGINT, shutdown_handler([p[2] for p in self.worker_queues]))
-        signal.signal(signal.SIGTERM, shutdown_handler([p[2] for p in self.worker_queues]))
+        signal.signal(signal.SIGINT, shutdown_handler)
+        signal.signal(signal.SIGTERM, shutdown_handler)
+
+    def start_worker(self):
+        django_connection.close()
+        django_cache.close()
+        idx = self.next_worker_idx
+        self.next_worker_idx += 1
+        queue_actual = MPQueue(settings.JOB_EVENT_MAX_QUEUE_SIZE)
+        stats = MPArray('d', 3)
+        w = Process(target=self.callback_worker, args=(queue_actual, idx, stats,))
+        w.start()
+        if settings.DEBUG:
+            logger.info('Started worker %s' % str(idx))
+        worker = WorkerState(idx, queue_actual, w, stats)
+        self.workers.append(worker)
+        return worker
+
+    def stop_worker(self, worker):
+        # the worker flushes anything it has buffered and exits once it
+        # reads the sentinel
+        self.workers.remove(worker)
+        worker.queue.put((time.time(), None))
+        if settings.DEBUG:
+            logger.info('Stopping idle worker %s' % str(worker.idx))
 
     def get_consumers(self, Consumer, channel):
         return [Consumer(queues=[Queue(settings.CALLBACK_QUEUE,
@@ -87,58 +219,152 @@ class CallbackBrokerWorker(ConsumerMixin):
                          callbacks=[self.process_task])]
 
     def process_task(self, body, message):
-        if "uuid" in body and body['uuid']:
-            try:
-                queue = UUID(body['uuid']).int % settings.JOB_EVENT_WORKERS
-            except Exception:
-                queue = self.total_messages % settings.JOB_EVENT_WORKERS
+        # a message holds either a single event or, from a dispatcher that
+        # batches, a list of them in the order they were dispatched
+        if EVENT_BATCH_KEY in body:
+            events = body[EVENT_BATCH_KEY]
         else:
-            queue = self.total_messages % settings.JOB_EVENT_WORKERS
-        self.write_queue_worker(queue, body)
+            events = [body]
+        for event in events:
+            worker = self.route(event)
+            if worker is not None:
+                self.write_queue_worker(worker, event)
+            self.total_events += 1
         self.total_messages += 1
         message.ack()
 
-    def write_queue_worker(self, preferred_queue, body):
-        queue_order = sorted(range(settings.JOB_EVENT_WORKERS), cmp=lambda x, y: -1 if x==preferred_queue else 0)
-        write_attempt_order = []
-        for queue_actual in queue_order:
+    def job_key(self, body):
+        for key, cls in self.EVENT_MAP:
+            if key in body:
+                return (key, body[key])
+        return None
+
+    def route(self, body):
+        '''
+        Pick the worker for an event.  All events for a job go to the same
+        worker so that they are saved in order and never contend with each
+        other; a job is assigned to the least loaded worker when its first
+        event arrives and released when its EOF arrives.
+        '''
+        if not self.workers:
+            return None
+        job_key = self.job_key(body)
+        if job_key is None:
+            return self.workers[self.total_events % len(self.workers)]
+        worker = self.job_workers.get(job_key)
+        if worker is None or worker not in self.workers:
+            worker = self.assign_worker()
+            self.job_workers[job_key] = worker
+            worker.jobs.add(job_key)
+            worker.idle_since = None
+        self.job_last_seen[job_key] = time.time()
+        if body.get('event') == 'EOF':
+            self.release_job(job_key)
+        return worker
+
+    def assign_worker(self):
+        worker = min(self.workers, key=lambda w: (w.depth, len(w.jobs)))
+        if worker.depth >= settings.JOB_EVENT_WORKER_SCALE_UP_DEPTH and \
+                len(self.workers) < settings.JOB_EVENT_MAX_WORKERS:
+            logger.info('All callback workers have at least {} queued events, starting another'.format(worker.depth))
+            worker = self.start_worker()
+        return worker
+
+    def release_job(self, job_key):
+        worker = self.job_workers.pop(job_key, None)
+        self.job_last_seen.pop(job_key, None)
+        if worker is not None:
+            worker.jobs.discard(job_key)
+            if not worker.jobs:
+                worker.idle_since = time.time()
+
+    def write_queue_worker(self, worker, body):
+        for attempt in range(self.PUT_ATTEMPTS):
             try:
-                worker_actual = self.worker_queues[queue_actual]
-                worker_actual[1].put(body, block=True, timeout=5)
-                worker_actual[0] += 1
-                return queue_actual
+                worker.queue.put((time.time(), body), block=True, timeout=5)
+                worker.enqueued += 1
+                return worker
             except QueueFull:
-                pass
+                # block the consumer (and so the broker) rather than send the
+                # event to another worker, which could save it out of order
+                worker.blocked += 1
             except Exception:
                 import traceback
                 tb = traceback.format_exc()
-                logger.warn("Could not write to queue %s" % preferred_queue)
+                logger.warn("Could not write to queue %s" % worker.idx)
                 logger.warn("Detail: {}".format(tb))
-            write_attempt_order.append(preferred_queue)
-        logger.warn("Could not write payload to any queue, attempted order: {}".format(write_attempt_order))
+                break
+        worker.dropped += 1
+        logger.warn("Could not write payload to worker {}, event dropped".format(worker.idx))
         return None
 
-    def callback_worker(self, queue_actual, idx):
+    def on_iteration(self):
+        now = time.time()
+        if now - self.last_maintenance >= 1:
+            self.last_maintenance = now
+            self.maintain_workers(now)
+        if now - self.last_stats >= self.STATS_INTERVAL:
+            self.last_stats = now
+            self.publish_stats(now)
+
+    def maintain_workers(self, now):
+        for job_key, last_seen in list(self.job_last_seen.items()):
+            if now - last_seen >= self.JOB_AFFINITY_TIMEOUT:
+                self.release_job(job_key)
+        for worker in list(self.workers):
+            if not worker.process.is_alive():
+                logger.error('Callback worker {} exited unexpectedly, restarting'.format(worker.idx))
+                self.workers.remove(worker)
+                self.start_worker()
+            elif len(self.workers) > settings.JOB_EVENT_WORKERS and not worker.jobs and \
+                    worker.depth == 0 and now - worker.idle_since >= settings.JOB_EVENT_WORKER_IDLE_TIMEOUT:
+                self.stop_worker(worker)
+        # reap workers that have exited
+        active_children()
+
+    def publish_stats(self, now):
+        try:
+            django_cache.set(stats_cache_key(settings.CLUSTER_HOST_ID), {
+                'timestamp': now,
+                'total_messages': self.total_messages,
+                'total_events': self.total_events,
+                'jobs': len(self.job_workers),
+                'workers': [worker.snapshot() for worker in self.workers],
+            }, self.STATS_INTERVAL * 12)
+        except Exception:
+            logger.exception('Could not publish callback receiver statistics')
+
+    def callback_worker(self, queue_actual, idx, stats):
         signal_handler = WorkerSignalHandler()
+        event_buffer = EventBuffer(settings.JOB_EVENT_BUFFER_SIZE,
+                                   settings.JOB_EVENT_BUFFER_TIMEOUT)
+        start_event_batching(settings.WEBSOCKET_EVENT_MAX_FRAME_RATE,
+                             settings.WEBSOCKET_EVENT_SUMMARY_THRESHOLD)
+        notification_timeout = None
         while not signal_handler.kill_now:
+            timeout = event_buffer.timeout(time.time())
+            if notification_timeout is not None:
+                timeout = min(timeout, notification_timeout)
             try:
-                body = queue_actual.get(block=True, timeout=1)
+                queued_at, body = queue_actual.get(block=True, timeout=timeout)
+                if body is None:
+                    break
+                latency = time.time() - queued_at
+                with stats.get_lock():
+                    stats[0] += 1
+                    stats[1] += latency
+                    stats[2] = max(stats[2], latency)
             except QueueEmpty:
+                if not self.flush_events(event_buffer, event_buffer.expired(time.time())):
+                    return
+                notification_timeout = flush_event_notifications()
                 continue
             except Exception as e:
                 logger.error("Exception on worker thread, restarting: " + str(e))
                 continue
             try:
-
-                event_map = {
-                    'job_id': JobEvent,
-                    'ad_hoc_command_id': AdHocCommandEvent,
-                    'project_update_id': ProjectUpdateEvent,
-                    'inventory_update_id': InventoryUpdateEvent,
-                    'system_job_id': SystemJobEvent,
-                }
-
-                if not any([key in body for key in event_map]):
+                cls, job_identifier = self.identify_event(body)
+                if cls is None:
                     raise Exception('Payload does not have a job identifier')
                 if settings.DEBUG:
                     from pygments import highlight
@@ -149,75 +375,127 @@ class CallbackBrokerWorker(ConsumerMixin):
                         highlight(pformat(body, width=160), PythonLexer(), Terminal256Formatter(style='friendly'))
                     )[:1024 * 4])
 
-                def _save_event_data():
-                    for key, cls in event_map.items():
-                        if key in body:
-                            cls.create_from_data(**body)
-
-                job_identifier = 'unknown job'
-                for key in event_map.keys():
-                    if key in body:
-                        job_identifier = body[key]
-                        break
-
                 if body.get('event') == 'EOF':
-                    try:
-                        logger.info('Event processing is finished for Job {}, sending notifications'.format(job_identifier))
-                        # EOF events are sent when stdout for the running task is
-                        # closed. don't actually persist them to the database; we
-                        # just use them to report `summary` websocket events as an
-                        # approximation for when a job is "done"
-                        emit_channel_notification(
-                            'jobs-summary',
-                            dict(group_name='jobs', unified_job_id=job_identifier)
-                        )
-                        # Additionally, when we've processed all events, we should
-                        # have all the data we need to send out success/failure
-                        # notification templates
-                        uj = UnifiedJob.objects.get(pk=job_identifier)
-                        if hasattr(uj, 'send_notification_templates'):
-                            retries = 0
-                            while retries < 5:
-                                if uj.finished:
-                                    uj.send_notification_templates('succeeded' if uj.status == 'successful' else 'failed')
-                                    break
-                                else:
-                                    # wait a few seconds to avoid a race where the
-                                    # events are persisted _before_ the UJ.status
-                                    # changes from running -> successful
-                                    retries += 1
-                                    time.sleep(1)
-                                    uj = UnifiedJob.objects.get(pk=job_identifier)
-                    except Exception:
-                        logger.exception('Worker failed to emit notifications: Job {}'.format(job_identifier))
+                    # make sure everything buffered for this job is saved
+                    # before reporting that its event processing is done
+                    if not self.flush_events(event_buffer, [(cls, job_identifier)]):
+                        return
+                    flush_event_notifications(job_identifier)
+                    self.finish_job(job_identifier)
                     continue
 
-                retries = 0
-                while retries <= self.MAX_RETRIES:
-                    try:
-                        _save_event_data()
-                        break
-                    except (OperationalError, InterfaceError, InternalError) as e:
-                        if retries >= self.MAX_RETRIES:
-                            logger.exception('Worker could not re-establish database connectivity, shutting down gracefully: Job {}'.format(job_identifier))
-                            os.kill(os.getppid(), signal.SIGINT)
+                if event_buffer.enabled:
+                    key = (cls, job_identifier)
+                    full = event_buffer.add(key, body, time.time())
+                    # playbook_on_stats kicks off the job's host summary
+                    # processing, which needs every earlier event saved
+                    if full or body.get('event') == 'playbook_on_stats':
+                        if not self.flush_events(event_buffer, [key]):
                             return
-                        delay = 60 * retries
-                        logger.exception('Database Error Saving Job Event, retry #{i} in {delay} seconds:'.format(
-                            i=retries + 1,
-                            delay=delay
-                        ))
-                        django_connection.close()
-                        time.sleep(delay)
-                        retries += 1
-                    except DatabaseError as e:
-                        logger.exception('Database Error Saving Job Event for Job {}'.format(job_identifier))
-                        break
+                    if not self.flush_events(event_buffer, event_buffer.expired(time.time())):
+                        return
+                elif not self.save_with_retries(lambda: cls.create_from_data(**body), job_identifier):
+                    return
+                notification_timeout = flush_event_notifications()
             except Exception as exc:
                 import traceback
                 tb = traceback.format_exc()
                 logger.error('Callback Task Processor Raised Exception: %r', exc)
                 logger.error('Detail: {}'.format(tb))
+        self.flush_events(event_buffer, event_buffer.keys())
+        flush_event_notifications()
+
+    def identify_event(self, body):
+        for key, cls in self.EVENT_MAP:
+            if key in body:
+                return cls, body[key]
+        return None, 'unknown job'
+
+    def flush_events(self, event_buffer, keys):
+        """
+        Save the buffered events for each of `keys` with one bulk INSERT per
+        job.  Returns False if the worker has lost its database connection
+        and should shut down.
+        """
+        for key in keys:
+            cls, job_identifier = key
+            events = event_buffer.pop(key)
+            if not events:
+                continue
+            try:
+                if not self.save_with_retries(lambda: cls.bulk_create_from_data(events), job_identifier,
+                                              reraise=True):
+                    return False
+                continue
+            except Exception:
+                # e.g., one event with a NUL byte in its stdout; lose only
+                # the events that cannot be saved on their own
+                logger.exception('Could not save {} events for Job {} in bulk, saving them one at a time'.format(
+                    len(events), job_identifier))
+            for event in events:
+                try:
+                    if not self.save_with_retries(lambda: cls.create_from_data(**event), job_identifier):
+                        return False
+                except Exception:
+                    logger.exception('Could not save event {} for Job {}'.format(event.get('uuid'), job_identifier))
+        return True
+
+    def save_with_retries(self, save, job_identifier, reraise=False):
+        retries = 0
+        while retries <= self.MAX_RETRIES:
+            try:
+                save()
+                break
+            except (OperationalError, InterfaceError, InternalError):
+                if retries >= self.MAX_RETRIES:
+                    logger.exception('Worker could not re-establish database connectivity, shutting down gracefully: Job {}'.format(job_identifier))
+                    os.kill(os.getppid(), signal.SIGINT)
+                    return False
+                delay = 60 * retries
+                logger.exception('Database Error Saving Job Event, retry #{i} in {delay} seconds:'.format(
+                    i=retries + 1,
+                    delay=delay
+                ))
+                django_connection.close()
+                time.sleep(delay)
+                retries += 1
+            except DatabaseError:
+                if reraise:
+                    raise
+                logger.exception('Database Error Saving Job Event for Job {}'.format(job_identifier))
+                break
+        return True
+
+    def finish_job(self, job_identifier):
+        try:
+            logger.info('Event processing is finished for Job {}, sending notifications'.format(job_identifier))
+            # EOF events are sent when stdout for the running task is
+            # closed. don't actually persist them to the database; we
+            # just use them to report `summary` websocket events as an
+            # approximation for when a job is "done"
+            emit_channel_notification(
+                'jobs-summary',
+                dict(group_name='jobs', unified_job_id=job_identifier)
+            )
+            # Additionally, when we've processed all events, we should
+            # have all the data we need to send out success/failure
+            # notification templates
+            uj = UnifiedJob.objects.get(pk=job_identifier)
+            if hasattr(uj, 'send_notification_templates'):
+                retries = 0
+                while retries < 5:
+                    if uj.finished:
+                        uj.send_notification_templates('succeeded' if uj.status == 'successful' else 'failed')
+                        break
+                    else:
+                        # wait a few seconds to avoid a race where the
+                        # events are persisted _before_ the UJ.status
+                        # changes from running -> successful
+                        retries += 1
+                        time.sleep(1)
+                        uj = UnifiedJob.objects.get(pk=job_identifier)
+        except Exception:
+            logger.exception('Worker failed to emit notifications: Job {}'.format(job_identifier))
 
 
 class Command(BaseCommand):
@@ -6,11 +6,12 @@ import logging
 
 from django.db import models
 from django.conf import settings
+from django.utils.timezone import now, timedelta
 
 from awx.main.utils.filters import SmartFilter
 from awx.main.utils.pglock import advisory_lock
 
-___all__ = ['HostManager', 'InstanceManager', 'InstanceGroupManager']
+___all__ = ['HostManager', 'InstanceManager', 'InstanceGroupManager', 'TaskLeaseManager']
 
 logger = logging.getLogger('awx.main.managers')
 
@@ -156,9 +157,11 @@ class InstanceGroupManager(models.Manager):
             graph[name]['committed_capacity'] = 0
             graph[name]['running_capacity'] = 0
 
-    def capacity_values(self, qs=None, tasks=None, breakdown=False, graph=None):
+    def capacity_values(self, qs=None, tasks=None, breakdown=False, graph=None, task_impacts=None):
         """
         Returns a dictionary of capacity values for all IGs
+
+        task_impacts optionally maps task ids to precomputed task_impact values
         """
         if qs is None:  # Optionally BYOQS - bring your own queryset
             qs = self.all().prefetch_related('instances')
@@ -174,7 +177,10 @@ class InstanceGroupManager(models.Manager):
             self.zero_out_group(graph, group_name, breakdown)
         for t in tasks:
             # TODO: dock capacity for isolated job management tasks running in queue
-            impact = t.task_impact
+            if task_impacts and t.id in task_impacts:
+                impact = task_impacts[t.id]
+            else:
+                impact = t.task_impact
             if t.status == 'waiting' or not t.execution_node:
                 # Subtract capacity from any peer groups that share instances
                 if not t.instance_group:
@@ -210,3 +216,40 @@ class InstanceGroupManager(models.Manager):
             else:
                 logger.error('Programming error, %s not in ["running", "waiting"]', t.log_format)
         return graph
+
+
+class TaskLeaseManager(models.Manager):
+    """A custom manager class for the TaskLease model.
+
+    Provides methods for renewing and checking the leases held by running
+    celery tasks.
+    """
+
+    def acquire(self, unified_job, hostname=None):
+        """Take the lease for a unified job that just started running."""
+        self.update_or_create(unified_job_id=unified_job.pk, defaults=dict(
+            celery_task_id=unified_job.celery_task_id,
+            hostname=hostname or settings.CLUSTER_HOST_ID,
+            expires=now() + timedelta(seconds=settings.AWX_TASK_LEASE_TIMEOUT),
+        ))
+
+    def renew(self, unified_job):
+        """Extend the lease of a unified job that is still running.
+
+        Returns False once the job stopped running or its lease is gone, so
+        the heartbeat knows to stop.
+        """
+        return bool(self.filter(
+            unified_job_id=unified_job.pk, unified_job__status='running'
+        ).update(expires=now() + timedelta(seconds=settings.AWX_TASK_LEASE_TIMEOUT)))
+
+    def release(self, unified_job):
+        self.filter(unified_job_id=unified_job.pk).delete()
+
+    def active_task_ids(self, celery_task_ids):
+        """Return the subset of celery_task_ids holding an unexpired lease."""
+        if not celery_task_ids:
+            return set()
+        return set(self.filter(
+            celery_task_id__in=celery_task_ids, expires__gt=now()
+        ).values_list('celery_task_id', flat=True))
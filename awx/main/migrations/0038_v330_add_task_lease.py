@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0037_v330_remove_legacy_fact_cleanup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('celery_task_id', models.CharField(db_index=True, max_length=100)),
+                ('hostname', models.CharField(max_length=250)),
+                ('expires', models.DateTimeField(db_index=True)),
+                ('unified_job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='task_lease', to='main.UnifiedJob')),
+            ],
+        ),
+    ]
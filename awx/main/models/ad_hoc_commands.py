@@ -184,6 +184,9 @@ class AdHocCommand(UnifiedJob, JobNotificationMixin):
         # NOTE: We sorta have to assume the host count matches and that forks default to 5
         from awx.main.models.inventory import Host
         count_hosts = Host.objects.filter( enabled=True, inventory__ad_hoc_commands__pk=self.pk).count()
+        return self.impact_for_host_count(count_hosts)
+
+    def impact_for_host_count(self, count_hosts):
         return min(count_hosts, 5 if self.forks == 0 else self.forks) + 1
 
     def copy(self):
@@ -1,11 +1,14 @@
 import datetime
 import logging
+from collections import defaultdict
 
 from django.conf import settings
-from django.db import models, DatabaseError
+from django.db import models, router, connections, transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import post_save
 from django.utils.dateparse import parse_datetime
 from django.utils.text import Truncator
-from django.utils.timezone import utc
+from django.utils.timezone import utc, now as timezone_now
 from django.utils.translation import ugettext_lazy as _
 from django.utils.encoding import force_text
 import six
@@ -39,6 +42,52 @@ def sanitize_event_keys(kwargs, valid_keys):
                 kwargs[key] = Truncator(kwargs[key]).chars(1024)
 
 
+def parse_event_created(kwargs):
+    # Convert the datetime for the event's creation appropriately,
+    # and include a time zone for it.
+    #
+    # In the event of any issue, throw it out, and Django will just save
+    # the current time.
+    try:
+        if not isinstance(kwargs['created'], datetime.datetime):
+            kwargs['created'] = parse_datetime(kwargs['created'])
+        if not kwargs['created'].tzinfo:
+            kwargs['created'] = kwargs['created'].replace(tzinfo=utc)
+    except (KeyError, ValueError):
+        kwargs.pop('created', None)
+
+
+def can_bulk_create_events(cls):
+    # bulk inserted events need their primary keys for the websocket
+    # payloads and m2m links, which not every backend (e.g., sqlite) returns
+    return connections[router.db_for_write(cls)].features.can_return_ids_from_bulk_insert
+
+
+def bulk_create_events(cls, instances):
+    '''
+    Insert already-prepared (unsaved) event instances with a single INSERT.
+
+    `bulk_create` bypasses `save()` and the post_save signal, so the
+    timestamps `CreatedModifiedModel.save` would fill in are set here, and
+    post_save is sent for each row once the transaction commits, so that
+    websocket emitters see every event but never one that was rolled back.
+    '''
+    now = timezone_now()
+    for instance in instances:
+        if not instance.created:
+            instance.created = now
+        instance.modified = now
+    cls.objects.bulk_create(instances)
+    using = router.db_for_write(cls)
+
+    def send_post_save():
+        for instance in instances:
+            post_save.send(sender=cls, instance=instance, created=True,
+                           update_fields=None, raw=False, using=using)
+    transaction.on_commit(send_post_save, using=using)
+    return instances
+
+
 
 class BasePlaybookEvent(CreatedModifiedModel):
     '''
@@ -284,24 +333,53 @@ class BasePlaybookEvent(CreatedModifiedModel):
             # payload must contain either a job_id or a project_update_id
             return
 
-        # Convert the datetime for the job event's creation appropriately,
-        # and include a time zone for it.
-        #
-        # In the event of any issue, throw it out, and Django will just save
-        # the current time.
-        try:
-            if not isinstance(kwargs['created'], datetime.datetime):
-                kwargs['created'] = parse_datetime(kwargs['created'])
-            if not kwargs['created'].tzinfo:
-                kwargs['created'] = kwargs['created'].replace(tzinfo=utc)
-        except (KeyError, ValueError):
-            kwargs.pop('created', None)
-
+        parse_event_created(kwargs)
         sanitize_event_keys(kwargs, cls.VALID_KEYS)
         job_event = cls.objects.create(**kwargs)
         analytics_logger.info('Event data saved.', extra=dict(python_objects=dict(job_event=job_event)))
         return job_event
 
+    @classmethod
+    def bulk_create_from_data(cls, events):
+        '''
+        Save a batch of event payloads (as received by the callback
+        receiver) with one INSERT.  The per-row work `save()` would do is
+        done in memory first, and the post-save side effects run once for
+        the whole batch instead of once per event.  Nothing is saved if any
+        of it fails, so the caller can save the events one by one instead.
+        '''
+        if not can_bulk_create_events(cls):
+            with transaction.atomic():
+                return [e for e in (cls.create_from_data(**kwargs) for kwargs in events) if e]
+        instances = []
+        for kwargs in events:
+            if 'job_id' not in kwargs and 'project_update_id' not in kwargs:
+                # payload must contain either a job_id or a project_update_id
+                continue
+            parse_event_created(kwargs)
+            sanitize_event_keys(kwargs, cls.VALID_KEYS)
+            instance = cls(**kwargs)
+            instance._update_from_event_data()
+            instances.append(instance)
+        if not instances:
+            return []
+
+        with transaction.atomic():
+            cls._update_host_ids(instances)
+            bulk_create_events(cls, instances)
+            cls._update_related_after_bulk_create(instances)
+        for job_event in instances:
+            analytics_logger.info('Event data saved.', extra=dict(python_objects=dict(job_event=job_event)))
+        return instances
+
+    @classmethod
+    def _update_host_ids(cls, events):
+        pass
+
+    @classmethod
+    def _update_related_after_bulk_create(cls, events):
+        pass
+
     @property
     def job_verbosity(self):
         return 0
@@ -333,17 +411,18 @@ class BasePlaybookEvent(CreatedModifiedModel):
         # Update related objects after this event is saved.
         if hasattr(self, 'job') and not from_parent_update:
             if getattr(settings, 'CAPTURE_JOB_EVENT_HOSTS', False):
-                self._update_hosts()
+                self._bulk_update_hosts([self])
             if self.event == 'playbook_on_stats':
-                self._update_parents_failed_and_changed()
+                self._update_from_stats()
 
-                hostnames = self._hostnames()
-                self._update_host_summary_from_stats(hostnames)
-                try:
-                    self.job.inventory.update_computed_fields()
-                except DatabaseError:
-                    logger.exception('Computed fields database error saving event {}'.format(self.pk))
+    def _update_from_stats(self):
+        self._update_event_tree()
 
+        hostnames = self._hostnames()
+        self._update_host_summary_from_stats(hostnames)
+        from awx.main.tasks import schedule_inventory_computed_fields_update
+        if self.job.inventory_id:
+            schedule_inventory_computed_fields_update(self.job.inventory_id)
 
 
 class JobEvent(BasePlaybookEvent):
@@ -353,6 +432,9 @@ class JobEvent(BasePlaybookEvent):
 
     VALID_KEYS = BasePlaybookEvent.VALID_KEYS + ['job_id']
 
+    # rows per statement when writing event tree flags and host links
+    BULK_BATCH_SIZE = 1000
+
     class Meta:
         app_label = 'main'
         ordering = ('pk',)
@@ -417,37 +499,118 @@ class JobEvent(BasePlaybookEvent):
             updated_fields.add('host_name')
         return updated_fields
 
-    def _update_parents_failed_and_changed(self):
+    def _update_event_tree(self):
+        '''
+        Mark the parents of failed/changed runner events once the job's
+        playbook_on_stats event has been saved.  The tree is built in memory
+        from a single query over the job's events and written back with a
+        few bulk statements.
+        '''
+        tree = {}
+        for pk, uuid, parent_uuid, event, failed, changed in JobEvent.objects.filter(
+            job_id=self.job_id
+        ).values_list('id', 'uuid', 'parent_uuid', 'event', 'failed', 'changed').iterator():
+            tree[uuid] = (pk, parent_uuid, event, failed, changed)
+
         # Update parent events to reflect failed, changed
-        runner_events = JobEvent.objects.filter(job=self.job,
-                                                event__startswith='runner_on')
-        changed_events = runner_events.filter(changed=True)
-        failed_events = runner_events.filter(failed=True)
-        JobEvent.objects.filter(uuid__in=changed_events.values_list('parent_uuid', flat=True)).update(changed=True)
-        JobEvent.objects.filter(uuid__in=failed_events.values_list('parent_uuid', flat=True)).update(failed=True)
-
-    def _update_hosts(self, extra_host_pks=None):
-        # Update job event hosts m2m from host_name, propagate to parent events.
-        extra_host_pks = set(extra_host_pks or [])
-        hostnames = set()
-        if self.host_name:
-            hostnames.add(self.host_name)
-        if self.event == 'playbook_on_stats':
-            try:
-                for v in self.event_data.values():
-                    hostnames.update(v.keys())
-            except AttributeError: # In case event_data or v isn't a dict.
-                pass
-        qs = self.job.inventory.hosts.all()
-        qs = qs.filter(models.Q(name__in=hostnames) | models.Q(pk__in=extra_host_pks))
-        qs = qs.exclude(job_events__pk=self.id).only('id')
-        for host in qs:
-            self.hosts.add(host)
-        if self.parent_uuid:
-            parent = JobEvent.objects.filter(uuid=self.parent_uuid)
-            if parent.exists():
-                parent = parent[0]
-                parent._update_hosts(qs.values_list('id', flat=True))
+        failed_parents, changed_parents = set(), set()
+        for pk, parent_uuid, event, failed, changed in tree.values():
+            if not event.startswith('runner_on') or parent_uuid not in tree:
+                continue
+            parent = tree[parent_uuid]
+            if failed and not parent[3]:
+                failed_parents.add(parent[0])
+            if changed and not parent[4]:
+                changed_parents.add(parent[0])
+        for pks, field in ((failed_parents, 'failed'), (changed_parents, 'changed')):
+            pks = sorted(pks)
+            for i in range(0, len(pks), self.BULK_BATCH_SIZE):
+                JobEvent.objects.filter(pk__in=pks[i:i + self.BULK_BATCH_SIZE]).update(**{field: True})
+
+    @classmethod
+    def _update_host_ids(cls, events):
+        # Resolve the primary host for a whole batch with one query per job,
+        # rather than one query per event as `save()` does.
+        events_by_job = defaultdict(list)
+        for event in events:
+            if event.host_name and not event.host_id:
+                events_by_job[event.job_id].append(event)
+        host_model = cls._meta.get_field('host').related_model
+        for job_id, job_events in events_by_job.items():
+            host_ids = dict(host_model.objects.filter(
+                inventory__jobs=job_id,
+                name__in=set(e.host_name for e in job_events)
+            ).values_list('name', 'id'))
+            for event in job_events:
+                event.host_id = host_ids.get(event.host_name)
+
+    @classmethod
+    def _update_related_after_bulk_create(cls, events):
+        if getattr(settings, 'CAPTURE_JOB_EVENT_HOSTS', False):
+            cls._bulk_update_hosts(events)
+        for event in events:
+            if event.event == 'playbook_on_stats':
+                event._update_from_stats()
+
+    @classmethod
+    def _bulk_update_hosts(cls, events):
+        '''
+        Link every one of `events` (and all of its ancestors) to the hosts
+        it names as the events are saved, using a handful of queries for the
+        whole batch.
+        '''
+        host_model = cls._meta.get_field('host').related_model
+        events_by_job = defaultdict(list)
+        for event in events:
+            events_by_job[event.job_id].append(event)
+
+        links = set()
+        for job_id, job_events in events_by_job.items():
+            hostnames_by_uuid = defaultdict(set)
+            for event in job_events:
+                if event.host_name:
+                    hostnames_by_uuid[event.uuid].add(event.host_name)
+                if event.event == 'playbook_on_stats':
+                    hostnames_by_uuid[event.uuid].update(event._hostnames())
+            if not hostnames_by_uuid:
+                continue
+            host_ids = dict(host_model.objects.filter(
+                inventory__jobs=job_id,
+                name__in=set.union(*hostnames_by_uuid.values())
+            ).values_list('name', 'id'))
+
+            # Walk up parent_uuid until every ancestor is known; the event
+            # tree is only a few levels deep, so this is a query per level.
+            # Parents that were never saved are only looked up once.
+            tree = dict((e.uuid, (e.pk, e.parent_uuid)) for e in job_events)
+            looked_up = set()
+            missing = set(parent for pk, parent in tree.values() if parent and parent not in tree)
+            while missing:
+                looked_up.update(missing)
+                found = cls.objects.filter(job_id=job_id, uuid__in=missing).values_list('uuid', 'id', 'parent_uuid')
+                for uuid, pk, parent_uuid in found:
+                    tree[uuid] = (pk, parent_uuid)
+                missing = set(parent for pk, parent in tree.values() if parent and parent not in tree) - looked_up
+
+            for uuid, hostnames in hostnames_by_uuid.items():
+                ids = set(host_ids[name] for name in hostnames if name in host_ids)
+                seen = set()
+                while uuid in tree and uuid not in seen:
+                    seen.add(uuid)
+                    event_pk, uuid = tree[uuid]
+                    links.update((event_pk, host_id) for host_id in ids)
+
+        if not links:
+            return
+        through = cls.hosts.through
+        existing = set(through.objects.filter(
+            jobevent_id__in=set(event_pk for event_pk, host_id in links),
+            host_id__in=set(host_id for event_pk, host_id in links),
+        ).values_list('jobevent_id', 'host_id'))
+        through.objects.bulk_create([
+            through(jobevent_id=event_pk, host_id=host_id)
+            for event_pk, host_id in sorted(links - existing)
+        ], batch_size=cls.BULK_BATCH_SIZE)
 
     def _hostnames(self):
         hostnames = set()
@@ -463,29 +626,65 @@ class JobEvent(BasePlaybookEvent):
             if not self.job or not self.job.inventory:
                 logger.info('Event {} missing job or inventory, host summaries not updated'.format(self.pk))
                 return
-            qs = self.job.inventory.hosts.filter(name__in=hostnames)
             job = self.job
+            summary_model = job.job_host_summaries.model
+            stat_names = ('changed', 'dark', 'failures', 'ok', 'processed', 'skipped')
+
+            # Resolve every hostname to a host id with one query
+            host_ids = dict(job.inventory.hosts.filter(name__in=hostnames).values_list('name', 'id'))
+            existing = dict(
+                (summary.host_name, summary)
+                for summary in job.job_host_summaries.filter(host_name__in=hostnames)
+            )
+
+            to_create = []
+            to_update = defaultdict(list)
+            to_link = {}
+            now = timezone_now()
             for host in hostnames:
                 host_stats = {}
-                for stat in ('changed', 'dark', 'failures', 'ok', 'processed', 'skipped'):
+                for stat in stat_names:
                     try:
                         host_stats[stat] = self.event_data.get(stat, {}).get(host, 0)
                     except AttributeError:  # in case event_data[stat] isn't a dict.
                         pass
-                if qs.filter(name=host).exists():
-                    host_actual = qs.get(name=host)
-                    host_summary, created = job.job_host_summaries.get_or_create(host=host_actual, host_name=host_actual.name, defaults=host_stats)
-                else:
-                    host_summary, created = job.job_host_summaries.get_or_create(host_name=host, defaults=host_stats)
-
-                if not created:
-                    update_fields = []
-                    for stat, value in host_stats.items():
-                        if getattr(host_summary, stat) != value:
-                            setattr(host_summary, stat, value)
-                            update_fields.append(stat)
-                    if update_fields:
-                        host_summary.save(update_fields=update_fields)
+                if host not in existing:
+                    summary = summary_model(job_id=job.id, host_id=host_ids.get(host), host_name=host,
+                                            created=now, modified=now, **host_stats)
+                    summary.failed = bool(summary.dark or summary.failures)
+                    to_create.append(summary)
+                    continue
+                summary = existing[host]
+                if summary.host_id is None and host in host_ids:
+                    # the host was added to the inventory after the summary
+                    to_link[summary.pk] = host_ids[host]
+                if any(getattr(summary, stat) != value for stat, value in host_stats.items()):
+                    # group rows by their new values so that each distinct
+                    # set of stats is written with a single UPDATE
+                    key = tuple(sorted(host_stats.items()))
+                    to_update[key].append(summary.pk)
+
+            summary_model.objects.bulk_create(to_create, batch_size=1000)
+            for key, pks in to_update.items():
+                values = dict(key)
+                failed = bool(values.get('dark', 0) or values.get('failures', 0))
+                summary_model.objects.filter(pk__in=pks).update(failed=failed, modified=now, **values)
+            for pk, host_id in to_link.items():
+                summary_model.objects.filter(pk=pk).update(host_id=host_id)
+
+            # Point every host with a summary row at this job and that row in
+            # one UPDATE
+            if not host_ids:
+                return
+            summary_host_ids = summary_model.objects.filter(
+                job_id=job.id, host_id__in=set(host_ids.values())
+            ).values('host_id')
+            job.inventory.hosts.filter(pk__in=summary_host_ids).update(
+                last_job_id=job.id,
+                last_job_host_summary_id=Subquery(
+                    summary_model.objects.filter(job_id=job.id, host_id=OuterRef('pk')).values('id')[:1]
+                ),
+            )
 
     @property
     def job_verbosity(self):
@@ -566,22 +765,35 @@ class BaseCommandEvent(CreatedModifiedModel):
 
     @classmethod
     def create_from_data(cls, **kwargs):
-        # Convert the datetime for the event's creation
-        # appropriately, and include a time zone for it.
-        #
-        # In the event of any issue, throw it out, and Django will just save
-        # the current time.
-        try:
-            if not isinstance(kwargs['created'], datetime.datetime):
-                kwargs['created'] = parse_datetime(kwargs['created'])
-            if not kwargs['created'].tzinfo:
-                kwargs['created'] = kwargs['created'].replace(tzinfo=utc)
-        except (KeyError, ValueError):
-            kwargs.pop('created', None)
-
+        parse_event_created(kwargs)
         sanitize_event_keys(kwargs, cls.VALID_KEYS)
         return cls.objects.create(**kwargs)
 
+    @classmethod
+    def bulk_create_from_data(cls, events):
+        if not can_bulk_create_events(cls):
+            with transaction.atomic():
+                return [cls.create_from_data(**kwargs) for kwargs in events]
+        instances = []
+        for kwargs in events:
+            parse_event_created(kwargs)
+            sanitize_event_keys(kwargs, cls.VALID_KEYS)
+            instance = cls(**kwargs)
+            instance._update_from_event_data()
+            instances.append(instance)
+        if instances:
+            with transaction.atomic():
+                cls._update_host_ids(instances)
+                bulk_create_events(cls, instances)
+        return instances
+
+    @classmethod
+    def _update_host_ids(cls, events):
+        pass
+
+    def _update_from_event_data(self):
+        return set()
+
     def get_event_display(self):
         '''
         Needed for __unicode__
@@ -667,23 +879,44 @@ class AdHocCommandEvent(BaseCommandEvent):
     def get_absolute_url(self, request=None):
         return reverse('api:ad_hoc_command_event_detail', kwargs={'pk': self.pk}, request=request)
 
-    def save(self, *args, **kwargs):
-        # If update_fields has been specified, add our field names to it,
-        # if it hasn't been specified, then we're just doing a normal save.
-        update_fields = kwargs.get('update_fields', [])
+    def _update_from_event_data(self):
+        updated_fields = set()
         res = self.event_data.get('res', None)
         if self.event in self.FAILED_EVENTS:
             if not self.event_data.get('ignore_errors', False):
                 self.failed = True
-                if 'failed' not in update_fields:
-                    update_fields.append('failed')
+                updated_fields.add('failed')
         if isinstance(res, dict) and res.get('changed', False):
             self.changed = True
-            if 'changed' not in update_fields:
-                update_fields.append('changed')
+            updated_fields.add('changed')
         self.host_name = self.event_data.get('host', '').strip()
-        if 'host_name' not in update_fields:
-            update_fields.append('host_name')
+        updated_fields.add('host_name')
+        return updated_fields
+
+    @classmethod
+    def _update_host_ids(cls, events):
+        # Resolve the primary host for a whole batch with one query per
+        # ad hoc command, rather than one query per event.
+        events_by_command = defaultdict(list)
+        for event in events:
+            if event.host_name and not event.host_id:
+                events_by_command[event.ad_hoc_command_id].append(event)
+        host_model = cls._meta.get_field('host').related_model
+        for ad_hoc_command_id, command_events in events_by_command.items():
+            host_ids = dict(host_model.objects.filter(
+                inventory__ad_hoc_commands=ad_hoc_command_id,
+                name__in=set(e.host_name for e in command_events)
+            ).values_list('name', 'id'))
+            for event in command_events:
+                event.host_id = host_ids.get(event.host_name)
+
+    def save(self, *args, **kwargs):
+        # If update_fields has been specified, add our field names to it,
+        # if it hasn't been specified, then we're just doing a normal save.
+        update_fields = kwargs.get('update_fields', [])
+        for field in self._update_from_event_data():
+            if field not in update_fields:
+                update_fields.append(field)
         if not self.host_id and self.host_name:
             host_qs = self.ad_hoc_command.inventory.hosts.filter(name=self.host_name)
             try:
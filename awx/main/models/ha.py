@@ -14,7 +14,7 @@ from solo.models import SingletonModel
 
 from awx import __version__ as awx_application_version
 from awx.api.versioning import reverse
-from awx.main.managers import InstanceManager, InstanceGroupManager
+from awx.main.managers import InstanceManager, InstanceGroupManager, TaskLeaseManager
 from awx.main.fields import JSONField
 from awx.main.models.inventory import InventoryUpdate
 from awx.main.models.jobs import Job
@@ -23,7 +23,7 @@ from awx.main.models.unified_jobs import UnifiedJob
 from awx.main.utils import get_cpu_capacity, get_mem_capacity, get_system_task_capacity
 from awx.main.models.mixins import RelatedJobsMixin
 
-__all__ = ('Instance', 'InstanceGroup', 'JobOrigin', 'TowerScheduleState',)
+__all__ = ('Instance', 'InstanceGroup', 'JobOrigin', 'TaskLease', 'TowerScheduleState',)
 
 
 class Instance(models.Model):
@@ -190,6 +190,25 @@ class JobOrigin(models.Model):
         app_label = 'main'
 
 
+class TaskLease(models.Model):
+    """A heartbeat-renewed claim that the celery task running a unified job
+    is still alive.
+
+    BaseTask.run takes the lease when a job starts running and renews it
+    until the job finishes; the task manager reaper treats running jobs
+    without an unexpired lease as lost.
+    """
+    objects = TaskLeaseManager()
+
+    unified_job = models.OneToOneField(UnifiedJob, related_name='task_lease', on_delete=models.CASCADE)
+    celery_task_id = models.CharField(max_length=100, db_index=True)
+    hostname = models.CharField(max_length=250)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        app_label = 'main'
+
+
 @receiver(post_save, sender=InstanceGroup)
 def on_instance_group_saved(sender, instance, created=False, raw=False, **kwargs):
     from awx.main.tasks import apply_cluster_membership_policies
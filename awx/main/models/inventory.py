@@ -3,6 +3,7 @@
 
 # Python
 import datetime
+import json
 import logging
 import re
 import copy
@@ -18,7 +19,8 @@ from django.utils.translation import ugettext_lazy as _
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.utils.timezone import now
-from django.db.models import Q
+from django.db.models import Case, Count, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 
 # AWX
 from awx.api.versioning import reverse
@@ -50,6 +52,24 @@ __all__ = ['Inventory', 'Host', 'Group', 'InventorySource', 'InventoryUpdate',
 
 logger = logging.getLogger('awx.main.models.inventory')
 
+COMPUTED_FIELDS = [
+    'has_active_failures', 'total_hosts', 'hosts_with_active_failures', 'total_groups',
+    'groups_with_active_failures', 'has_inventory_sources', 'total_inventory_sources',
+    'inventory_sources_with_failures',
+]
+
+
+def _count_subquery(model, **filters):
+    '''
+    Return an expression counting the rows of `model` matching `filters`
+    that belong to the outer inventory.
+    '''
+    qs = model.objects.filter(inventory=OuterRef('pk'), **filters)
+    if hasattr(qs, 'non_polymorphic'):
+        qs = qs.non_polymorphic()
+    counts = qs.order_by().values('inventory').annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
 
 class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
     '''
@@ -218,19 +238,25 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
             group_children.add(from_group_id)
         return group_children_map
 
-    def get_script_data(self, hostvars=False, towervars=False, show_all=False):
+    def _get_script_hosts_q(self, show_all=False):
         if show_all:
-            hosts_q = dict()
-        else:
-            hosts_q = dict(enabled=True)
+            return dict()
+        return dict(enabled=True)
+
+    def _get_script_group_data(self, show_all=False):
+        '''
+        Return the groups of the inventory script data, or None for a smart
+        inventory without hosts.
+        '''
+        hosts_q = self._get_script_hosts_q(show_all)
         data = dict()
 
         if self.variables_dict:
             all_group = data.setdefault('all', dict())
             all_group['vars'] = self.variables_dict
         if self.kind == 'smart':
-            if len(self.hosts.all()) == 0:
-                return {}
+            if not self.hosts.exists():
+                return None
             else:
                 all_group = data.setdefault('all', dict())
                 smart_hosts_qs = self.hosts.filter(**hosts_q).all()
@@ -274,19 +300,59 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
                 group_info['children'] = group_children_map.get(group.id, [])
                 group_info['vars'] = group.variables_dict
                 data[group.name] = group_info
+        return data
+
+    def _iter_script_hostvars(self, towervars=False, show_all=False):
+        '''
+        Yield (host name, hostvars) for every host of the inventory script
+        data, one host at a time.
+        '''
+        hosts_qs = self.hosts.filter(**self._get_script_hosts_q(show_all))
+        for host in hosts_qs.only('id', 'name', 'enabled', 'variables').iterator():
+            host_vars = host.variables_dict
+            if towervars:
+                host_vars.update(dict(remote_tower_enabled=str(host.enabled).lower(),
+                                      remote_tower_id=host.id))
+            yield host.name, host_vars
+
+    def get_script_data(self, hostvars=False, towervars=False, show_all=False):
+        data = self._get_script_group_data(show_all)
+        if data is None:
+            return {}
 
         if hostvars:
             data.setdefault('_meta', dict())
             data['_meta'].setdefault('hostvars', dict())
-            for host in self.hosts.filter(**hosts_q):
-                data['_meta']['hostvars'][host.name] = host.variables_dict
-                if towervars:
-                    tower_dict = dict(remote_tower_enabled=str(host.enabled).lower(),
-                                      remote_tower_id=host.id)
-                    data['_meta']['hostvars'][host.name].update(tower_dict)
+            for host_name, host_vars in self._iter_script_hostvars(towervars, show_all):
+                data['_meta']['hostvars'][host_name] = host_vars
 
         return data
 
+    def write_script_data(self, f, hostvars=False, towervars=False, show_all=False):
+        '''
+        Write the JSON encoded get_script_data() to the file object `f`,
+        encoding the hostvars one host at a time instead of holding them
+        all in memory.
+        '''
+        data = self._get_script_group_data(show_all)
+        if data is None:
+            data = {}
+        elif hostvars and '_meta' not in data:
+            f.write('{')
+            for key, value in data.items():
+                f.write('{}: {}, '.format(json.dumps(key), json.dumps(value)))
+            f.write('"_meta": {"hostvars": {')
+            separator = ''
+            for host_name, host_vars in self._iter_script_hostvars(towervars, show_all):
+                f.write('{}{}: {}'.format(separator, json.dumps(host_name), json.dumps(host_vars)))
+                separator = ', '
+            f.write('}}}')
+            return
+        elif hostvars:
+            # A group named "_meta" shares its key with the hostvars.
+            data = self.get_script_data(hostvars=hostvars, towervars=towervars, show_all=show_all)
+        json.dump(data, f)
+
     def update_host_computed_fields(self):
         '''
         Update computed fields for all hosts in this inventory.
@@ -409,38 +475,58 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
             self.update_host_computed_fields()
         if update_groups:
             self.update_group_computed_fields()
-        active_hosts = self.hosts
-        failed_hosts = active_hosts.filter(has_active_failures=True)
-        active_groups = self.groups
         if self.kind == 'smart':
-            active_groups = active_groups.none()
-        failed_groups = active_groups.filter(has_active_failures=True)
-        if self.kind == 'smart':
-            active_inventory_sources = self.inventory_sources.none()
+            # Smart inventory hosts are unique by name across inventories, so
+            # they can only be counted through the smart host queryset; smart
+            # inventories have no groups or inventory sources.
+            counts = self.hosts.order_by().aggregate(
+                total_hosts=Count('pk'),
+                hosts_with_active_failures=Sum(Case(
+                    When(has_active_failures=True, then=Value(1)),
+                    default=Value(0), output_field=IntegerField()
+                )),
+            )
+            counts.update(total_groups=0, groups_with_active_failures=0,
+                          total_inventory_sources=0, inventory_sources_with_failures=0)
+            current = Inventory.objects.filter(pk=self.pk).values(*COMPUTED_FIELDS).first()
         else:
-            active_inventory_sources = self.inventory_sources.filter(source__in=CLOUD_INVENTORY_SOURCES)
-        failed_inventory_sources = active_inventory_sources.filter(last_job_failed=True)
-        computed_fields = {
-            'has_active_failures': bool(failed_hosts.count()),
-            'total_hosts': active_hosts.count(),
-            'hosts_with_active_failures': failed_hosts.count(),
-            'total_groups': active_groups.count(),
-            'groups_with_active_failures': failed_groups.count(),
-            'has_inventory_sources': bool(active_inventory_sources.count()),
-            'total_inventory_sources': active_inventory_sources.count(),
-            'inventory_sources_with_failures': failed_inventory_sources.count(),
-        }
-        # CentOS python seems to have issues clobbering the inventory on poor timing during certain operations
-        iobj = Inventory.objects.get(id=self.id)
-        for field, value in computed_fields.items():
-            if getattr(iobj, field) != value:
-                setattr(iobj, field, value)
-                # update in-memory object
-                setattr(self, field, value)
+            cloud_sources = dict(source__in=CLOUD_INVENTORY_SOURCES)
+            count_subqueries = {
+                'total_hosts': _count_subquery(Host),
+                'hosts_with_active_failures': _count_subquery(Host, has_active_failures=True),
+                'total_groups': _count_subquery(Group),
+                'groups_with_active_failures': _count_subquery(Group, has_active_failures=True),
+                'total_inventory_sources': _count_subquery(InventorySource, **cloud_sources),
+                'inventory_sources_with_failures': _count_subquery(InventorySource, last_job_failed=True,
+                                                                   **cloud_sources),
+            }
+            # Annotation names may not clash with the model fields they are
+            # compared against, so count into prefixed aliases.
+            row = Inventory.objects.filter(pk=self.pk).annotate(**{
+                '_count_' + field: subquery for field, subquery in count_subqueries.items()
+            }).values(*COMPUTED_FIELDS + ['_count_' + field for field in count_subqueries]).first()
+            if row is None:
+                current = None
             else:
+                counts = {field: row.pop('_count_' + field) for field in count_subqueries}
+                current = row
+        if current is None:
+            raise Inventory.DoesNotExist('Inventory {} no longer exists.'.format(self.pk))
+        counts = {field: value or 0 for field, value in counts.items()}
+        computed_fields = dict(
+            counts,
+            has_active_failures=bool(counts['hosts_with_active_failures']),
+            has_inventory_sources=bool(counts['total_inventory_sources']),
+        )
+        for field, value in computed_fields.items():
+            # update in-memory object
+            setattr(self, field, value)
+            if current[field] == value:
                 computed_fields.pop(field)
         if computed_fields:
-            iobj.save(update_fields=computed_fields.keys())
+            # Only the computed counters are written, so a concurrent save of
+            # the other inventory fields is never clobbered.
+            Inventory.objects.filter(pk=self.pk).update(**computed_fields)
         logger.debug("Finished updating inventory computed fields")
 
     def websocket_emit_status(self, status):
@@ -478,7 +564,7 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
         if self.kind == 'smart' and settings.AWX_REBUILD_SMART_MEMBERSHIP:
             def on_commit():
                 from awx.main.tasks import update_host_smart_inventory_memberships
-                update_host_smart_inventory_memberships.delay()
+                update_host_smart_inventory_memberships.delay(inventory_ids=[self.pk])
             connection.on_commit(on_commit)
 
     def save(self, *args, **kwargs):
@@ -489,10 +575,6 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
             # Minimal update of host_count for smart inventory host filter changes
             self.update_computed_fields(update_groups=False, update_hosts=False)
 
-    def delete(self, *args, **kwargs):
-        self._update_host_smart_inventory_memeberships()
-        super(Inventory, self).delete(*args, **kwargs)
-
     '''
     RelatedJobsMixin
     '''
@@ -688,16 +770,26 @@ class Host(CommonModelNameNotUnique, RelatedJobsMixin):
             host_name = self.variables_dict['ansible_host']
         return host_name
 
+    def __init__(self, *args, **kwargs):
+        super(Host, self).__init__(*args, **kwargs)
+        # on a rename, the hosts sharing the old name are re-tested too
+        self._loaded_name = self.__dict__.get('name')
+
     def _update_host_smart_inventory_memeberships(self):
         if settings.AWX_REBUILD_SMART_MEMBERSHIP:
+            host_names = [self.name]
+            if self._loaded_name and self._loaded_name != self.name:
+                host_names.append(self._loaded_name)
+
             def on_commit():
                 from awx.main.tasks import update_host_smart_inventory_memberships
-                update_host_smart_inventory_memberships.delay()
+                update_host_smart_inventory_memberships.delay(host_names=host_names)
             connection.on_commit(on_commit)
 
     def save(self, *args, **kwargs):
         self._update_host_smart_inventory_memeberships()
         super(Host, self).save(*args, **kwargs)
+        self._loaded_name = self.name
 
     def delete(self, *args, **kwargs):
         self._update_host_smart_inventory_memeberships()
@@ -791,7 +883,7 @@ class Group(CommonModelNameNotUnique, RelatedJobsMixin):
     @transaction.atomic
     def delete_recursive(self):
         from awx.main.utils import ignore_inventory_computed_fields
-        from awx.main.tasks import update_inventory_computed_fields
+        from awx.main.tasks import schedule_inventory_computed_fields_update
         from awx.main.signals import disable_activity_stream, activity_stream_delete
 
 
@@ -846,7 +938,7 @@ class Group(CommonModelNameNotUnique, RelatedJobsMixin):
                 marked_groups.append(group)
             Group.objects.filter(id__in=marked_groups).delete()
             Host.objects.filter(id__in=marked_hosts).delete()
-            update_inventory_computed_fields.delay(self.inventory.id)
+            schedule_inventory_computed_fields_update(self.inventory.id)
         with ignore_inventory_computed_fields():
             with disable_activity_stream():
                 mark_actual()
@@ -641,6 +641,9 @@ class Job(UnifiedJob, JobOptions, SurveyJobMixin, JobNotificationMixin, TaskMana
             count_hosts = 2
         else:
             count_hosts = Host.objects.filter(inventory__jobs__pk=self.pk).count()
+        return self.impact_for_host_count(count_hosts)
+
+    def impact_for_host_count(self, count_hosts):
         return min(count_hosts, 5 if self.forks == 0 else self.forks) + 1
 
     @property
@@ -2,18 +2,17 @@
 # All Rights Reserved.
 
 # Python
-from StringIO import StringIO
+import io
 import json
 import logging
-import os
 import re
-import subprocess
-import tempfile
 from collections import OrderedDict
 
 # Django
 from django.conf import settings
 from django.db import models, connection
+from django.db.models.functions import Substr
+from django.core.cache import cache
 from django.core.exceptions import NON_FIELD_ERRORS
 from django.utils.translation import ugettext_lazy as _
 from django.utils.timezone import now
@@ -39,6 +38,7 @@ from awx.main.utils import (
     get_type_for_model, parse_yaml_or_json
 )
 from awx.main.utils import polymorphic
+from awx.main.utils.pgnotify import pg_notify
 from awx.main.constants import ACTIVE_STATES, CAN_CANCEL
 from awx.main.redact import UriCleaner, REPLACE_STR
 from awx.main.consumers import emit_channel_notification
@@ -507,6 +507,31 @@ class StdoutMaxBytesExceeded(Exception):
         self.supported = supported
 
 
+class StdoutChunkReader(io.RawIOBase):
+    '''
+    Unseekable, read-only file over an iterable of unicode stdout chunks,
+    which are utf-8 encoded as they are read.
+    '''
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.pending:
+            try:
+                self.pending = next(self.chunks).encode('utf-8')
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self.pending))
+        b[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+
 class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique, UnifiedJobTypeStringMixin, TaskManagerUnifiedJobMixin):
     '''
     Concrete base class for unified job run by the task engine.
@@ -514,6 +539,9 @@ class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique
 
     STATUS_CHOICES = UnifiedJobTemplate.JOB_STATUS_CHOICES
 
+    # lines between entries in the cached line offset index of legacy stdout
+    STDOUT_LINE_INDEX_INTERVAL = 100
+
     LAUNCH_TYPE_CHOICES = [
         ('manual', _('Manual')),            # Job was started manually by a user.
         ('relaunch', _('Relaunch')),        # Job was started via relaunch.
@@ -905,6 +933,8 @@ class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique
         related = UnifiedJobDeprecatedStdout.objects.get(pk=self.pk)
         related.result_stdout_text = value
         related.save()
+        self.__dict__.pop('_legacy_stdout_index', None)
+        cache.delete(self._legacy_stdout_cache_key)
 
     @property
     def event_parent_key(self):
@@ -933,92 +963,69 @@ class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique
             return True  # Model without events, such as WFJT
         return self.emitted_events == event_qs.count()
 
+    def result_stdout_raw_chunks(self):
+        """
+        Generator which yields all stdout for the UnifiedJob, in order, as
+        unicode chunks of one or more complete lines.
+
+        Nothing is written to disk and only a bounded number of rows is held
+        in memory at once, so this is suitable for streaming arbitrarily
+        large output to a client.
+        """
+        # Before the addition of event-based stdout, older versions of
+        # awx stored stdout as raw text blobs in a certain database column
+        # (`main_unifiedjob.result_stdout_text`)
+        # For older installs, this data still exists in the database; check for
+        # it and use if it exists, a range of lines at a time
+        legacy_index = self._legacy_stdout_line_index()
+        if legacy_index:
+            n_lines = legacy_index[0]
+            step = self.STDOUT_LINE_INDEX_INTERVAL * 10
+            for start in range(0, n_lines, step):
+                for line in self._legacy_stdout_lines(legacy_index, start, min(start + step, n_lines)):
+                    yield line
+            return
+
+        # Note: `iterator()` on a values_list reads `main_jobevent.stdout`
+        # through a server-side cursor (on postgres), a chunk of rows at a
+        # time, without constructing model objects; it never materializes
+        # all of the (potentially many MB+) stdout at once.  Events store
+        # each line terminated by \r\n (as written to the pty), minus the
+        # final line ending.
+        stdout_qs = self.get_event_queryset().order_by('start_line').values_list('stdout', 'start_line', 'end_line')
+        for stdout, start_line, end_line in stdout_qs.iterator():
+            if not stdout and end_line <= start_line:
+                # an event which produced no output at all
+                continue
+            yield stdout.replace(u'\r\n', u'\n') + u'\n'
+
     def result_stdout_raw_handle(self, enforce_max_bytes=True):
         """
         This method returns a file-like object ready to be read which contains
         all stdout for the UnifiedJob.
 
-        If the size of the file is greater than
+        If the size of the stdout is greater than
         `settings.STDOUT_MAX_BYTES_DISPLAY`, a StdoutMaxBytesExceeded exception
-        will be raised.
+        will be raised.  To read the entire stdout regardless of size, iterate
+        `result_stdout_raw_chunks()` instead.
         """
         max_supported = settings.STDOUT_MAX_BYTES_DISPLAY
 
         if enforce_max_bytes:
-            # If enforce_max_bytes is True, we're not grabbing the whole file,
-            # just the first <settings.STDOUT_MAX_BYTES_DISPLAY> bytes;
-            # in this scenario, it's probably safe to use a StringIO.
-            fd = StringIO()
-        else:
-            # If enforce_max_bytes = False, that means they're downloading
-            # the entire file.  To avoid ballooning memory, let's write the
-            # stdout content to a temporary disk location
-            if not os.path.exists(settings.JOBOUTPUT_ROOT):
-                os.makedirs(settings.JOBOUTPUT_ROOT)
-            fd = tempfile.NamedTemporaryFile(
-                prefix='{}-{}-'.format(self.model_to_str(), self.pk),
-                suffix='.out',
-                dir=settings.JOBOUTPUT_ROOT
-            )
-
-        # Before the addition of event-based stdout, older versions of
-        # awx stored stdout as raw text blobs in a certain database column
-        # (`main_unifiedjob.result_stdout_text`)
-        # For older installs, this data still exists in the database; check for
-        # it and use if it exists
-        legacy_stdout_text = self.result_stdout_text
-        if legacy_stdout_text:
-            if enforce_max_bytes and len(legacy_stdout_text) > max_supported:
-                raise StdoutMaxBytesExceeded(len(legacy_stdout_text), max_supported)
-            fd.write(legacy_stdout_text)
-            if hasattr(fd, 'name'):
-                fd.flush()
-                return open(fd.name, 'r')
+            legacy_index = self._legacy_stdout_line_index()
+            if legacy_index:
+                total = legacy_index[1][-1]
             else:
-                # we just wrote to this StringIO, so rewind it
-                fd.seek(0)
-                return fd
-        else:
-            # Note: the code in this block _intentionally_ does not use the
-            # Django ORM because of the potential size (many MB+) of
-            # `main_jobevent.stdout`; we *do not* want to generate queries
-            # here that construct model objects by fetching large gobs of
-            # data (and potentially ballooning memory usage); instead, we
-            # just want to write concatenated values of a certain column
-            # (`stdout`) directly to a file
-
-            with connection.cursor() as cursor:
-
-                if enforce_max_bytes:
-                    # detect the length of all stdout for this UnifiedJob, and
-                    # if it exceeds settings.STDOUT_MAX_BYTES_DISPLAY bytes,
-                    # don't bother actually fetching the data
-                    total = self.get_event_queryset().aggregate(
-                        total=models.Sum(models.Func(models.F('stdout'), function='LENGTH'))
-                    )['total']
-                    if total > max_supported:
-                        raise StdoutMaxBytesExceeded(total, max_supported)
-
-                cursor.copy_expert(
-                    "copy (select stdout from {} where {}={} order by start_line) to stdout".format(
-                        self._meta.db_table + 'event',
-                        self.event_parent_key,
-                        self.id
-                    ),
-                    fd
-                )
-
-                if hasattr(fd, 'name'):
-                    # If we're dealing with a physical file, use `sed` to clean
-                    # up escaped line sequences
-                    fd.flush()
-                    subprocess.Popen("sed -i 's/\\\\r\\\\n/\\n/g' {}".format(fd.name), shell=True).wait()
-                    return open(fd.name, 'r')
-                else:
-                    # If we're dealing with an in-memory string buffer, use
-                    # string.replace()
-                    fd = StringIO(fd.getvalue().replace('\\r\\n', '\n'))
-                    return fd
+                # detect the length of all stdout for this UnifiedJob, and
+                # if it exceeds settings.STDOUT_MAX_BYTES_DISPLAY bytes,
+                # don't bother actually fetching the data
+                total = self.get_event_queryset().aggregate(
+                    total=models.Sum(models.Func(models.F('stdout'), function='LENGTH'))
+                )['total']
+            if total > max_supported:
+                raise StdoutMaxBytesExceeded(total, max_supported)
+
+        return io.BufferedReader(StdoutChunkReader(self.result_stdout_raw_chunks()))
 
     def _escape_ascii(self, content):
         # Remove ANSI escape sequences used to embed event data.
@@ -1043,25 +1050,127 @@ class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique
     def result_stdout(self):
         return self._result_stdout_raw(escape_ascii=True)
 
+    def _legacy_stdout_line_index(self):
+        """
+        Returns (line count, character offsets of every
+        STDOUT_LINE_INDEX_INTERVAL'th line) for a job's legacy
+        `result_stdout_text`, or None if the job has none.
+
+        The index is cached, so that reading a range of lines only fetches
+        the characters spanning that range from the database; whether the
+        job has legacy stdout at all is remembered on the instance.
+        """
+        if '_legacy_stdout_index' not in self.__dict__:
+            self._legacy_stdout_index = self._build_legacy_stdout_line_index()
+        return self._legacy_stdout_index
+
+    @property
+    def _legacy_stdout_cache_key(self):
+        return 'awx_legacy_stdout_line_index_{}'.format(self.pk)
+
+    def _build_legacy_stdout_line_index(self):
+        cache_key = self._legacy_stdout_cache_key
+        index = cache.get(cache_key)
+        if index is not None:
+            # False: the job has no legacy stdout
+            return index or None
+        has_legacy_stdout = UnifiedJobDeprecatedStdout.objects.filter(pk=self.pk).exclude(
+            result_stdout_text__isnull=True
+        ).exclude(result_stdout_text='').exists()
+        if not has_legacy_stdout:
+            cache.set(cache_key, False, 86400)
+            return None
+        offsets = []
+        position = 0
+        n_lines = 0
+        for n_lines, line in enumerate(io.StringIO(smart_text(self.result_stdout_text)), 1):
+            if (n_lines - 1) % self.STDOUT_LINE_INDEX_INTERVAL == 0:
+                offsets.append(position)
+            position += len(line)
+        offsets.append(position)
+        index = (n_lines, offsets)
+        # legacy stdout never changes once written
+        cache.set(cache_key, index, 86400)
+        return index
+
+    def _legacy_stdout_lines(self, line_index, start, end):
+        # Fetch just the characters for lines [start, end) using the offset
+        # of the indexed lines on either side of the range.
+        n_lines, offsets = line_index
+        interval = self.STDOUT_LINE_INDEX_INTERVAL
+        first_indexed = start // interval
+        begin = offsets[first_indexed]
+        finish = offsets[min(-(-end // interval), len(offsets) - 1)]
+        text = UnifiedJobDeprecatedStdout.objects.filter(pk=self.pk).annotate(
+            chunk=Substr('result_stdout_text', begin + 1, max(finish - begin, 1))
+        ).values_list('chunk', flat=True).first() or u''
+        skip = start - first_indexed * interval
+        return io.StringIO(smart_text(text)).readlines()[skip:skip + (end - start)]
+
+    @staticmethod
+    def _event_stdout_lines(stdout, n_lines):
+        # The lines an event contributed to stdout, according to its stored
+        # start_line/end_line
+        if n_lines <= 0:
+            return []
+        lines = stdout.split(u'\r\n')[:n_lines]
+        return [line + u'\n' for line in lines + [u''] * (n_lines - len(lines))]
+
     def _result_stdout_raw_limited(self, start_line=0, end_line=None, redact_sensitive=True, escape_ascii=False):
-        return_buffer = StringIO()
+        """
+        Returns stdout lines [start_line:end_line] (with Python slice
+        semantics, so negative values count back from the end), the range
+        actually returned, and the total number of lines.
+
+        Only the events whose stored start_line/end_line overlap the range
+        are read, but, as for the full stdout, StdoutMaxBytesExceeded is
+        raised if all of the job's stdout is larger than
+        `settings.STDOUT_MAX_BYTES_DISPLAY`.
+        """
+        start_line = int(start_line)
         if end_line is not None:
             end_line = int(end_line)
-        stdout_lines = self.result_stdout_raw_handle().readlines()
-        absolute_end = len(stdout_lines)
-        for line in stdout_lines[int(start_line):end_line]:
-            return_buffer.write(line)
-        if int(start_line) < 0:
-            start_actual = len(stdout_lines) + int(start_line)
-            end_actual = len(stdout_lines)
+
+        legacy_index = self._legacy_stdout_line_index()
+        if legacy_index:
+            absolute_end, offsets = legacy_index
+            total = offsets[-1]
+        else:
+            event_qs = self.get_event_queryset()
+            totals = event_qs.aggregate(
+                end=models.Max('end_line'),
+                total=models.Sum(models.Func(models.F('stdout'), function='LENGTH')),
+            )
+            absolute_end = totals['end'] or 0
+            total = totals['total'] or 0
+        max_supported = settings.STDOUT_MAX_BYTES_DISPLAY
+        if total > max_supported:
+            raise StdoutMaxBytesExceeded(total, max_supported)
+        start, end, step = slice(start_line, end_line).indices(absolute_end)
+        end = max(start, end)
+
+        if legacy_index:
+            lines = self._legacy_stdout_lines(legacy_index, start, end) if end > start else []
         else:
-            start_actual = int(start_line)
+            lines = []
+            range_qs = event_qs.filter(start_line__lt=end, end_line__gt=start)
+            for event_start, event_end, stdout in range_qs.order_by('start_line').values_list(
+                'start_line', 'end_line', 'stdout'
+            ).iterator():
+                event_lines = self._event_stdout_lines(stdout, event_end - event_start)
+                lines.extend(event_lines[max(start - event_start, 0):end - event_start])
+
+        if start_line < 0:
+            start_actual = absolute_end + start_line
+            end_actual = absolute_end
+        else:
+            start_actual = start_line
             if end_line is not None:
-                end_actual = min(int(end_line), len(stdout_lines))
+                end_actual = min(end_line, absolute_end)
             else:
-                end_actual = len(stdout_lines)
+                end_actual = absolute_end
 
-        return_buffer = return_buffer.getvalue().decode('utf-8')
+        return_buffer = u''.join(lines)
         if redact_sensitive:
             return_buffer = UriCleaner.remove_sensitive(return_buffer)
         if escape_ascii:
@@ -1286,6 +1395,10 @@ class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique
     def can_cancel(self):
         return bool(self.status in CAN_CANCEL)
 
+    @property
+    def cancel_notification_channel(self):
+        return 'awx_cancel_{}'.format(self.pk)
+
     def _force_cancel(self):
         # Update the status to 'canceled' if we can detect that the job
         # really isn't running (i.e. celery has crashed or forcefully
@@ -1344,6 +1457,8 @@ class UnifiedJob(PolymorphicModel, PasswordFieldsModel, CommonModelNameNotUnique
                     self.job_explanation = job_explanation
                     cancel_fields.append('job_explanation')
                 self.save(update_fields=cancel_fields)
+                # wake the task running this job so that it stops right away
+                pg_notify(self.cancel_notification_channel)
                 self.websocket_emit_status("canceled")
             if settings.BROKER_URL.startswith('amqp://'):
                 self._force_cancel()
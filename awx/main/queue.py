@@ -4,6 +4,7 @@
 # Python
 import logging
 import os
+import threading
 
 from six.moves import xrange
 
@@ -13,41 +14,101 @@ from django.conf import settings
 # Kombu
 from kombu import Connection, Exchange, Producer
 
-__all__ = ['CallbackQueueDispatcher']
+__all__ = ['CallbackQueueDispatcher', 'EVENT_BATCH_KEY']
+
+# Messages holding several events carry them as a list under this key; see
+# run_callback_receiver.CallbackBrokerWorker.process_task.
+EVENT_BATCH_KEY = 'events'
 
 
 class CallbackQueueDispatcher(object):
+    '''
+    Publish events to the callback receiver.
+
+    When CALLBACK_QUEUE_BATCH_SIZE is more than one, events are collected and
+    published together as a single message once that many have been
+    collected, CALLBACK_QUEUE_BATCH_TIMEOUT seconds after the first of them,
+    or as soon as an EOF marker is dispatched.
+    '''
 
     def __init__(self):
         self.callback_connection = getattr(settings, 'BROKER_URL', None)
         self.connection_queue = getattr(settings, 'CALLBACK_QUEUE', '')
+        self.batch_size = getattr(settings, 'CALLBACK_QUEUE_BATCH_SIZE', 1)
+        self.batch_timeout = getattr(settings, 'CALLBACK_QUEUE_BATCH_TIMEOUT', 0.25)
+        self.compression = getattr(settings, 'CALLBACK_QUEUE_COMPRESSION', 'bzip2')
         self.connection = None
         self.exchange = None
+        self.producer = None
+        self.messages_published = 0
+        self.batch = []
+        self.batch_lock = threading.Lock()
+        self.batch_timer = None
         self.logger = logging.getLogger('awx.main.queue.CallbackQueueDispatcher')
 
     def dispatch(self, obj):
         if not self.callback_connection or not self.connection_queue:
             return
+        if self.batch_size <= 1:
+            self.publish(obj)
+            return
+        with self.batch_lock:
+            self.batch.append(obj)
+            if len(self.batch) >= self.batch_size or obj.get('event') == 'EOF':
+                self._flush()
+            elif self.batch_timer is None:
+                self.batch_timer = threading.Timer(self.batch_timeout, self.flush)
+                self.batch_timer.daemon = True
+                self.batch_timer.start()
+
+    def flush(self):
+        with self.batch_lock:
+            self._flush()
+
+    def _flush(self):
+        if self.batch_timer is not None:
+            self.batch_timer.cancel()
+            self.batch_timer = None
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        if len(batch) == 1:
+            self.publish(batch[0])
+        else:
+            self.publish({EVENT_BATCH_KEY: batch})
+
+    def close_connection(self):
+        if self.connection is not None:
+            try:
+                self.connection.release()
+            except Exception:
+                pass
+        self.connection = self.exchange = self.producer = None
+
+    def publish(self, body):
         active_pid = os.getpid()
         for retry_count in xrange(4):
             try:
-                if not hasattr(self, 'connection_pid'):
-                    self.connection_pid = active_pid
-                if self.connection_pid != active_pid:
+                if getattr(self, 'connection_pid', active_pid) != active_pid:
+                    # never share the connection of the process we were
+                    # forked from
                     self.connection = None
+                self.connection_pid = active_pid
                 if self.connection is None:
                     self.connection = Connection(self.callback_connection)
                     self.exchange = Exchange(self.connection_queue, type='direct')
+                    self.producer = Producer(self.connection)
 
-                producer = Producer(self.connection)
-                producer.publish(obj,
-                                 serializer='json',
-                                 compression='bzip2',
-                                 exchange=self.exchange,
-                                 declare=[self.exchange],
-                                 delivery_mode="persistent" if settings.PERSISTENT_CALLBACK_MESSAGES else "transient",
-                                 routing_key=self.connection_queue)
+                self.producer.publish(body,
+                                      serializer='json',
+                                      compression=self.compression or None,
+                                      exchange=self.exchange,
+                                      declare=[self.exchange],
+                                      delivery_mode="persistent" if settings.PERSISTENT_CALLBACK_MESSAGES else "transient",
+                                      routing_key=self.connection_queue)
+                self.messages_published += 1
                 return
             except Exception as e:
                 self.logger.info('Publish Job Event Exception: %r, retry=%d', e,
                                  retry_count, exc_info=True)
+                self.close_connection()
@@ -1,4 +1,7 @@
 
+# Python
+from collections import defaultdict
+
 from awx.main.models import (
     Job,
     AdHocCommand,
@@ -14,12 +17,14 @@ class SimpleDAG(object):
     def __init__(self):
         self.nodes = []
         self.edges = []
+        # node_object -> index into self.nodes
+        self.node_obj_to_node_index = dict()
+        # node index -> [(node index, label), ...] in edge insertion order
+        self.node_from_edges = defaultdict(list)
+        self.node_to_edges = defaultdict(list)
 
     def __contains__(self, obj):
-        for node in self.nodes:
-            if node['node_object'] == obj:
-                return True
-        return False
+        return obj in self.node_obj_to_node_index
 
     def __len__(self):
         return len(self.nodes)
@@ -66,6 +71,7 @@ class SimpleDAG(object):
 
     def add_node(self, obj, metadata=None):
         if self.find_ord(obj) is None:
+            self.node_obj_to_node_index[obj] = len(self.nodes)
             self.nodes.append(dict(node_object=obj, metadata=metadata))
 
     def add_edge(self, from_obj, to_obj, label=None):
@@ -73,52 +79,34 @@ class SimpleDAG(object):
         to_obj_ord = self.find_ord(to_obj)
         if from_obj_ord is None or to_obj_ord is None:
             raise LookupError("Object not found")
+        self.add_edge_by_ord(from_obj_ord, to_obj_ord, label)
+
+    def add_edge_by_ord(self, from_obj_ord, to_obj_ord, label=None):
         self.edges.append((from_obj_ord, to_obj_ord, label))
+        self.node_from_edges[from_obj_ord].append((to_obj_ord, label))
+        self.node_to_edges[to_obj_ord].append((from_obj_ord, label))
 
     def add_edges(self, edgelist):
         for edge_pair in edgelist:
             self.add_edge(edge_pair[0], edge_pair[1], edge_pair[2])
 
     def find_ord(self, obj):
-        for idx in range(len(self.nodes)):
-            if obj == self.nodes[idx]['node_object']:
-                return idx
-        return None
+        return self.node_obj_to_node_index.get(obj)
 
     def get_dependencies(self, obj, label=None):
-        antecedents = []
         this_ord = self.find_ord(obj)
-        for node, dep, lbl in self.edges:
-            if label:
-                if node == this_ord and lbl == label:
-                    antecedents.append(self.nodes[dep])
-            else:
-                if node == this_ord:
-                    antecedents.append(self.nodes[dep])
-        return antecedents
+        if this_ord is None:
+            return []
+        return [self.nodes[dep] for dep, lbl in self.node_from_edges[this_ord] if not label or lbl == label]
 
     def get_dependents(self, obj, label=None):
-        decendents = []
         this_ord = self.find_ord(obj)
-        for node, dep, lbl in self.edges:
-            if label:
-                if dep == this_ord and lbl == label:
-                    decendents.append(self.nodes[node])
-            else:
-                if dep == this_ord:
-                    decendents.append(self.nodes[node])
-        return decendents
+        if this_ord is None:
+            return []
+        return [self.nodes[node] for node, lbl in self.node_to_edges[this_ord] if not label or lbl == label]
 
     def get_leaf_nodes(self):
-        leafs = []
-        for n in self.nodes:
-            if len(self.get_dependencies(n['node_object'])) < 1:
-                leafs.append(n)
-        return leafs
+        return [n for idx, n in enumerate(self.nodes) if not self.node_from_edges.get(idx)]
 
     def get_root_nodes(self):
-        roots = []
-        for n in self.nodes:
-            if len(self.get_dependents(n['node_object'])) < 1:
-                roots.append(n)
-        return roots
+        return [n for idx, n in enumerate(self.nodes) if not self.node_to_edges.get(idx)]
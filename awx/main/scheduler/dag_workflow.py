@@ -1,25 +1,66 @@
 
+# Django
+from django.core.cache import cache
+
 # AWX
+from awx.main.models import UnifiedJob, WorkflowJobNode
 from awx.main.scheduler.dag_simple import SimpleDAG
 
 
 class WorkflowDAG(SimpleDAG):
+
+    EDGE_TYPES = ('success_nodes', 'failure_nodes', 'always_nodes')
+
+    # The nodes and edges of a workflow job are copied from its template at
+    # launch and never change afterwards, so they are compiled once and
+    # cached for as long as the workflow may be running.
+    COMPILED_GRAPH_CACHE_TIMEOUT = 60 * 60 * 24
+
     def __init__(self, workflow_job=None):
         super(WorkflowDAG, self).__init__()
         if workflow_job:
             self._init_graph(workflow_job)
 
-    def _init_graph(self, workflow_job):
-        node_qs = workflow_job.workflow_job_nodes
-        workflow_nodes = node_qs.prefetch_related('success_nodes', 'failure_nodes', 'always_nodes').all()
-        for workflow_node in workflow_nodes:
-            self.add_node(workflow_node)
+    @classmethod
+    def compiled_graph_cache_key(cls, workflow_job):
+        # created guards against reused ids in a recreated database
+        return 'awx_workflow_dag_{}_{}'.format(workflow_job.pk, workflow_job.created.isoformat())
+
+    @classmethod
+    def compile_graph(cls, workflow_job, refresh=False):
+        '''
+        Return the structure of a workflow job as (node ids, edges) where each
+        edge is a (from index, to index, edge type) tuple.
+        '''
+        cache_key = cls.compiled_graph_cache_key(workflow_job)
+        compiled = None if refresh else cache.get(cache_key)
+        if compiled is not None:
+            return compiled
+        node_ids = tuple(workflow_job.workflow_job_nodes.order_by('id').values_list('id', flat=True))
+        index = dict((node_id, idx) for idx, node_id in enumerate(node_ids))
+        edges = []
+        for node_type in cls.EDGE_TYPES:
+            through = getattr(WorkflowJobNode, node_type).through
+            for from_id, to_id in through.objects.filter(
+                from_workflowjobnode__workflow_job=workflow_job
+            ).order_by('id').values_list('from_workflowjobnode_id', 'to_workflowjobnode_id'):
+                edges.append((index[from_id], index[to_id], node_type))
+        compiled = (node_ids, tuple(edges))
+        cache.set(cache_key, compiled, cls.COMPILED_GRAPH_CACHE_TIMEOUT)
+        return compiled
 
-        for node_type in ['success_nodes', 'failure_nodes', 'always_nodes']:
-            for workflow_node in workflow_nodes:
-                related_nodes = getattr(workflow_node, node_type).all()
-                for related_node in related_nodes:
-                    self.add_edge(workflow_node, related_node, node_type)
+    def _init_graph(self, workflow_job):
+        node_ids, edges = self.compile_graph(workflow_job)
+        # node jobs are the only part of the graph that changes between cycles
+        workflow_nodes = dict(
+            (node.id, node) for node in workflow_job.workflow_job_nodes.select_related('job')
+        )
+        if set(node_ids) != set(workflow_nodes):
+            node_ids, edges = self.compile_graph(workflow_job, refresh=True)
+        for node_id in node_ids:
+            self.add_node(workflow_nodes[node_id])
+        for from_ord, to_ord, node_type in edges:
+            self.add_edge_by_ord(from_ord, to_ord, node_type)
 
     def bfs_nodes_to_run(self):
         root_nodes = self.get_root_nodes()
@@ -50,13 +91,10 @@ class WorkflowDAG(SimpleDAG):
         return [n['node_object'] for n in nodes_found]
 
     def cancel_node_jobs(self):
-        for n in self.nodes:
-            obj = n['node_object']
-            job = obj.job
-
-            if not job:
-                continue
-            elif job.can_cancel:
+        job_ids = [n['node_object'].job_id for n in self.nodes if n['node_object'].job_id]
+        # node jobs are loaded as plain unified jobs; cancel through the concrete types
+        for job in UnifiedJob.objects.filter(id__in=job_ids):
+            if job.can_cancel:
                 job.cancel()
 
     def is_workflow_done(self):
@@ -2,6 +2,7 @@
 # All Rights Reserved
 
 # Python
+from collections import defaultdict
 from datetime import datetime, timedelta
 import logging
 import uuid
@@ -15,12 +16,13 @@ from django.core.cache import cache
 from django.db import transaction, connection, DatabaseError
 from django.utils.translation import ugettext_lazy as _
 from django.utils.timezone import now as tz_now, utc
-from django.db.models import Q
+from django.db.models import Q, Count, prefetch_related_objects
 from django.contrib.contenttypes.models import ContentType
 
 # AWX
 from awx.main.models import (
     AdHocCommand,
+    Host,
     Instance,
     InstanceGroup,
     InventorySource,
@@ -29,6 +31,7 @@ from awx.main.models import (
     Project,
     ProjectUpdate,
     SystemJob,
+    TaskLease,
     UnifiedJob,
     WorkflowJob,
 )
@@ -40,48 +43,181 @@ from awx.main.signals import disable_activity_stream
 from awx.main.scheduler.dependency_graph import DependencyGraph
 from awx.main.utils import decrypt_field
 
-# Celery
-from celery import Celery
-from celery.app.control import Inspect
-
 
 logger = logging.getLogger('awx.main.scheduler')
 
 
+class TaskManagerState(object):
+    '''
+    Active tasks kept between scheduler cycles when
+    AWX_INCREMENTAL_TASK_MANAGER is enabled.
+
+    Each cycle compares the CHANGE_FIELDS of the active unified jobs against
+    the cached copies and only reloads the tasks that were created or changed
+    since the previous cycle; tasks that finished or were
+    deleted are dropped. A full rescan runs every
+    AWX_TASK_MANAGER_FULL_RESCAN_INTERVAL seconds as a consistency check.
+    '''
+
+    # `modified` alone misses the transitions saved by BaseTask.update_model,
+    # which passes it in update_fields and so never bumps it
+    CHANGE_FIELDS = ('modified', 'status', 'execution_node', 'cancel_flag')
+
+    def __init__(self):
+        self.tasks = {}
+        self.last_full_rescan = None
+
+    def needs_full_rescan(self, now):
+        if self.last_full_rescan is None:
+            return True
+        elapsed = (now - self.last_full_rescan).total_seconds()
+        return elapsed >= settings.AWX_TASK_MANAGER_FULL_RESCAN_INTERVAL
+
+    def reset(self, tasks, now):
+        self.tasks = dict((task.id, task) for task in tasks)
+        self.last_full_rescan = now
+
+    def invalidate(self):
+        self.tasks = {}
+        self.last_full_rescan = None
+
+    def changed_ids(self, active):
+        '''
+        Given a mapping of active task id -> tuple of its CHANGE_FIELDS, drop
+        cached tasks that are no longer active and return the ids that need
+        to be reloaded.
+        '''
+        for task_id in list(self.tasks):
+            if task_id not in active:
+                del self.tasks[task_id]
+        changed = set()
+        for task_id, values in active.items():
+            task = self.tasks.get(task_id)
+            if task is None or tuple(getattr(task, field) for field in self.CHANGE_FIELDS) != values:
+                self.tasks.pop(task_id, None)
+                changed.add(task_id)
+        return changed
+
+    def update(self, tasks):
+        for task in tasks:
+            self.tasks[task.id] = task
+
+    def sorted_tasks(self):
+        return sorted(self.tasks.values(), key=lambda task: task.created)
+
+
 class TaskManager():
 
+    # shared by every TaskManager created in this process
+    state = TaskManagerState()
+
+    # unified job types scheduled by the task manager, loaded through the
+    # reverse one-to-one link from main_unifiedjob to their child table
+    TASK_MODELS = (Job, InventoryUpdate, ProjectUpdate, SystemJob, AdHocCommand, WorkflowJob)
+
+    # related objects loaded along with the tasks of a type
+    TASK_RELATED = {Job: 'project', InventoryUpdate: 'inventory_source'}
+
     def __init__(self):
         self.graph = dict()
+        self.instance_groups = dict()
+        # blocking is global across instance groups, so a single graph indexed
+        # by project, inventory and template ids answers it with one lookup
+        self.dependency_graph = DependencyGraph('all')
         for rampart_group in InstanceGroup.objects.prefetch_related('instances'):
-            self.graph[rampart_group.name] = dict(graph=DependencyGraph(rampart_group.name),
-                                                  capacity_total=rampart_group.capacity,
+            self.instance_groups[rampart_group.id] = rampart_group
+            self.graph[rampart_group.name] = dict(capacity_total=rampart_group.capacity,
                                                   consumed_capacity=0)
+        self.task_impacts = dict()
+        self.jobs_with_unfinished_dependencies = None
+        self.inventory_sources_by_inventory = dict()
+        self.latest_project_updates = dict()
+        self.latest_inventory_updates = dict()
+        self.workflow_dags = dict()
 
     def is_job_blocked(self, task):
-        # TODO: I'm not happy with this, I think blocking behavior should be decided outside of the dependency graph
-        #       in the old task manager this was handled as a method on each task object outside of the graph and
-        #       probably has the side effect of cutting down *a lot* of the logic from this task manager class
-        for g in self.graph:
-            if self.graph[g]['graph'].is_job_blocked(task):
-                return True
+        if self.dependency_graph.is_job_blocked(task):
+            return True
+
+        if type(task) is Job and self.jobs_with_unfinished_dependencies is not None:
+            return task.id in self.jobs_with_unfinished_dependencies
 
         if not task.dependent_jobs_finished():
             return True
 
         return False
 
+    def get_task_queryset(self, status_list=('pending', 'waiting', 'running')):
+        accessors = [model._meta.model_name for model in self.TASK_MODELS]
+        return UnifiedJob.objects.non_polymorphic().filter(status__in=status_list).exclude(
+            inventoryupdate__source='file'
+        ).select_related(*accessors + [
+            '{}__{}'.format(model._meta.model_name, related) for model, related in self.TASK_RELATED.items()
+        ]).order_by('created', 'id')
+
+    def load_tasks(self, queryset):
+        '''
+        Turn rows of a non-polymorphic UnifiedJob queryset into their concrete
+        task instances without issuing a query per job type.
+        '''
+        accessors = dict(
+            (ContentType.objects.get_for_model(model).id, model._meta.model_name)
+            for model in self.TASK_MODELS
+        )
+        tasks = []
+        for unified_job in queryset:
+            accessor = accessors.get(unified_job.polymorphic_ctype_id)
+            if accessor is None:
+                continue
+            task = getattr(unified_job, accessor)
+            if task.instance_group_id in self.instance_groups:
+                task.instance_group = self.instance_groups[task.instance_group_id]
+            tasks.append(task)
+        return tasks
+
     def get_tasks(self, status_list=('pending', 'waiting', 'running')):
-        jobs = [j for j in Job.objects.filter(status__in=status_list).prefetch_related('instance_group')]
-        inventory_updates_qs = InventoryUpdate.objects.filter(
-            status__in=status_list).exclude(source='file').prefetch_related('inventory_source', 'instance_group')
-        inventory_updates = [i for i in inventory_updates_qs]
-        project_updates = [p for p in ProjectUpdate.objects.filter(status__in=status_list).prefetch_related('instance_group')]
-        system_jobs = [s for s in SystemJob.objects.filter(status__in=status_list).prefetch_related('instance_group')]
-        ad_hoc_commands = [a for a in AdHocCommand.objects.filter(status__in=status_list).prefetch_related('instance_group')]
-        workflow_jobs = [w for w in WorkflowJob.objects.filter(status__in=status_list)]
-        all_tasks = sorted(jobs + project_updates + inventory_updates + system_jobs + ad_hoc_commands + workflow_jobs,
-                           key=lambda task: task.created)
-        return all_tasks
+        return self.load_tasks(self.get_task_queryset(status_list))
+
+    def refresh_related(self, tasks):
+        '''
+        Drop the related objects cached on `tasks` by earlier cycles, and
+        re-fetch the ones load_tasks provides with a query per task type.
+        '''
+        tasks_by_model = defaultdict(list)
+        for task in tasks:
+            for field in task._meta.concrete_fields:
+                if field.is_relation:
+                    task.__dict__.pop(field.get_cache_name(), None)
+            task.__dict__.pop('_prefetched_objects_cache', None)
+            if task.instance_group_id in self.instance_groups:
+                task.instance_group = self.instance_groups[task.instance_group_id]
+            tasks_by_model[type(task)].append(task)
+        for model, related in self.TASK_RELATED.items():
+            prefetch_related_objects(tasks_by_model[model], related)
+
+    def get_changed_tasks(self, status_list=('pending', 'waiting', 'running')):
+        '''
+        Incremental counterpart of get_tasks; only loads the tasks whose
+        status changed since the previous cycle in this process.
+        '''
+        now = tz_now()
+        if self.state.needs_full_rescan(now):
+            all_sorted_tasks = self.get_tasks(status_list)
+            self.state.reset(all_sorted_tasks, now)
+            logger.debug("Task manager full rescan found %d active tasks.", len(all_sorted_tasks))
+            return all_sorted_tasks
+
+        active_qs = UnifiedJob.objects.filter(status__in=status_list).exclude(inventoryupdate__source='file')
+        active = dict(
+            (row[0], row[1:]) for row in active_qs.values_list('id', *self.state.CHANGE_FIELDS)
+        )
+        changed = self.state.changed_ids(active)
+        # the unchanged tasks are kept, but not what they point to
+        self.refresh_related(self.state.tasks.values())
+        if changed:
+            self.state.update(self.load_tasks(self.get_task_queryset(status_list).filter(id__in=changed)))
+        logger.debug("Task manager reloaded %d of %d active tasks.", len(changed), len(active))
+        return self.state.sorted_tasks()
 
     '''
     Tasks that are running and SHOULD have a celery task.
@@ -106,56 +242,12 @@ class TaskManager():
                 waiting_jobs.append(j)
         return (execution_nodes, waiting_jobs)
 
-    '''
-    Tasks that are currently running in celery
-
-    Transform:
-    {
-        "celery@ec2-54-204-222-62.compute-1.amazonaws.com": [],
-        "celery@ec2-54-163-144-168.compute-1.amazonaws.com": [{
-            ...
-            "id": "5238466a-f8c7-43b3-9180-5b78e9da8304",
-            ...
-        }, {
-            ...,
-        }, ...]
-    }
-
-    to:
-    {
-        "ec2-54-204-222-62.compute-1.amazonaws.com": [
-            "5238466a-f8c7-43b3-9180-5b78e9da8304",
-            "5238466a-f8c7-43b3-9180-5b78e9da8306",
-            ...
-        ]
-    }
-    '''
-    def get_active_tasks(self):
-        if not hasattr(settings, 'IGNORE_CELERY_INSPECTOR'):
-            app = Celery('awx')
-            app.config_from_object('django.conf:settings')
-            inspector = Inspect(app=app)
-            active_task_queues = inspector.active()
-        else:
-            logger.warn("Ignoring celery task inspector")
-            active_task_queues = None
-
-        queues = None
-
-        if active_task_queues is not None:
-            queues = {}
-            for queue in active_task_queues:
-                active_tasks = set()
-                map(lambda at: active_tasks.add(at['id']), active_task_queues[queue])
-
-                # celery worker name is of the form celery@myhost.com
-                queue_name = queue.split('@')
-                queue_name = queue_name[1 if len(queue_name) > 1 else 0]
-                queues[queue_name] = active_tasks
-        else:
-            return (None, None)
-
-        return (active_task_queues, queues)
+    def get_leased_task_ids(self, tasks):
+        '''
+        celery_task_ids of the given tasks whose celery task still holds an
+        unexpired TaskLease, renewed by BaseTask.run while the job runs
+        '''
+        return TaskLease.objects.active_task_ids([task.celery_task_id for task in tasks])
 
     def get_latest_project_update_tasks(self, all_sorted_tasks):
         project_ids = Set()
@@ -171,10 +263,8 @@ class TaskManager():
                 inventory_ids.add(task.inventory_id)
         return InventoryUpdate.objects.filter(id__in=inventory_ids)
 
-    def get_running_workflow_jobs(self):
-        graph_workflow_jobs = [wf for wf in
-                               WorkflowJob.objects.filter(status='running')]
-        return graph_workflow_jobs
+    def get_running_workflow_jobs(self, all_sorted_tasks):
+        return [task for task in all_sorted_tasks if type(task) is WorkflowJob and task.status == 'running']
 
     def get_inventory_source_tasks(self, all_sorted_tasks):
         inventory_ids = Set()
@@ -183,9 +273,61 @@ class TaskManager():
                 inventory_ids.add(task.inventory_id)
         return [invsrc for invsrc in InventorySource.objects.filter(inventory_id__in=inventory_ids, update_on_launch=True)]
 
+    def index_inventory_sources(self, inventory_sources):
+        self.inventory_sources_by_inventory = dict()
+        for inventory_source in inventory_sources:
+            self.inventory_sources_by_inventory.setdefault(inventory_source.inventory_id, []).append(inventory_source)
+
+    def get_jobs_with_unfinished_dependencies(self, pending_tasks):
+        job_ids = [task.id for task in pending_tasks if type(task) is Job]
+        if not job_ids:
+            return Set()
+        through = UnifiedJob.dependent_jobs.through
+        return Set(through.objects.filter(
+            from_unifiedjob_id__in=job_ids,
+            to_unifiedjob__status__in=['pending', 'waiting', 'running'],
+        ).values_list('from_unifiedjob_id', flat=True))
+
+    def count_hosts_by_inventory(self, tasks, **host_filters):
+        inventory_ids = Set(t.inventory_id for t in tasks if t.inventory_id is not None)
+        if not inventory_ids:
+            return {}
+        return dict(Host.objects.filter(inventory_id__in=inventory_ids, **host_filters).order_by().values_list(
+            'inventory_id').annotate(Count('id')))
+
+    def get_task_impacts(self, tasks):
+        '''
+        Compute task_impact for every task with one host count query per job
+        type, instead of one count query per task per capacity check.
+        '''
+        impacts = dict()
+        host_counted = [t for t in tasks if type(t) is Job and t.launch_type != 'callback']
+        host_counted_ids = Set(t.id for t in host_counted)
+        ad_hoc_commands = [t for t in tasks if type(t) is AdHocCommand]
+        host_counts = self.count_hosts_by_inventory(host_counted)
+        enabled_host_counts = self.count_hosts_by_inventory(ad_hoc_commands, enabled=True)
+        for task in tasks:
+            if task.id in host_counted_ids:
+                impacts[task.id] = task.impact_for_host_count(host_counts.get(task.inventory_id, 0))
+            elif type(task) is AdHocCommand:
+                impacts[task.id] = task.impact_for_host_count(enabled_host_counts.get(task.inventory_id, 0))
+            else:
+                impacts[task.id] = task.task_impact
+        return impacts
+
+    def get_task_impact(self, task):
+        if task.id not in self.task_impacts:
+            self.task_impacts[task.id] = task.task_impact
+        return self.task_impacts[task.id]
+
+    def get_workflow_dag(self, workflow_job):
+        if workflow_job.id not in self.workflow_dags:
+            self.workflow_dags[workflow_job.id] = WorkflowDAG(workflow_job)
+        return self.workflow_dags[workflow_job.id]
+
     def spawn_workflow_graph_jobs(self, workflow_jobs):
         for workflow_job in workflow_jobs:
-            dag = WorkflowDAG(workflow_job)
+            dag = self.get_workflow_dag(workflow_job)
             spawn_nodes = dag.bfs_nodes_to_run()
             for spawn_node in spawn_nodes:
                 if spawn_node.unified_job_template is None:
@@ -215,7 +357,7 @@ class TaskManager():
     def process_finished_workflow_jobs(self, workflow_jobs):
         result = []
         for workflow_job in workflow_jobs:
-            dag = WorkflowDAG(workflow_job)
+            dag = self.get_workflow_dag(workflow_job)
             if workflow_job.cancel_flag:
                 workflow_job.status = 'canceled'
                 workflow_job.save()
@@ -287,7 +429,7 @@ class TaskManager():
         connection.on_commit(post_commit)
 
     def process_running_tasks(self, running_tasks):
-        map(lambda task: self.graph[task.instance_group.name]['graph'].add_job(task) if task.instance_group else None, running_tasks)
+        map(lambda task: self.dependency_graph.add_job(task) if task.instance_group else None, running_tasks)
 
     def create_project_update(self, task):
         project_task = Project.objects.get(id=task.project_id).create_project_update(
@@ -297,6 +439,7 @@ class TaskManager():
         project_task.created = task.created - timedelta(seconds=1)
         project_task.status = 'pending'
         project_task.save()
+        self.latest_project_updates[task.project_id] = project_task
         return project_task
 
     def create_inventory_update(self, task, inventory_source_task):
@@ -306,6 +449,7 @@ class TaskManager():
         inventory_task.created = task.created - timedelta(seconds=2)
         inventory_task.status = 'pending'
         inventory_task.save()
+        self.latest_inventory_updates[inventory_source_task.id] = inventory_task
         # inventory_sources = self.get_inventory_source_tasks([task])
         # self.process_inventory_sources(inventory_sources)
         return inventory_task
@@ -319,10 +463,10 @@ class TaskManager():
                 dep.dependent_jobs.add(*([task] + filter(lambda d: d != dep, dependencies)))
 
     def get_latest_inventory_update(self, inventory_source):
-        latest_inventory_update = InventoryUpdate.objects.filter(inventory_source=inventory_source).order_by("-created")
-        if not latest_inventory_update.exists():
-            return None
-        return latest_inventory_update.first()
+        if inventory_source.id not in self.latest_inventory_updates:
+            self.latest_inventory_updates[inventory_source.id] = InventoryUpdate.objects.filter(
+                inventory_source=inventory_source).order_by("-created").select_related('inventory_source').first()
+        return self.latest_inventory_updates[inventory_source.id]
 
     def should_update_inventory_source(self, job, latest_inventory_update):
         now = tz_now()
@@ -349,10 +493,10 @@ class TaskManager():
         return False
 
     def get_latest_project_update(self, job):
-            latest_project_update = ProjectUpdate.objects.filter(project=job.project, job_type='check').order_by("-created")
-            if not latest_project_update.exists():
-                return None
-            return latest_project_update.first()
+        if job.project_id not in self.latest_project_updates:
+            self.latest_project_updates[job.project_id] = ProjectUpdate.objects.filter(
+                project_id=job.project_id, job_type='check').order_by("-created").select_related('project').first()
+        return self.latest_project_updates[job.project_id]
 
     def should_update_related_project(self, job, latest_project_update):
         now = tz_now()
@@ -407,7 +551,7 @@ class TaskManager():
                 start_args = json.loads(decrypt_field(task, field_name="start_args"))
             except ValueError:
                 start_args = dict()
-            for inventory_source in [invsrc for invsrc in self.all_inventory_sources if invsrc.inventory == task.inventory]:
+            for inventory_source in self.inventory_sources_by_inventory.get(task.inventory_id, []):
                 if "inventory_sources_already_updated" in start_args and inventory_source.id in start_args['inventory_sources_already_updated']:
                     continue
                 if not inventory_source.update_on_launch:
@@ -437,7 +581,7 @@ class TaskManager():
                     continue
                 if not self.would_exceed_capacity(task, rampart_group.name):
                     logger.debug(six.text_type("Starting dependent {} in group {}").format(task.log_format, rampart_group.name))
-                    self.graph[rampart_group.name]['graph'].add_job(task)
+                    self.dependency_graph.add_job(task)
                     tasks_to_fail = filter(lambda t: t != task, dependency_tasks)
                     tasks_to_fail += [dependent_task]
                     self.start_task(task, rampart_group, tasks_to_fail)
@@ -447,7 +591,10 @@ class TaskManager():
 
     def process_pending_tasks(self, pending_tasks):
         for task in pending_tasks:
-            self.process_dependencies(task, self.generate_dependencies(task))
+            dependencies = self.generate_dependencies(task)
+            if dependencies and self.jobs_with_unfinished_dependencies is not None:
+                self.jobs_with_unfinished_dependencies.add(task.id)
+            self.process_dependencies(task, dependencies)
             if self.is_job_blocked(task):
                 logger.debug(six.text_type("{} is blocked from running").format(task.log_format))
                 continue
@@ -465,7 +612,7 @@ class TaskManager():
                 if not self.would_exceed_capacity(task, rampart_group.name):
                     logger.debug(six.text_type("Starting {} in group {} (remaining_capacity={})").format(
                                  task.log_format, rampart_group.name, remaining_capacity))
-                    self.graph[rampart_group.name]['graph'].add_job(task)
+                    self.dependency_graph.add_job(task)
                     self.start_task(task, rampart_group, task.get_jobs_fail_chain())
                     found_acceptable_queue = True
                     break
@@ -522,78 +669,59 @@ class TaskManager():
 
         logger.debug("Failing inconsistent running jobs.")
         celery_task_start_time = tz_now()
-        active_task_queues, active_queues = self.get_active_tasks()
         cache.set('last_celery_task_cleanup', tz_now())
 
-        if active_queues is None:
-            logger.error('Failed to retrieve active tasks from celery')
-            return None
-
-        '''
-        Only consider failing tasks on instances for which we obtained a task
-        list from celery for.
-        '''
         running_tasks, waiting_tasks = self.get_running_tasks()
-        all_celery_task_ids = []
-        for node, node_jobs in active_queues.iteritems():
-            all_celery_task_ids.extend(node_jobs)
+        all_tasks = list(waiting_tasks)
+        for node, node_jobs in running_tasks.iteritems():
+            all_tasks.extend(node_jobs)
+        leased_task_ids = self.get_leased_task_ids(all_tasks)
 
-        self.fail_jobs_if_not_in_celery(waiting_tasks, all_celery_task_ids, celery_task_start_time)
+        self.fail_jobs_if_not_in_celery(waiting_tasks, leased_task_ids, celery_task_start_time)
 
-        for node, node_jobs in running_tasks.iteritems():
-            isolated = False
-            if node in active_queues:
-                active_tasks = active_queues[node]
-            else:
-                '''
-                Node task list not found in celery. We may branch into cases:
-                 - instance is unknown to tower, system is improperly configured
-                 - instance is reported as down, then fail all jobs on the node
-                 - instance is an isolated node, then check running tasks
-                   among all allowed controller nodes for management process
-                 - valid healthy instance not included in celery task list
-                   probably a netsplit case, leave it alone
-                '''
-                instance = Instance.objects.filter(hostname=node).first()
-
-                if instance is None:
-                    logger.error("Execution node Instance {} not found in database. "
-                                 "The node is currently executing jobs {}".format(
-                                     node, [j.log_format for j in node_jobs]))
-                    active_tasks = []
-                elif instance.capacity == 0:
-                    active_tasks = []
-                elif instance.rampart_groups.filter(controller__isnull=False).exists():
-                    active_tasks = all_celery_task_ids
-                    isolated = True
-                else:
-                    continue
+        known_nodes = Set()
+        isolated_nodes = Set()
+        if running_tasks:
+            for hostname, controller_id in Instance.objects.filter(hostname__in=running_tasks.keys()).values_list(
+                    'hostname', 'rampart_groups__controller_id'):
+                known_nodes.add(hostname)
+                if controller_id is not None:
+                    isolated_nodes.add(hostname)
 
+        for node, node_jobs in running_tasks.iteritems():
+            if node not in known_nodes:
+                logger.error("Execution node Instance {} not found in database. "
+                             "The node is currently executing jobs {}".format(
+                                 node, [j.log_format for j in node_jobs]))
             self.fail_jobs_if_not_in_celery(
-                node_jobs, active_tasks, celery_task_start_time,
-                isolated=isolated
+                node_jobs, leased_task_ids, celery_task_start_time,
+                isolated=node in isolated_nodes
             )
 
     def calculate_capacity_consumed(self, tasks):
-        self.graph = InstanceGroup.objects.capacity_values(tasks=tasks, graph=self.graph)
+        self.graph = InstanceGroup.objects.capacity_values(tasks=tasks, graph=self.graph,
+                                                           task_impacts=self.task_impacts)
 
     def would_exceed_capacity(self, task, instance_group):
         current_capacity = self.graph[instance_group]['consumed_capacity']
         capacity_total = self.graph[instance_group]['capacity_total']
         if current_capacity == 0:
             return False
-        return (task.task_impact + current_capacity > capacity_total)
+        return (self.get_task_impact(task) + current_capacity > capacity_total)
 
     def consume_capacity(self, task, instance_group):
+        task_impact = self.get_task_impact(task)
         logger.debug(six.text_type('{} consumed {} capacity units from {} with prior total of {}').format(
-                     task.log_format, task.task_impact, instance_group,
+                     task.log_format, task_impact, instance_group,
                      self.graph[instance_group]['consumed_capacity']))
-        self.graph[instance_group]['consumed_capacity'] += task.task_impact
+        self.graph[instance_group]['consumed_capacity'] += task_impact
 
     def get_remaining_capacity(self, instance_group):
         return (self.graph[instance_group]['capacity_total'] - self.graph[instance_group]['consumed_capacity'])
 
     def process_tasks(self, all_sorted_tasks):
+        self.task_impacts = self.get_task_impacts(all_sorted_tasks)
+
         running_tasks = filter(lambda t: t.status in ['waiting', 'running'], all_sorted_tasks)
 
         self.calculate_capacity_consumed(running_tasks)
@@ -601,11 +729,15 @@ class TaskManager():
         self.process_running_tasks(running_tasks)
 
         pending_tasks = filter(lambda t: t.status in 'pending', all_sorted_tasks)
+        self.jobs_with_unfinished_dependencies = self.get_jobs_with_unfinished_dependencies(pending_tasks)
         self.process_pending_tasks(pending_tasks)
 
     def _schedule(self):
         finished_wfjs = []
-        all_sorted_tasks = self.get_tasks()
+        if settings.AWX_INCREMENTAL_TASK_MANAGER:
+            all_sorted_tasks = self.get_changed_tasks()
+        else:
+            all_sorted_tasks = self.get_tasks()
         if len(all_sorted_tasks) > 0:
             # TODO: Deal with
             # latest_project_updates = self.get_latest_project_update_tasks(all_sorted_tasks)
@@ -614,9 +746,9 @@ class TaskManager():
             # latest_inventory_updates = self.get_latest_inventory_update_tasks(all_sorted_tasks)
             # self.process_latest_inventory_updates(latest_inventory_updates)
 
-            self.all_inventory_sources = self.get_inventory_source_tasks(all_sorted_tasks)
+            self.index_inventory_sources(self.get_inventory_source_tasks(all_sorted_tasks))
 
-            running_workflow_tasks = self.get_running_workflow_jobs()
+            running_workflow_tasks = self.get_running_workflow_jobs(all_sorted_tasks)
             finished_wfjs = self.process_finished_workflow_jobs(running_workflow_tasks)
 
             self.spawn_workflow_graph_jobs(running_workflow_tasks)
@@ -634,7 +766,12 @@ class TaskManager():
                 logger.debug("Starting Scheduler")
 
                 self.cleanup_inconsistent_celery_tasks()
-                finished_wfjs = self._schedule()
+                try:
+                    finished_wfjs = self._schedule()
+                except Exception:
+                    # the cached tasks may hold changes that are about to be rolled back
+                    self.state.invalidate()
+                    raise
 
                 # Operations whose queries rely on modifications made during the atomic scheduling session
                 for wfj in WorkflowJob.objects.filter(id__in=finished_wfjs):
@@ -34,7 +34,8 @@ from awx.api.serializers import * # noqa
 from awx.main.constants import TOKEN_CENSOR
 from awx.main.utils import model_instance_diff, model_to_dict, camelcase_to_underscore
 from awx.main.utils import ignore_inventory_computed_fields, ignore_inventory_group_removal, _inventory_updates
-from awx.main.tasks import update_inventory_computed_fields
+from awx.main.utils.inventory_script import bump_script_data_version
+from awx.main.tasks import schedule_inventory_computed_fields_update
 from awx.main.fields import (
     is_implicit_parent,
     update_role_parentage_for_instance,
@@ -64,9 +65,12 @@ def emit_event_detail(serializer, relation, **kwargs):
     created = kwargs['created']
     if created:
         event_serializer = serializer(instance)
-        consumers.emit_channel_notification(
-            '-'.join([event_serializer.get_group_name(instance), str(getattr(instance, relation))]),
-            event_serializer.data
+        group_name = event_serializer.get_group_name(instance)
+        related_id = getattr(instance, relation)
+        consumers.emit_event_notification(
+            '-'.join([group_name, str(related_id)]),
+            event_serializer.data,
+            {'group_name': group_name, relation[:-len('_id')]: related_id},
         )
 
 
@@ -122,7 +126,7 @@ def emit_update_inventory_computed_fields(sender, **kwargs):
     except Inventory.DoesNotExist:
         pass
     else:
-        update_inventory_computed_fields.delay(inventory.id, True)
+        schedule_inventory_computed_fields_update(inventory.id, True)
 
 
 def emit_update_inventory_on_created_or_deleted(sender, **kwargs):
@@ -143,7 +147,7 @@ def emit_update_inventory_on_created_or_deleted(sender, **kwargs):
         pass
     else:
         if inventory is not None:
-            update_inventory_computed_fields.delay(inventory.id, True)
+            schedule_inventory_computed_fields_update(inventory.id, True)
 
 
 def rebuild_role_ancestor_list(reverse, model, instance, pk_set, action, **kwargs):
@@ -223,6 +227,19 @@ def save_related_job_templates(sender, instance, **kwargs):
             update_role_parentage_for_instance(jt)
 
 
+def bump_inventory_script_data_version(sender, **kwargs):
+    instance = kwargs['instance']
+    if kwargs['signal'] == post_save:
+        update_fields = kwargs.get('update_fields')
+        # computed fields, last job and facts are not part of the script data
+        if update_fields and not set(update_fields) & set(['name', 'enabled', 'variables', 'inventory']):
+            return
+    elif kwargs['signal'] == m2m_changed and kwargs['action'] not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if instance.inventory_id:
+        bump_script_data_version(instance.inventory_id)
+
+
 def connect_computed_field_signals():
     post_save.connect(emit_update_inventory_on_created_or_deleted, sender=Host)
     post_delete.connect(emit_update_inventory_on_created_or_deleted, sender=Host)
@@ -240,6 +257,13 @@ def connect_computed_field_signals():
 
 connect_computed_field_signals()
 
+# not computed fields: the inventory script cache must never miss a change
+post_save.connect(bump_inventory_script_data_version, sender=Host)
+post_delete.connect(bump_inventory_script_data_version, sender=Host)
+post_save.connect(bump_inventory_script_data_version, sender=Group)
+post_delete.connect(bump_inventory_script_data_version, sender=Group)
+m2m_changed.connect(bump_inventory_script_data_version, sender=Group.hosts.through)
+m2m_changed.connect(bump_inventory_script_data_version, sender=Group.parents.through)
 post_init.connect(set_original_organization, sender=Project)
 post_init.connect(set_original_organization, sender=Inventory)
 post_save.connect(save_related_job_templates, sender=Project)
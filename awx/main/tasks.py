@@ -12,9 +12,11 @@ import logging
 import os
 import re
 import shutil
+import socket
 import stat
 import sys
 import tempfile
+import threading
 import time
 import traceback
 import six
@@ -33,8 +35,10 @@ from celery.signals import celeryd_init, worker_shutdown, worker_ready, celeryd_
 
 # Django
 from django.conf import settings
-from django.db import transaction, DatabaseError, IntegrityError
+from django.db import transaction, connection, DatabaseError, IntegrityError
+from django.db.models import Q
 from django.db.models.fields.related import ForeignKey
+from django.utils.dateparse import parse_datetime
 from django.utils.timezone import now, timedelta
 from django.utils.encoding import smart_str
 from django.core.mail import send_mail
@@ -59,9 +63,13 @@ from awx.main.utils import (get_ansible_version, get_ssh_version, decrypt_field,
                             check_proot_installed, build_proot_temp_dir, get_licenser,
                             wrap_args_with_proot, OutputEventFilter, OutputVerboseFilter, ignore_inventory_computed_fields,
                             ignore_inventory_group_removal, get_type_for_model, extract_ansible_vars)
+from awx.main.utils.filters import SmartFilter, UnsupportedLookup
+from awx.main.utils.inventory_script import open_script_data
 from awx.main.utils.safe_yaml import safe_dump, sanitize_jinja
 from awx.main.utils.reload import stop_local_services
 from awx.main.utils.pglock import advisory_lock
+from awx.main.utils.pgnotify import PGListener
+from awx.main.utils.callback_socket import CallbackEventReceiver
 from awx.main.utils.ha import register_celery_worker_queues
 from awx.main.consumers import emit_channel_notification
 from awx.conf import settings_registry
@@ -71,7 +79,8 @@ from rest_framework.exceptions import PermissionDenied
 
 __all__ = ['RunJob', 'RunSystemJob', 'RunProjectUpdate', 'RunInventoryUpdate',
            'RunAdHocCommand', 'handle_work_error', 'handle_work_success', 'apply_cluster_membership_policies',
-           'update_inventory_computed_fields', 'update_host_smart_inventory_memberships',
+           'update_inventory_computed_fields', 'schedule_inventory_computed_fields_update',
+           'update_host_smart_inventory_memberships',
            'send_notifications', 'run_administrative_checks', 'purge_old_stdout_files']
 
 HIDDEN_PASSWORD = '**********'
@@ -194,6 +203,10 @@ def handle_setting_changes(self, setting_keys):
     cache_keys = set(setting_keys)
     logger.debug('cache delete_many(%r)', cache_keys)
     cache.delete_many(cache_keys)
+    # imported here; awx.conf.settings imports awx.conf.models, which is
+    # still loading when awx.main.models imports this module
+    from awx.conf.settings import bump_settings_version
+    bump_settings_version()
 
 
 @shared_task(bind=True, exchange='tower_broadcast_all')
@@ -493,12 +506,34 @@ def handle_work_error(task_id, *args, **kwargs):
         pass
 
 
+def _inventory_computed_fields_pending_key(inventory_id, should_update_hosts):
+    return 'awx_inventory_computed_fields_pending_{}_{}'.format(inventory_id, int(bool(should_update_hosts)))
+
+
+def schedule_inventory_computed_fields_update(inventory_id, should_update_hosts=True):
+    '''
+    Queue update_inventory_computed_fields for `inventory_id` unless one is
+    already pending, so that a burst of changes triggers a single recompute
+    once AWX_INVENTORY_COMPUTED_FIELDS_DEBOUNCE seconds have passed.
+    '''
+    window = settings.AWX_INVENTORY_COMPUTED_FIELDS_DEBOUNCE
+    if not window:
+        update_inventory_computed_fields.delay(inventory_id, should_update_hosts)
+        return
+    if cache.add(_inventory_computed_fields_pending_key(inventory_id, should_update_hosts), True, window):
+        update_inventory_computed_fields.apply_async(args=[inventory_id, should_update_hosts], countdown=window)
+    else:
+        logger.debug('Inventory %s computed fields update already pending.', inventory_id)
+
+
 @shared_task(queue=settings.CELERY_DEFAULT_QUEUE)
 def update_inventory_computed_fields(inventory_id, should_update_hosts=True):
     '''
     Signal handler and wrapper around inventory.update_computed_fields to
     prevent unnecessary recursive calls.
     '''
+    # Changes from here on need another recompute.
+    cache.delete(_inventory_computed_fields_pending_key(inventory_id, should_update_hosts))
     i = Inventory.objects.filter(id=inventory_id)
     if not i.exists():
         logger.error("Update Inventory Computed Fields failed due to missing inventory: " + str(inventory_id))
@@ -513,23 +548,92 @@ def update_inventory_computed_fields(inventory_id, should_update_hosts=True):
         raise
 
 
+def _sync_smart_inventory_memberships(smart_inventory, host_scope=None, scoped_hosts=None):
+    '''
+    Insert or delete the SmartInventoryMembership rows of `smart_inventory`
+    that differ from its host filter, considering only hosts whose name
+    matches `host_scope` (a Q on Host) if given.  `scoped_hosts` are all the
+    hosts with those names; when given, the filter is tested against them in
+    memory rather than queried.  Return True if anything changed.
+    '''
+    compiled = SmartFilter.compile(smart_inventory.host_filter)
+    organization_id = smart_inventory.organization_id
+    memberships_qs = SmartInventoryMembership.objects.filter(inventory_id=smart_inventory.id)
+    matches = None
+    if host_scope is not None:
+        scoped_names = Host.objects.filter(host_scope).values('name')
+        memberships_qs = memberships_qs.filter(host__name__in=scoped_names)
+        if scoped_hosts is not None:
+            try:
+                matches = [
+                    (host.name, host.id) for host in scoped_hosts
+                    if (not organization_id or host.inventory.organization_id == organization_id) and
+                    compiled.matches(host)
+                ]
+            except UnsupportedLookup:
+                matches = None
+    if matches is None:
+        hosts_qs = compiled.query
+        if organization_id:
+            hosts_qs = hosts_qs.filter(inventory__organization=organization_id)
+        if host_scope is not None:
+            hosts_qs = hosts_qs.filter(name__in=scoped_names)
+        matches = hosts_qs.order_by().values_list('name', 'id').distinct()
+    # Like Inventory.hosts of a smart inventory, only the first matching
+    # host of each name is a member.
+    host_ids = {}
+    for name, host_id in matches:
+        if name not in host_ids or host_id < host_ids[name]:
+            host_ids[name] = host_id
+    host_ids = set(host_ids.values())
+    member_ids = set(memberships_qs.values_list('host_id', flat=True))
+    removed_ids = sorted(member_ids - host_ids)
+    for offset in xrange(0, len(removed_ids), 500):
+        memberships_qs.filter(host_id__in=removed_ids[offset:offset + 500]).delete()
+    SmartInventoryMembership.objects.bulk_create([
+        SmartInventoryMembership(inventory_id=smart_inventory.id, host_id=host_id)
+        for host_id in sorted(host_ids - member_ids)
+    ], batch_size=500)
+    return bool(removed_ids) or bool(host_ids - member_ids)
+
+
 @shared_task(queue=settings.CELERY_DEFAULT_QUEUE)
-def update_host_smart_inventory_memberships():
+def update_host_smart_inventory_memberships(host_names=None, since=None, inventory_ids=None):
+    '''
+    Bring smart inventory memberships in line with their host filters.
+
+    Only the hosts named in `host_names` or modified at or after `since` (an
+    ISO 8601 timestamp) are re-tested against each filter, and all hosts
+    are re-tested for the smart inventories in `inventory_ids`.  Without
+    any of these, every membership is re-evaluated.
+    '''
+    host_scope = None
+    if host_names or since:
+        host_scope = Q(name__in=host_names or [])
+        if since:
+            host_scope |= Q(modified__gte=parse_datetime(since))
+    inventory_ids = set(inventory_ids or [])
+    rebuild_all = host_scope is None and not inventory_ids
+    changed_inventories = set([])
     try:
         with transaction.atomic():
             smart_inventories = Inventory.objects.filter(kind='smart', host_filter__isnull=False, pending_deletion=False)
-            SmartInventoryMembership.objects.all().delete()
-            memberships = []
-            changed_inventories = set([])
+            scoped_hosts = None
             for smart_inventory in smart_inventories:
-                add_for_inventory = [
-                    SmartInventoryMembership(inventory_id=smart_inventory.id, host_id=host_id[0])
-                    for host_id in smart_inventory.hosts.values_list('id')
-                ]
-                memberships.extend(add_for_inventory)
-                if add_for_inventory:
+                if rebuild_all or smart_inventory.id in inventory_ids:
+                    changed = _sync_smart_inventory_memberships(smart_inventory)
+                elif host_scope is not None:
+                    if scoped_hosts is None:
+                        # Load the changed hosts once to test them against
+                        # every filter in memory.
+                        scoped_hosts = list(Host.objects.filter(
+                            name__in=Host.objects.filter(host_scope).values('name')
+                        ).select_related('inventory').prefetch_related('groups'))
+                    changed = _sync_smart_inventory_memberships(smart_inventory, host_scope, scoped_hosts)
+                else:
+                    continue
+                if changed:
                     changed_inventories.add(smart_inventory)
-            SmartInventoryMembership.objects.bulk_create(memberships)
     except IntegrityError as e:
         logger.error(six.text_type("Update Host Smart Inventory Memberships failed due to an exception: {}").format(e))
         return
@@ -585,6 +689,38 @@ def with_path_cleanup(f):
     return _wrapped
 
 
+class TaskLeaseHeartbeat(threading.Thread):
+    '''
+    Renews the TaskLease of a running unified job every
+    AWX_TASK_LEASE_RENEW_INTERVAL seconds, until stopped or until the job
+    leaves the running state.
+    '''
+
+    daemon = True
+
+    def __init__(self, instance):
+        super(TaskLeaseHeartbeat, self).__init__(name='lease-{}'.format(instance.celery_task_id))
+        self.instance = instance
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.AWX_TASK_LEASE_RENEW_INTERVAL):
+                try:
+                    if not TaskLease.objects.renew(self.instance):
+                        break
+                except DatabaseError:
+                    logger.exception(six.text_type('{} failed to renew task lease.').format(self.instance.log_format))
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        TaskLease.objects.release(self.instance)
+
+
 class BaseTask(Task):
     name = None
     model = None
@@ -779,10 +915,21 @@ class BaseTask(Task):
         return False
 
     def build_inventory(self, instance, **kwargs):
-        json_data = json.dumps(instance.inventory.get_script_data(hostvars=True))
-        handle, path = tempfile.mkstemp(dir=kwargs.get('private_data_dir', None))
+        private_data_dir = kwargs.get('private_data_dir', None)
+        handle, data_path = tempfile.mkstemp(dir=private_data_dir, suffix='.json')
+        with os.fdopen(handle, 'w') as f:
+            cached = open_script_data(instance.inventory, hostvars=True)
+            if cached is None:
+                instance.inventory.write_script_data(f, hostvars=True)
+            else:
+                with cached:
+                    shutil.copyfileobj(cached, f)
+        handle, path = tempfile.mkstemp(dir=private_data_dir)
         f = os.fdopen(handle, 'w')
-        f.write('#! /usr/bin/env python\n# -*- coding: utf-8 -*-\nprint %r\n' % json_data)
+        f.write('#! /usr/bin/env python\n# -*- coding: utf-8 -*-\n'
+                'import os, shutil, sys\n'
+                'with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), %r)) as f:\n'
+                '    shutil.copyfileobj(f, sys.stdout)\n' % os.path.basename(data_path))
         f.close()
         os.chmod(path, stat.S_IRUSR | stat.S_IXUSR | stat.S_IWUSR)
         return path
@@ -821,7 +968,23 @@ class BaseTask(Task):
         '''
         return OrderedDict()
 
-    def get_stdout_handle(self, instance):
+    def get_event_receiver(self, instance, private_data_dir):
+        '''
+        Return a receiver for the event data the display callback plugin can
+        send over a Unix socket in private_data_dir, or None to have it store
+        that data in memcache.
+        '''
+        if not isinstance(instance, (Job, AdHocCommand, ProjectUpdate)):
+            return None
+        path = os.path.join(private_data_dir, 'callback_events.sock')
+        try:
+            return CallbackEventReceiver(path)
+        except socket.error:
+            logger.exception('%s Could not listen for callback events on %s, using memcache',
+                             instance.log_format, path)
+            return None
+
+    def get_stdout_handle(self, instance, event_receiver=None):
         '''
         Return an virtual file object for capturing stdout and/or events.
         '''
@@ -831,7 +994,11 @@ class BaseTask(Task):
             def event_callback(event_data):
                 event_data.setdefault(self.event_data_key, instance.id)
                 if 'uuid' in event_data:
-                    cache_event = cache.get('ev-{}'.format(event_data['uuid']), None)
+                    cache_event = None
+                    if event_receiver is not None:
+                        cache_event = event_receiver.pop(event_data['uuid'])
+                    if cache_event is None:
+                        cache_event = cache.get('ev-{}'.format(event_data['uuid']), None)
                     if cache_event is not None:
                         event_data.update(cache_event)
                 dispatcher.dispatch(event_data)
@@ -859,6 +1026,16 @@ class BaseTask(Task):
         Hook for any steps to run after job/task is marked as complete.
         '''
 
+    def start_task_lease(self, instance):
+        '''
+        Take the lease the task manager reaper checks to decide whether this
+        task is still alive, and keep renewing it while the task runs.
+        '''
+        TaskLease.objects.acquire(instance)
+        heartbeat = TaskLeaseHeartbeat(instance)
+        heartbeat.start()
+        return heartbeat
+
     @with_path_cleanup
     def run(self, pk, isolated_host=None, **kwargs):
         '''
@@ -871,11 +1048,14 @@ class BaseTask(Task):
                                      start_args='')  # blank field to remove encrypted passwords
 
         instance.websocket_emit_status("running")
+        heartbeat = self.start_task_lease(instance)
         status, rc, tb = 'error', None, ''
         output_replacements = []
         extra_update_fields = {}
         event_ct = 0
         stdout_handle = None
+        event_receiver = None
+        cancel_listener = None
         try:
             kwargs['isolated'] = isolated_host is not None
             self.pre_run_hook(instance, **kwargs)
@@ -883,6 +1063,7 @@ class BaseTask(Task):
                 instance = self.update_model(instance.pk, status='canceled')
             if instance.status != 'running':
                 if hasattr(settings, 'CELERY_UNIT_TEST'):
+                    heartbeat.stop()
                     return
                 else:
                     # Stop the task chain and prevent starting the job if it has
@@ -938,7 +1119,10 @@ class BaseTask(Task):
                     )
 
             if isolated_host is None:
-                stdout_handle = self.get_stdout_handle(instance)
+                event_receiver = self.get_event_receiver(instance, kwargs['private_data_dir'])
+                if event_receiver is not None:
+                    env['AWX_CALLBACK_SOCKET'] = safe_env['AWX_CALLBACK_SOCKET'] = event_receiver.path
+                stdout_handle = self.get_stdout_handle(instance, event_receiver=event_receiver)
             else:
                 stdout_handle = isolated_manager.IsolatedManager.get_stdout_handle(
                     instance, kwargs['private_data_dir'], event_data_key=self.event_data_key)
@@ -963,9 +1147,15 @@ class BaseTask(Task):
             expect_passwords = {}
             for k, v in self.get_password_prompts(**kwargs).items():
                 expect_passwords[k] = kwargs['passwords'].get(v, '') or ''
+
+            def cancelled_callback():
+                if cancel_listener is not None:
+                    cancel_listener.consume()
+                return self.update_model(instance.pk).cancel_flag
+
             _kw = dict(
                 expect_passwords=expect_passwords,
-                cancelled_callback=lambda: self.update_model(instance.pk).cancel_flag,
+                cancelled_callback=cancelled_callback,
                 job_timeout=self.get_instance_timeout(instance),
                 idle_timeout=self.get_idle_timeout(),
                 extra_update_fields=extra_update_fields,
@@ -981,8 +1171,14 @@ class BaseTask(Task):
                                                   kwargs['private_data_dir'],
                                                   kwargs.get('proot_temp_dir'))
             else:
+                # UnifiedJob.cancel notifies the task, which then only has to
+                # poll for the cancel_flag occasionally
+                cancel_listener = PGListener(instance.cancel_notification_channel)
                 status, rc = run.run_pexpect(
-                    args, cwd, env, stdout_handle, **_kw
+                    args, cwd, env, stdout_handle,
+                    cancel_fd=cancel_listener.fileno(),
+                    cancel_poll_interval=getattr(settings, 'AWX_CANCEL_POLL_INTERVAL', 30),
+                    **_kw
                 )
 
         except Exception:
@@ -1000,19 +1196,27 @@ class BaseTask(Task):
                             instance.log_format, event_ct)
             except Exception:
                 logger.exception('Error flushing job stdout and saving event count.')
+            if event_receiver is not None:
+                event_receiver.close()
+            if cancel_listener is not None:
+                cancel_listener.close()
 
         try:
             self.post_run_hook(instance, status, **kwargs)
         except Exception:
             logger.exception(six.text_type('{} Post run hook errored.').format(instance.log_format))
-        instance = self.update_model(pk)
-        if instance.cancel_flag:
-            status = 'canceled'
-
-        instance = self.update_model(pk, status=status, result_traceback=tb,
-                                     output_replacements=output_replacements,
-                                     emitted_events=event_ct,
-                                     **extra_update_fields)
+        try:
+            instance = self.update_model(pk)
+            if instance.cancel_flag:
+                status = 'canceled'
+
+            instance = self.update_model(pk, status=status, result_traceback=tb,
+                                         output_replacements=output_replacements,
+                                         emitted_events=event_ct,
+                                         **extra_update_fields)
+        finally:
+            # never leave the lease renewed for a task that is gone
+            heartbeat.stop()
         try:
             self.final_run_hook(instance, status, **kwargs)
         except Exception:
@@ -1385,7 +1589,7 @@ class RunJob(BaseTask):
         except Inventory.DoesNotExist:
             pass
         else:
-            update_inventory_computed_fields.delay(inventory.id, True)
+            schedule_inventory_computed_fields_update(inventory.id, True)
 
 
 class RunProjectUpdate(BaseTask):
@@ -2380,4 +2584,4 @@ def deep_copy_model_obj(
             ), permission_check_func[2])
             permission_check_func(creater, copy_mapping.values())
     if isinstance(new_obj, Inventory):
-        update_inventory_computed_fields.delay(new_obj.id, True)
+        schedule_inventory_computed_fields_update(new_obj.id, True)
@@ -3,11 +3,8 @@
 import base64
 import json
 import re
-import shutil
-import tempfile
 
 from django.conf import settings
-from django.db.backends.sqlite3.base import SQLiteCursorWrapper
 import mock
 import pytest
 
@@ -31,26 +28,11 @@ def _mk_inventory_update():
     return iu
 
 
-@pytest.fixture(scope='function')
-def sqlite_copy_expert(request):
-    # copy_expert is postgres-specific, and SQLite doesn't support it; mock its
-    # behavior to test that it writes a file that contains stdout from events
-    path = tempfile.mkdtemp(prefix='job-event-stdout')
-
-    def write_stdout(self, sql, fd):
-        # simulate postgres copy_expert support with ORM code
-        parts = sql.split(' ')
-        tablename = parts[parts.index('from') + 1]
-        for cls in (JobEvent, AdHocCommandEvent, ProjectUpdateEvent,
-                    InventoryUpdateEvent, SystemJobEvent):
-            if cls._meta.db_table == tablename:
-                for event in cls.objects.order_by('start_line').all():
-                    fd.write(event.stdout.encode('utf-8'))
-
-    setattr(SQLiteCursorWrapper, 'copy_expert', write_stdout)
-    request.addfinalizer(lambda: shutil.rmtree(path))
-    request.addfinalizer(lambda: delattr(SQLiteCursorWrapper, 'copy_expert'))
-    return path
+def _content(response):
+    # downloads are streamed
+    if response.streaming:
+        return ''.join(response.streaming_content)
+    return response.content
 
 
 @pytest.mark.django_db
@@ -60,11 +42,11 @@ def sqlite_copy_expert(request):
     [_mk_project_update, ProjectUpdateEvent, 'project_update', 'api:project_update_stdout'],
     [_mk_inventory_update, InventoryUpdateEvent, 'inventory_update', 'api:inventory_update_stdout'],
 ])
-def test_text_stdout(sqlite_copy_expert, Parent, Child, relation, view, get, admin):
+def test_text_stdout(Parent, Child, relation, view, get, admin):
     job = Parent()
     job.save()
     for i in range(3):
-        Child(**{relation: job, 'stdout': 'Testing {}\n'.format(i), 'start_line': i}).save()
+        Child(**{relation: job, 'stdout': 'Testing {}'.format(i), 'start_line': i}).save()
     url = reverse(view, kwargs={'pk': job.pk}) + '?format=txt'
 
     response = get(url, user=admin, expect=200)
@@ -79,14 +61,14 @@ def test_text_stdout(sqlite_copy_expert, Parent, Child, relation, view, get, adm
     [_mk_inventory_update, InventoryUpdateEvent, 'inventory_update', 'api:inventory_update_stdout'],
 ])
 @pytest.mark.parametrize('download', [True, False])
-def test_ansi_stdout_filtering(sqlite_copy_expert, Parent, Child, relation,
+def test_ansi_stdout_filtering(Parent, Child, relation,
                                view, download, get, admin):
     job = Parent()
     job.save()
     for i in range(3):
         Child(**{
             relation: job,
-            'stdout': '\x1B[0;36mTesting {}\x1B[0m\n'.format(i),
+            'stdout': '\x1B[0;36mTesting {}\x1B[0m'.format(i),
             'start_line': i
         }).save()
     url = reverse(view, kwargs={'pk': job.pk})
@@ -94,14 +76,14 @@ def test_ansi_stdout_filtering(sqlite_copy_expert, Parent, Child, relation,
     # ansi codes in ?format=txt should get filtered
     fmt = "?format={}".format("txt_download" if download else "txt")
     response = get(url + fmt, user=admin, expect=200)
-    assert response.content.splitlines() == ['Testing %d' % i for i in range(3)]
+    assert _content(response).splitlines() == ['Testing %d' % i for i in range(3)]
     has_download_header = response.has_header('Content-Disposition')
     assert has_download_header if download else not has_download_header
 
     # ask for ansi and you'll get it
     fmt = "?format={}".format("ansi_download" if download else "ansi")
     response = get(url + fmt, user=admin, expect=200)
-    assert response.content.splitlines() == ['\x1B[0;36mTesting %d\x1B[0m' % i for i in range(3)]
+    assert _content(response).splitlines() == ['\x1B[0;36mTesting %d\x1B[0m' % i for i in range(3)]
     has_download_header = response.has_header('Content-Disposition')
     assert has_download_header if download else not has_download_header
 
@@ -113,14 +95,15 @@ def test_ansi_stdout_filtering(sqlite_copy_expert, Parent, Child, relation,
     [_mk_project_update, ProjectUpdateEvent, 'project_update', 'api:project_update_stdout'],
     [_mk_inventory_update, InventoryUpdateEvent, 'inventory_update', 'api:inventory_update_stdout'],
 ])
-def test_colorized_html_stdout(sqlite_copy_expert, Parent, Child, relation, view, get, admin):
+def test_colorized_html_stdout(Parent, Child, relation, view, get, admin):
     job = Parent()
     job.save()
     for i in range(3):
         Child(**{
             relation: job,
-            'stdout': '\x1B[0;36mTesting {}\x1B[0m\n'.format(i),
-            'start_line': i
+            'stdout': '\x1B[0;36mTesting {}\x1B[0m'.format(i),
+            'start_line': i,
+            'end_line': i + 1
         }).save()
     url = reverse(view, kwargs={'pk': job.pk}) + '?format=html'
 
@@ -137,11 +120,11 @@ def test_colorized_html_stdout(sqlite_copy_expert, Parent, Child, relation, view
     [_mk_project_update, ProjectUpdateEvent, 'project_update', 'api:project_update_stdout'],
     [_mk_inventory_update, InventoryUpdateEvent, 'inventory_update', 'api:inventory_update_stdout'],
 ])
-def test_stdout_line_range(sqlite_copy_expert, Parent, Child, relation, view, get, admin):
+def test_stdout_line_range(Parent, Child, relation, view, get, admin):
     job = Parent()
     job.save()
     for i in range(20):
-        Child(**{relation: job, 'stdout': 'Testing {}\n'.format(i), 'start_line': i}).save()
+        Child(**{relation: job, 'stdout': 'Testing {}'.format(i), 'start_line': i, 'end_line': i + 1}).save()
     url = reverse(view, kwargs={'pk': job.pk}) + '?format=html&start_line=5&end_line=10'
 
     response = get(url, user=admin, expect=200)
@@ -149,18 +132,105 @@ def test_stdout_line_range(sqlite_copy_expert, Parent, Child, relation, view, ge
 
 
 @pytest.mark.django_db
-def test_text_stdout_from_system_job_events(sqlite_copy_expert, get, admin):
+@pytest.mark.parametrize('start_line, end_line, expected, expected_range', [
+    [5, 10, ['Testing 5', 'a', 'b', 'Testing 8', 'Testing 9'], [5, 10]],
+    [-3, None, ['Testing 10', '', 'Testing 12'], [10, 13]],
+    [12, 100, ['Testing 12'], [12, 13]],
+    [0, 2, ['Testing 0', 'Testing 1'], [0, 2]],
+])
+def test_stdout_line_range_json(start_line, end_line, expected, expected_range, get, admin):
+    job = Job()
+    job.save()
+    line = 0
+    for i in range(12):
+        if i == 5:
+            # one event spanning several lines
+            stdout, n_lines = 'Testing 5\r\na\r\nb', 3
+        elif i == 9:
+            # a blank line
+            stdout, n_lines = '', 1
+        elif i == 10:
+            # an event which produced no output
+            stdout, n_lines = '', 0
+        else:
+            stdout, n_lines = 'Testing {}'.format(line), 1
+        JobEvent(job=job, stdout=stdout, start_line=line, end_line=line + n_lines).save()
+        line += n_lines
+    url = reverse('api:job_stdout', kwargs={'pk': job.pk}) + '?format=json&start_line={}'.format(start_line)
+    if end_line is not None:
+        url += '&end_line={}'.format(end_line)
+
+    response = get(url, user=admin, expect=200)
+    content = json.loads(response.content)
+    assert content['content'].split('\n')[:-1] == expected
+    assert [content['range']['start'], content['range']['end']] == expected_range
+    assert content['range']['absolute_end'] == 13
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('start_line, end_line, expected', [
+    [0, 3, ['line 0', 'line 1', 'line 2']],
+    [198, 203, ['line 198', 'line 199', 'line 200', 'line 201', 'line 202']],
+    [-2, None, ['line 248', 'line 249']],
+])
+def test_legacy_stdout_line_range(start_line, end_line, expected, get, admin):
+    job = _mk_project_update()
+    job.save()
+    job.result_stdout_text = ''.join('line {}\n'.format(i) for i in range(250))
+    job.save()
+    url = reverse('api:project_update_stdout', kwargs={'pk': job.pk}) + '?format=json&start_line={}'.format(start_line)
+    if end_line is not None:
+        url += '&end_line={}'.format(end_line)
+
+    response = get(url, user=admin, expect=200)
+    content = json.loads(response.content)
+    assert content['content'].splitlines() == expected
+    assert content['range']['absolute_end'] == 250
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('fmt', ['txt', 'txt_download'])
+def test_legacy_stdout_streamed_in_ranges(fmt, get, admin):
+    job = _mk_project_update()
+    job.save()
+    lines = [u'オ line {}'.format(i) for i in range(2500)]
+    job.result_stdout_text = u''.join(line + u'\n' for line in lines)
+    job.save()
+    url = reverse('api:project_update_stdout', kwargs={'pk': job.pk}) + '?format=' + fmt
+
+    response = get(url, user=admin, expect=200)
+    assert _content(response).decode('utf-8').splitlines() == lines
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.redact.UriCleaner.SENSITIVE_URI_PATTERN', mock.Mock(**{'search.return_value': None}))  # really slow for large strings
+def test_stdout_line_range_with_max_bytes(get, admin):
+    job = Job()
+    job.save()
+    total_bytes = settings.STDOUT_MAX_BYTES_DISPLAY + 1
+    JobEvent(job=job, stdout='X' * (total_bytes - 1), start_line=0, end_line=1).save()
+    JobEvent(job=job, stdout='Y', start_line=1, end_line=2).save()
+    # a small range of an oversized stdout is not shown either
+    url = reverse('api:job_stdout', kwargs={'pk': job.pk}) + '?format=json&start_line=1&end_line=2'
+    response = get(url, user=admin, expect=200)
+    assert json.loads(response.content)['content'].startswith(
+        'Standard Output too large to display ({} bytes)'.format(total_bytes)
+    )
+
+
+@pytest.mark.django_db
+def test_text_stdout_from_system_job_events(get, admin):
     job = SystemJob()
     job.save()
     for i in range(3):
-        SystemJobEvent(system_job=job, stdout='Testing {}\n'.format(i), start_line=i).save()
+        SystemJobEvent(system_job=job, stdout='Testing {}'.format(i), start_line=i).save()
     url = reverse('api:system_job_detail', kwargs={'pk': job.pk})
     response = get(url, user=admin, expect=200)
     assert response.data['result_stdout'].splitlines() == ['Testing %d' % i for i in range(3)]
 
 
 @pytest.mark.django_db
-def test_text_stdout_with_max_stdout(sqlite_copy_expert, get, admin):
+def test_text_stdout_with_max_stdout(get, admin):
     job = SystemJob()
     job.save()
     total_bytes = settings.STDOUT_MAX_BYTES_DISPLAY + 1
@@ -186,7 +256,7 @@ def test_text_stdout_with_max_stdout(sqlite_copy_expert, get, admin):
 ])
 @pytest.mark.parametrize('fmt', ['txt', 'ansi'])
 @mock.patch('awx.main.redact.UriCleaner.SENSITIVE_URI_PATTERN', mock.Mock(**{'search.return_value': None}))  # really slow for large strings
-def test_max_bytes_display(sqlite_copy_expert, Parent, Child, relation, view, fmt, get, admin):
+def test_max_bytes_display(Parent, Child, relation, view, fmt, get, admin):
     job = Parent()
     job.save()
     total_bytes = settings.STDOUT_MAX_BYTES_DISPLAY + 1
@@ -204,7 +274,7 @@ def test_max_bytes_display(sqlite_copy_expert, Parent, Child, relation, view, fm
     )
 
     response = get(url + '?format={}_download'.format(fmt), user=admin, expect=200)
-    assert response.content == large_stdout
+    assert _content(response) == large_stdout + '\n'
 
 
 @pytest.mark.django_db
@@ -224,7 +294,7 @@ def test_legacy_result_stdout_text_fallback(Cls, view, fmt, get, admin):
     url = reverse(view, kwargs={'pk': job.pk})
 
     response = get(url + '?format={}'.format(fmt), user=admin, expect=200)
-    assert response.content == 'LEGACY STDOUT!'
+    assert _content(response) == 'LEGACY STDOUT!'
 
 
 @pytest.mark.django_db
@@ -253,7 +323,7 @@ def test_legacy_result_stdout_with_max_bytes(Cls, view, fmt, get, admin):
     )
 
     response = get(url + '?format={}'.format(fmt + '_download'), user=admin, expect=200)
-    assert response.content == large_stdout
+    assert _content(response) == large_stdout
 
 
 @pytest.mark.django_db
@@ -264,24 +334,24 @@ def test_legacy_result_stdout_with_max_bytes(Cls, view, fmt, get, admin):
     [_mk_inventory_update, InventoryUpdateEvent, 'inventory_update', 'api:inventory_update_stdout'],
 ])
 @pytest.mark.parametrize('fmt', ['txt', 'ansi', 'txt_download', 'ansi_download'])
-def test_text_with_unicode_stdout(sqlite_copy_expert, Parent, Child, relation,
+def test_text_with_unicode_stdout(Parent, Child, relation,
                                   view, get, admin, fmt):
     job = Parent()
     job.save()
     for i in range(3):
-        Child(**{relation: job, 'stdout': u'オ{}\n'.format(i), 'start_line': i}).save()
+        Child(**{relation: job, 'stdout': u'オ{}'.format(i), 'start_line': i}).save()
     url = reverse(view, kwargs={'pk': job.pk}) + '?format=' + fmt
 
     response = get(url, user=admin, expect=200)
-    assert response.content.splitlines() == ['オ%d' % i for i in range(3)]
+    assert _content(response).splitlines() == ['オ%d' % i for i in range(3)]
 
 
 @pytest.mark.django_db
-def test_unicode_with_base64_ansi(sqlite_copy_expert, get, admin):
+def test_unicode_with_base64_ansi(get, admin):
     job = Job()
     job.save()
     for i in range(3):
-        JobEvent(job=job, stdout=u'オ{}\n'.format(i), start_line=i).save()
+        JobEvent(job=job, stdout=u'オ{}'.format(i), start_line=i, end_line=i + 1).save()
     url = reverse(
         'api:job_stdout',
         kwargs={'pk': job.pk}
@@ -222,6 +222,88 @@ class TestINIImports:
         cmd.handle(inventory_id=inventory.pk, source='doesnt matter')
 
 
+@pytest.mark.django_db
+@pytest.mark.inventory_import
+@mock.patch.object(inventory_import.InstanceGroup.objects, 'get', new=mock.MagicMock(return_value=None))
+@mock.patch.object(inventory_import.Command, 'check_license', new=mock.MagicMock())
+@mock.patch.object(inventory_import.Command, 'set_logging_level', new=mock_logging)
+class TestBulkSync:
+
+    def import_data(self, inventory, data, **options):
+        all_group = dict_to_mem_data(data).all_group
+        with mock.patch.object(inventory_import, 'load_inventory_source',
+                               mock.MagicMock(return_value=all_group)):
+            cmd = inventory_import.Command()
+            cmd.handle(inventory_id=inventory.pk, source='doesnt matter', **options)
+        return cmd
+
+    def test_overwrite_reimport(self, inventory):
+        self.import_data(inventory, TEST_INVENTORY_CONTENT, overwrite=True, overwrite_vars=True)
+        web1_pk = inventory.hosts.get(name='web1.example.com').pk
+        cmd = self.import_data(inventory, {
+            "_meta": {"hostvars": {"web1.example.com": {"ansible_port": 2022}}},
+            "all": {"children": ["servers"]},
+            "servers": {"children": ["webservers"], "vars": {"varb": "C"}},
+            "webservers": {"hosts": ["web1.example.com", "db1.example.com"]},
+        }, overwrite=True, overwrite_vars=True)
+
+        assert set(inventory.groups.values_list('name', flat=True)) == set(['servers', 'webservers'])
+        assert set(inventory.hosts.values_list('name', flat=True)) == set(['web1.example.com', 'db1.example.com'])
+        web1 = inventory.hosts.get(name='web1.example.com')
+        assert web1.pk == web1_pk
+        assert web1.variables_dict == {'ansible_port': 2022}
+        servers = inventory.groups.get(name='servers')
+        assert servers.variables_dict == {'varb': 'C'}
+        assert set(servers.children.values_list('name', flat=True)) == set(['webservers'])
+        assert servers.hosts.count() == 0
+        webservers = inventory.groups.get(name='webservers')
+        assert set(webservers.hosts.values_list('name', flat=True)) == set(['web1.example.com', 'db1.example.com'])
+        invsrc = inventory.inventory_sources.get()
+        assert invsrc.hosts.count() == 2
+        assert invsrc.groups.count() == 2
+        assert 'create/update hosts' in [phase for phase, elapsed in cmd._phase_timings]
+
+    def test_merge_reimport_keeps_links(self, inventory):
+        self.import_data(inventory, TEST_INVENTORY_CONTENT)
+        self.import_data(inventory, {
+            "_meta": {"hostvars": {"web2.example.com": {"foo": "bar"}}},
+            "all": {"children": ["webservers"]},
+            "webservers": {"hosts": ["web2.example.com", "web4.example.com"]},
+        })
+
+        assert inventory.hosts.count() == 11
+        assert inventory.hosts.get(name='web2.example.com').variables_dict == {'foo': 'bar'}
+        webservers = inventory.groups.get(name='webservers')
+        assert webservers.variables_dict == {'webvar': 'blah'}
+        assert set(webservers.hosts.values_list('name', flat=True)) == set([
+            'web1.example.com', 'web2.example.com', 'web3.example.com', 'web4.example.com'])
+        assert set(inventory.groups.get(name='servers').children.values_list('name', flat=True)) == set([
+            'dbservers', 'webservers'])
+
+    @pytest.mark.parametrize('other_name', ['10.0.0.4', '10.0.0.6'])
+    def test_reused_hostname(self, inventory, other_name):
+        # the instance that had 10.0.0.5 moved to another address, and a new
+        # instance got 10.0.0.5
+        self.import_data(inventory, {
+            "_meta": {"hostvars": {"10.0.0.5": {"ec2_id": "i-old"}}},
+            "all": {"hosts": ["10.0.0.5"]},
+        }, instance_id_var='ec2_id')
+        old_pk = inventory.hosts.get().pk
+        self.import_data(inventory, {
+            "_meta": {"hostvars": {
+                "10.0.0.5": {"ec2_id": "i-new"},
+                other_name: {"ec2_id": "i-old"},
+            }},
+            "all": {"hosts": ["10.0.0.5", other_name]},
+        }, instance_id_var='ec2_id')
+
+        hosts = dict((host.name, host) for host in inventory.hosts.all())
+        assert set(hosts) == set(['10.0.0.5', other_name])
+        assert hosts['10.0.0.5'].instance_id == 'i-new'
+        assert hosts[other_name].instance_id == 'i-old'
+        assert old_pk in (hosts['10.0.0.5'].pk, hosts[other_name].pk)
+
+
 @pytest.mark.django_db
 @pytest.mark.inventory_import
 class TestEnabledVar:
@@ -558,7 +558,7 @@ def _request(verb):
             response.render()
         __SWAGGER_REQUESTS__.setdefault(request.path, {})[
             (request.method.lower(), response.status_code)
-        ] = (response.get('Content-Type', None), response.content, kwargs.get('data'))
+        ] = (response.get('Content-Type', None), None if response.streaming else response.content, kwargs.get('data'))
         return response
     return rf
 
@@ -1,12 +1,15 @@
 import pytest
 
+# Django
+from django.core.cache import cache
+
 # AWX context managers for testing
 from awx.main.models.rbac import batch_role_ancestor_rebuilding
 from awx.main.signals import (
     disable_activity_stream,
     disable_computed_fields,
-    update_inventory_computed_fields
 )
+from awx.main.tasks import update_inventory_computed_fields
 
 # AWX models
 from awx.main.models.organization import Organization
@@ -32,16 +35,30 @@ def test_disable_activity_stream():
 @pytest.mark.django_db
 class TestComputedFields:
 
-    def test_computed_fields_normal_use(self, mocker, inventory):
+    @pytest.fixture(autouse=True)
+    def clear_pending_updates(self):
+        cache.clear()
+
+    def test_computed_fields_normal_use(self, mocker, inventory, settings):
+        settings.AWX_INVENTORY_COMPUTED_FIELDS_DEBOUNCE = 0
         job = Job.objects.create(name='fake-job', inventory=inventory)
         with mocker.patch.object(update_inventory_computed_fields, 'delay'):
             job.delete()
             update_inventory_computed_fields.delay.assert_called_once_with(inventory.id, True)
 
+    def test_computed_fields_debounced(self, mocker, inventory, settings):
+        settings.AWX_INVENTORY_COMPUTED_FIELDS_DEBOUNCE = 5
+        with mocker.patch.object(update_inventory_computed_fields, 'apply_async'):
+            jobs = [Job.objects.create(name='fake-job', inventory=inventory) for i in range(3)]
+            for job in jobs:
+                job.delete()
+            update_inventory_computed_fields.apply_async.assert_called_once_with(
+                args=[inventory.id, True], countdown=5)
+
     def test_disable_computed_fields(self, mocker, inventory):
         job = Job.objects.create(name='fake-job', inventory=inventory)
         with disable_computed_fields():
-            with mocker.patch.object(update_inventory_computed_fields, 'delay'):
+            with mocker.patch.object(update_inventory_computed_fields, 'apply_async'):
                 job.delete()
-                update_inventory_computed_fields.delay.assert_not_called()
+                update_inventory_computed_fields.apply_async.assert_not_called()
 
@@ -67,3 +67,94 @@ def test_system_job_event_websocket_notifications(emit, inventory):
     topic, payload = emit.call_args_list[0][0]
     assert topic == 'system_job_events-123'
     assert payload['system_job'] == 123
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_host_summaries_from_stats(emit, inventory):
+    hosts = [inventory.hosts.create(name='host-{}'.format(i)) for i in range(3)]
+    j = Job(inventory=inventory)
+    j.save()
+    # a summary left over from an earlier stats event is updated in place
+    j.job_host_summaries.create(host=hosts[0], host_name=hosts[0].name, ok=5)
+    JobEvent.create_from_data(job_id=j.pk, event='playbook_on_stats', event_data={
+        'ok': {'host-0': 1, 'host-1': 2, 'missing-host': 1},
+        'changed': {'host-1': 1},
+        'failures': {'host-2': 1},
+        'dark': {},
+        'processed': {'host-0': 1, 'host-1': 1, 'host-2': 1, 'missing-host': 1},
+        'skipped': {},
+    })
+
+    summaries = dict((s.host_name, s) for s in j.job_host_summaries.all())
+    assert set(summaries) == set(['host-0', 'host-1', 'host-2', 'missing-host'])
+    assert summaries['host-0'].ok == 1
+    assert summaries['host-1'].ok == 2
+    assert summaries['host-1'].changed == 1
+    assert summaries['host-2'].failures == 1
+    assert summaries['host-2'].failed is True
+    assert summaries['host-1'].failed is False
+    assert summaries['missing-host'].host is None
+    for host in hosts:
+        host.refresh_from_db()
+        assert host.last_job_id == j.pk
+        assert host.last_job_host_summary_id == summaries[host.name].pk
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_event_tree_finalized_from_stats(emit, inventory, settings):
+    settings.CAPTURE_JOB_EVENT_HOSTS = True
+    host_a = inventory.hosts.create(name='host-a')
+    host_b = inventory.hosts.create(name='host-b')
+    j = Job(inventory=inventory)
+    j.save()
+    JobEvent.create_from_data(job_id=j.pk, uuid='playbook', event='playbook_on_start')
+    JobEvent.create_from_data(job_id=j.pk, uuid='play', parent_uuid='playbook', event='playbook_on_play_start')
+    JobEvent.create_from_data(job_id=j.pk, uuid='task-1', parent_uuid='play', event='playbook_on_task_start')
+    JobEvent.create_from_data(job_id=j.pk, uuid='task-2', parent_uuid='play', event='playbook_on_task_start')
+    JobEvent.create_from_data(job_id=j.pk, uuid='ok', parent_uuid='task-1', event='runner_on_ok',
+                              event_data={'host': 'host-a', 'res': {'changed': True}})
+    JobEvent.create_from_data(job_id=j.pk, uuid='failed', parent_uuid='task-2', event='runner_on_failed',
+                              event_data={'host': 'host-b'})
+
+    # hosts are linked as the events arrive, flags when the playbook completes
+    assert not JobEvent.objects.get(uuid='task-1').changed
+    assert set(JobEvent.objects.get(uuid='task-1').hosts.all()) == set([host_a])
+    assert set(JobEvent.objects.get(uuid='play').hosts.all()) == set([host_a, host_b])
+
+    JobEvent.create_from_data(job_id=j.pk, uuid='stats', parent_uuid='playbook', event='playbook_on_stats',
+                              event_data={'ok': {'host-a': 1}, 'failures': {'host-b': 1}})
+
+    events = dict((e.uuid, e) for e in JobEvent.objects.filter(job=j))
+    assert events['task-1'].changed is True
+    assert events['task-1'].failed is False
+    assert events['task-2'].failed is True
+    assert events['task-2'].changed is False
+    assert events['play'].failed is False
+    assert set(events['ok'].hosts.all()) == set([host_a])
+    assert set(events['task-1'].hosts.all()) == set([host_a])
+    assert set(events['task-2'].hosts.all()) == set([host_b])
+    assert set(events['play'].hosts.all()) == set([host_a, host_b])
+    assert set(events['playbook'].hosts.all()) == set([host_a, host_b])
+    assert set(events['stats'].hosts.all()) == set([host_a, host_b])
+
+
+@pytest.mark.django_db
+@mock.patch('awx.main.consumers.emit_channel_notification')
+def test_host_summaries_from_stats_link_late_hosts(emit, inventory):
+    j = Job(inventory=inventory)
+    j.save()
+    # summarized before the host was added to the inventory
+    summary = j.job_host_summaries.create(host_name='late-host', ok=1)
+    host = inventory.hosts.create(name='late-host')
+    JobEvent.create_from_data(job_id=j.pk, event='playbook_on_stats', event_data={
+        'ok': {'late-host': 1},
+        'processed': {'late-host': 1},
+    })
+
+    summary.refresh_from_db()
+    assert summary.host_id == host.pk
+    host.refresh_from_db()
+    assert host.last_job_id == j.pk
+    assert host.last_job_host_summary_id == summary.pk
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import json
 import pytest
 import mock
 import six
 
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 # AWX
 from awx.main.models import (
@@ -14,7 +17,27 @@ from awx.main.models import (
     InventoryUpdate,
     Job
 )
+from awx.main.signals import disable_computed_fields
 from awx.main.utils.filters import SmartFilter
+from awx.main.utils.inventory_script import (
+    _ScriptDataVersionBumps,
+    bump_script_data_version,
+    get_script_data_version,
+    open_script_data,
+)
+
+
+def commit_script_data_versions():
+    # the test transaction is never committed, run its version bumps instead
+    callbacks = connection.run_on_commit
+    connection.run_on_commit = [c for c in callbacks if not isinstance(c[1], _ScriptDataVersionBumps)]
+    for sids, func in callbacks:
+        if isinstance(func, _ScriptDataVersionBumps):
+            func()
+
+
+def inventory_version_updates(queries):
+    return [q for q in queries if q['sql'].startswith('UPDATE "main_inventory" SET "modified"')]
 
 
 @pytest.mark.django_db
@@ -38,6 +61,98 @@ class TestInventoryScript:
             'remote_tower_id': host.id
         }
 
+    def test_write_script_data(self, inventory):
+        inventory.hosts.create(name='ahost', variables={"foo": "bar"})
+        group = inventory.groups.create(name='agroup', variables={"baz": "qux"})
+        group.hosts.create(name='bhost', inventory=inventory)
+        f = six.StringIO()
+        inventory.write_script_data(f, hostvars=True, towervars=True)
+        assert json.loads(f.getvalue()) == inventory.get_script_data(hostvars=True, towervars=True)
+
+    def test_cached_script_data(self, inventory, settings, tmpdir):
+        settings.AWX_INVENTORY_SCRIPT_CACHE_ROOT = str(tmpdir)
+        inventory.hosts.create(name='ahost', variables={"foo": "bar"})
+        with mock.patch.object(Inventory, 'write_script_data', autospec=True,
+                               side_effect=Inventory.write_script_data) as write_script_data:
+            for i in range(2):
+                with open_script_data(inventory, hostvars=True) as f:
+                    assert json.load(f) == inventory.get_script_data(hostvars=True)
+            assert write_script_data.call_count == 1
+
+            inventory.hosts.create(name='bhost')
+            commit_script_data_versions()
+            with open_script_data(inventory, hostvars=True) as f:
+                assert set(json.load(f)['_meta']['hostvars']) == set(['ahost', 'bhost'])
+            assert write_script_data.call_count == 2
+        # older versions are removed
+        assert len(tmpdir.listdir(lambda p: p.ext == '.json')) == 1
+
+    def test_script_data_version(self, inventory):
+        host = inventory.hosts.create(name='ahost')
+        group = inventory.groups.create(name='agroup')
+        versions = [get_script_data_version(inventory)]
+
+        def changed():
+            commit_script_data_versions()
+            versions.append(get_script_data_version(inventory))
+            return versions[-1] != versions[-2]
+
+        group.hosts.add(host)
+        assert changed()
+        host.save(update_fields=['last_job', 'has_active_failures'])
+        assert not changed()
+        Host.objects.filter(pk=host.pk).update(variables='foo: bar')
+        assert not changed()
+        # e.g. by inventory imports, which update hosts in bulk
+        bump_script_data_version(inventory.pk)
+        assert changed()
+        group.delete()
+        assert changed()
+
+    def test_script_data_version_bumped_once_per_transaction(self, inventory):
+        version = get_script_data_version(inventory)
+        with CaptureQueriesContext(connection) as queries:
+            host = inventory.hosts.create(name='ahost')
+            group = inventory.groups.create(name='agroup')
+            group.hosts.add(host)
+            host.variables = 'foo: bar'
+            host.save()
+        assert inventory_version_updates(queries) == []
+        assert get_script_data_version(inventory) == version
+        with CaptureQueriesContext(connection) as queries:
+            commit_script_data_versions()
+        assert len(inventory_version_updates(queries)) == 1
+        assert get_script_data_version(inventory) != version
+
+    def test_smart_inventory_not_cached(self, organization, settings, tmpdir):
+        settings.AWX_INVENTORY_SCRIPT_CACHE_ROOT = str(tmpdir)
+        smart_inventory = Inventory.objects.create(name='smart', kind='smart', host_filter='name=ahost',
+                                                   organization=organization)
+        assert open_script_data(smart_inventory) is None
+
+
+@pytest.mark.django_db
+class TestSmartInventoryMembershipUpdates:
+
+    def test_rename_retests_both_names(self, inventory, settings):
+        settings.AWX_REBUILD_SMART_MEMBERSHIP = True
+        host = Host.objects.get(pk=inventory.hosts.create(name='foo').pk)
+        with mock.patch('awx.main.models.inventory.connection') as conn, \
+                mock.patch('awx.main.tasks.update_host_smart_inventory_memberships') as update:
+            host.name = 'bar'
+            host.save()
+            host.save()
+            host.name = 'baz'
+            host.save()
+            for call in conn.on_commit.call_args_list:
+                call[0][0]()
+        # the hosts named like the old name may be members again
+        assert update.delay.call_args_list == [
+            mock.call(host_names=['bar', 'foo']),
+            mock.call(host_names=['bar']),
+            mock.call(host_names=['baz', 'bar']),
+        ]
+
 
 @pytest.mark.django_db
 class TestActiveCount:
@@ -63,6 +178,44 @@ class TestActiveCount:
         assert Host.objects.active_count() == 1
 
 
+@pytest.mark.django_db
+class TestComputedFields:
+
+    def test_counts_in_one_query(self, inventory):
+        with disable_computed_fields():
+            inventory.hosts.create(name='ok')
+            inventory.hosts.create(name='failed', has_active_failures=True)
+            inventory.groups.create(name='failed', has_active_failures=True)
+            InventorySource.objects.create(name='gce', inventory=inventory, source='gce', last_job_failed=True)
+            InventorySource.objects.create(name='file', inventory=inventory, source='file', last_job_failed=True)
+        # saving an inventory source updates the counters regardless
+        Inventory.objects.filter(pk=inventory.pk).update(
+            has_active_failures=False, total_hosts=0, hosts_with_active_failures=0,
+            total_groups=0, groups_with_active_failures=0, has_inventory_sources=False,
+            total_inventory_sources=0, inventory_sources_with_failures=0,
+        )
+        inventory.refresh_from_db()
+        with CaptureQueriesContext(connection) as queries:
+            inventory.update_computed_fields(update_groups=False, update_hosts=False)
+        # one aggregate query and one update of the changed counters
+        assert len(queries) == 2
+        expected = dict(
+            has_active_failures=True, total_hosts=2, hosts_with_active_failures=1,
+            total_groups=1, groups_with_active_failures=1, has_inventory_sources=True,
+            total_inventory_sources=1, inventory_sources_with_failures=1,
+        )
+        reloaded = Inventory.objects.get(pk=inventory.pk)
+        for field, value in expected.items():
+            assert getattr(inventory, field) == value
+            assert getattr(reloaded, field) == value
+
+    def test_unchanged_counts_not_written(self, inventory):
+        inventory.update_computed_fields(update_groups=False, update_hosts=False)
+        with CaptureQueriesContext(connection) as queries:
+            inventory.update_computed_fields(update_groups=False, update_hosts=False)
+        assert len(queries) == 1
+
+
 @pytest.mark.django_db
 class TestSCMUpdateFeatures:
 
@@ -45,15 +45,32 @@ class TestWorkflowDAGFunctional(TransactionTestCase):
 
     def test_build_WFJT_dag(self):
         '''
-        Test that building the graph uses 4 queries
-         1 to get the nodes
+        Test that building the graph uses 5 queries
+         1 to get the node ids
          3 to get the related success, failure, and always connections
+         1 to get the nodes and their jobs
         '''
         dag = WorkflowDAG()
         wfj = self.workflow_job()
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(5):
             dag._init_graph(wfj)
 
+    def test_build_WFJT_dag_cached(self):
+        '''
+        Test that once the graph structure is compiled, rebuilding the graph
+        only loads the nodes and their jobs
+        '''
+        wfj = self.workflow_job(states=['successful', None, None, None, None])
+        first = WorkflowDAG(workflow_job=wfj)
+        dag = WorkflowDAG()
+        with self.assertNumQueries(1):
+            dag._init_graph(wfj)
+        self.assertEqual(dag.edges, first.edges)
+        self.assertEqual([n['node_object'] for n in dag.nodes], [n['node_object'] for n in first.nodes])
+        root = dag.get_root_nodes()[0]['node_object']
+        self.assertEqual([n.id for n in dag.bfs_nodes_to_run()],
+                         [n['node_object'].id for n in dag.get_dependencies(root, 'success_nodes')])
+
     def test_workflow_done(self):
         wfj = self.workflow_job(states=['failed', None, None, 'successful', None])
         dag = WorkflowDAG(workflow_job=wfj)
@@ -4,13 +4,18 @@ import json
 from datetime import timedelta, datetime
 
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import now as tz_now
 
 from awx.main.scheduler import TaskManager
+from awx.main.tasks import RunJob
 from awx.main.utils import encrypt_field
 from awx.main.models import (
     Job,
     Instance,
+    Project,
+    TaskLease,
     WorkflowJob,
 )
 from awx.main.models.notifications import JobNotificationMixin
@@ -240,6 +245,136 @@ def test_shared_dependencies_launch(default_instance_group, job_template_factory
     assert len(iu) == 1
 
 
+@pytest.mark.django_db
+def test_get_tasks_single_query(default_instance_group, job_template_factory):
+    objects = job_template_factory('jt', organization='org1', project='proj',
+                                   inventory='inv', credential='cred',
+                                   jobs=["job_1", "job_2"])
+    for job in objects.jobs.values():
+        job.status = 'pending'
+        job.instance_group = default_instance_group
+        job.save()
+    tm = TaskManager()
+    tm.get_tasks()  # warm the content type cache
+    with CaptureQueriesContext(connection) as queries:
+        tasks = tm.get_tasks()
+        assert [type(t) for t in tasks] == [Job, Job]
+        assert [t.project for t in tasks] == [objects.project, objects.project]
+        assert [t.instance_group for t in tasks] == [default_instance_group, default_instance_group]
+    assert len(queries) == 1
+
+
+@pytest.mark.django_db
+def test_task_impacts_match_task_impact(job_template_factory):
+    objects = job_template_factory('jt', organization='org1', project='proj',
+                                   inventory='inv', credential='cred',
+                                   jobs=["job_1", "job_2"])
+    for i in range(3):
+        objects.inventory.hosts.create(name='host-{}'.format(i))
+    callback_job = objects.jobs["job_2"]
+    callback_job.launch_type = 'callback'
+    callback_job.save()
+    tasks = list(objects.jobs.values())
+    impacts = TaskManager().get_task_impacts(tasks)
+    assert impacts == dict((t.id, t.task_impact) for t in tasks)
+
+
+class TestIncrementalTaskManager():
+    @pytest.fixture(autouse=True)
+    def incremental(self, settings):
+        settings.AWX_INCREMENTAL_TASK_MANAGER = True
+        settings.AWX_TASK_MANAGER_FULL_RESCAN_INTERVAL = 300
+        TaskManager.state.invalidate()
+        yield
+        TaskManager.state.invalidate()
+
+    @pytest.mark.django_db
+    def test_only_changed_tasks_reloaded(self, default_instance_group, job_template_factory):
+        objects = job_template_factory('jt', organization='org1', project='proj',
+                                       inventory='inv', credential='cred',
+                                       jobs=["job_should_start", "job_should_not_start"])
+        j1 = objects.jobs["job_should_start"]
+        j1.status = 'pending'
+        j1.save()
+        j2 = objects.jobs["job_should_not_start"]
+        j2.status = 'pending'
+        j2.save()
+        with mock.patch("awx.main.scheduler.TaskManager.start_task"):
+            TaskManager().schedule()
+            TaskManager.start_task.assert_called_once_with(j1, default_instance_group, [])
+        assert set(TaskManager.state.tasks) == set([j1.id, j2.id])
+        cached_j2 = TaskManager.state.tasks[j2.id]
+
+        j1.status = "successful"
+        j1.save()
+        with mock.patch("awx.main.scheduler.TaskManager.start_task"), \
+                mock.patch.object(TaskManager, 'get_tasks', side_effect=AssertionError):
+            TaskManager().schedule()
+            TaskManager.start_task.assert_called_once_with(j2, default_instance_group, [])
+        assert TaskManager.state.tasks == {j2.id: cached_j2}
+
+    @pytest.mark.django_db
+    def test_deleted_task_dropped(self, default_instance_group, job_template_factory):
+        objects = job_template_factory('jt', organization='org1', project='proj',
+                                       inventory='inv', credential='cred',
+                                       jobs=["job_deleted"])
+        j1 = objects.jobs["job_deleted"]
+        j1.status = 'running'
+        j1.save()
+        TaskManager().get_changed_tasks()
+        assert list(TaskManager.state.tasks) == [j1.id]
+
+        j1.delete()
+        assert TaskManager().get_changed_tasks() == []
+
+    @pytest.mark.django_db
+    def test_update_model_transition_reloaded(self, default_instance_group, job_template_factory):
+        objects = job_template_factory('jt', organization='org1', project='proj',
+                                       inventory='inv', credential='cred',
+                                       jobs=["job_waiting"])
+        j1 = objects.jobs["job_waiting"]
+        j1.status = 'waiting'
+        j1.save()
+        [cached_j1] = TaskManager().get_changed_tasks()
+
+        # keeps `modified` as it was
+        RunJob().update_model(j1.pk, status='running', execution_node='node-1')
+        [task] = TaskManager().get_changed_tasks()
+        assert task is not cached_j1
+        assert task.status == 'running'
+        assert task.execution_node == 'node-1'
+
+    @pytest.mark.django_db
+    def test_cached_task_related_objects_refreshed(self, default_instance_group, job_template_factory):
+        objects = job_template_factory('jt', organization='org1', project='proj',
+                                       inventory='inv', credential='cred',
+                                       jobs=["job_cached"])
+        j1 = objects.jobs["job_cached"]
+        j1.status = 'pending'
+        j1.save()
+        [cached_j1] = TaskManager().get_changed_tasks()
+        assert cached_j1.inventory.name == 'inv'
+
+        Project.objects.filter(pk=j1.project_id).update(scm_update_cache_timeout=30)
+        objects.inventory.name = 'renamed'
+        objects.inventory.save()
+        [task] = TaskManager().get_changed_tasks()
+        assert task is cached_j1
+        assert task.project.scm_update_cache_timeout == 30
+        assert task.inventory.name == 'renamed'
+
+    @pytest.mark.django_db
+    def test_periodic_full_rescan(self, default_instance_group, settings):
+        TaskManager().get_changed_tasks()
+        assert TaskManager.state.last_full_rescan is not None
+        with mock.patch.object(TaskManager, 'get_tasks', return_value=[]) as get_tasks:
+            TaskManager().get_changed_tasks()
+            get_tasks.assert_not_called()
+            settings.AWX_TASK_MANAGER_FULL_RESCAN_INTERVAL = 0
+            TaskManager().get_changed_tasks()
+            get_tasks.assert_called_once_with(('pending', 'waiting', 'running'))
+
+
 @pytest.mark.django_db
 def test_cleanup_interval(mock_cache):
     with mock.patch.multiple('awx.main.scheduler.task_manager.cache', get=mock_cache.get, set=mock_cache.set):
@@ -318,22 +453,25 @@ class TestReaper():
         return all_jobs[0:1] + all_jobs[5:7]
 
     @pytest.fixture
-    def active_tasks(self):
-        return ([], {
-            'host1': ['considered_j2', 'considered_j3', 'considered_j4',],
-            'host2': ['considered_j6', 'considered_j7'],
-        })
+    def active_leases(self, all_jobs):
+        expires = tz_now() + timedelta(seconds=60)
+        expired = tz_now() - timedelta(seconds=1)
+        for j in all_jobs:
+            if j.celery_task_id.startswith('considered_') or j.celery_task_id == 'host3_j10':
+                TaskLease.objects.create(unified_job=j, celery_task_id=j.celery_task_id,
+                                         hostname=j.execution_node or 'host1', expires=expires)
+            elif j.celery_task_id == 'reapable_j7':
+                TaskLease.objects.create(unified_job=j, celery_task_id=j.celery_task_id,
+                                         hostname=j.execution_node, expires=expired)
 
     @pytest.mark.django_db
     @mock.patch.object(JobNotificationMixin, 'send_notification_templates')
-    @mock.patch.object(TaskManager, 'get_active_tasks', lambda self: ([], []))
-    def test_cleanup_inconsistent_task(self, notify, active_tasks, considered_jobs, reapable_jobs, running_tasks, waiting_tasks, mocker, settings):
+    def test_cleanup_inconsistent_task(self, notify, active_leases, considered_jobs, reapable_jobs, running_tasks, waiting_tasks, mocker, settings):
         settings.AWX_INCONSISTENT_TASK_INTERVAL = 0
         tm = TaskManager()
 
         tm.get_running_tasks = mocker.Mock(return_value=(running_tasks, waiting_tasks))
-        tm.get_active_tasks = mocker.Mock(return_value=active_tasks)
-        
+
         tm.cleanup_inconsistent_celery_tasks()
         
         for j in considered_jobs:
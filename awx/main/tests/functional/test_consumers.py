@@ -0,0 +1,35 @@
+import pytest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from awx.main.consumers import accessible_ids
+
+
+@pytest.fixture(autouse=True)
+def clear_access_cache():
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_accessible_ids_checked_in_one_query(job_factory, admin, rando):
+    jobs = [job_factory(), job_factory()]
+    requested = [jobs[0].id, str(jobs[1].id), 999999, 'bogus']
+    with CaptureQueriesContext(connection) as queries:
+        assert accessible_ids(admin, 'job_events', requested) == set([jobs[0].id, str(jobs[1].id)])
+    assert len(queries) == 1
+    assert accessible_ids(rando, 'job_events', requested) == set()
+
+
+@pytest.mark.django_db
+def test_accessible_ids_cached(job_factory, admin):
+    job = job_factory()
+    accessible_ids(admin, 'job_events', [job.id])
+    with CaptureQueriesContext(connection) as queries:
+        assert accessible_ids(admin, 'job_events', [job.id, str(job.id)]) == set([job.id, str(job.id)])
+    assert len(queries) == 0
+
+
+def test_unrestricted_group():
+    assert accessible_ids(None, 'jobs', ['status_changed']) == set(['status_changed'])
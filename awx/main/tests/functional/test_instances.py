@@ -1,7 +1,9 @@
 import pytest
 import mock
 
-from awx.main.models import AdHocCommand, InventoryUpdate, Job, JobTemplate, ProjectUpdate, Instance
+from django.utils.timezone import now, timedelta
+
+from awx.main.models import AdHocCommand, InventoryUpdate, Job, JobTemplate, ProjectUpdate, Instance, TaskLease
 from awx.main.tasks import apply_cluster_membership_policies
 from awx.api.versioning import reverse
 
@@ -252,3 +254,33 @@ class TestInstanceGroupOrdering:
         assert job.preferred_instance_groups == [ig_inv, ig_org]
         job.job_template.instance_groups.add(ig_tmp)
         assert job.preferred_instance_groups == [ig_tmp, ig_inv, ig_org]
+
+
+@pytest.mark.django_db
+class TestTaskLease:
+
+    def test_renew_while_running(self, job_factory, settings):
+        settings.AWX_TASK_LEASE_TIMEOUT = 60
+        job = job_factory()
+        job.status = 'running'
+        job.celery_task_id = 'running-task'
+        job.save()
+        TaskLease.objects.acquire(job, hostname='host1')
+        assert TaskLease.objects.active_task_ids(['running-task', 'other-task']) == set(['running-task'])
+
+        TaskLease.objects.filter(unified_job=job).update(expires=now() - timedelta(seconds=1))
+        assert TaskLease.objects.active_task_ids(['running-task']) == set()
+        assert TaskLease.objects.renew(job) is True
+        assert TaskLease.objects.active_task_ids(['running-task']) == set(['running-task'])
+
+    def test_renew_stops_when_finished(self, job_factory):
+        job = job_factory()
+        job.status = 'running'
+        job.celery_task_id = 'finished-task'
+        job.save()
+        TaskLease.objects.acquire(job)
+        Job.objects.filter(pk=job.pk).update(status='successful')
+        assert TaskLease.objects.renew(job) is False
+
+        TaskLease.objects.release(job)
+        assert not TaskLease.objects.filter(unified_job=job).exists()
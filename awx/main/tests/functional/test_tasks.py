@@ -7,11 +7,12 @@ from django.utils.timezone import now, timedelta
 from awx.main.tasks import (
     RunProjectUpdate, RunInventoryUpdate,
     awx_isolated_heartbeat,
-    isolated_manager
+    isolated_manager,
+    update_host_smart_inventory_memberships
 )
 from awx.main.models import (
     ProjectUpdate, InventoryUpdate, InventorySource,
-    Instance, InstanceGroup
+    Instance, InstanceGroup, Inventory, SmartInventoryMembership
 )
 
 
@@ -85,6 +86,56 @@ class TestDependentInventoryUpdate:
 
 
 
+@pytest.mark.django_db
+@mock.patch.object(Inventory, 'update_computed_fields')
+class TestSmartInventoryMemberships:
+
+    @pytest.fixture
+    def smart_inventory(self, organization):
+        return Inventory.objects.create(name='smart', kind='smart', host_filter='name=foo',
+                                        organization=organization)
+
+    def members(self, smart_inventory):
+        return set(SmartInventoryMembership.objects.filter(
+            inventory=smart_inventory).values_list('host__name', flat=True))
+
+    def test_rebuild_all(self, update_computed_fields, inventory, smart_inventory):
+        inventory.hosts.create(name='foo')
+        inventory.hosts.create(name='bar')
+        update_host_smart_inventory_memberships()
+        assert self.members(smart_inventory) == set(['foo'])
+        assert update_computed_fields.call_count == 1
+
+    def test_only_scoped_hosts_change(self, update_computed_fields, inventory, smart_inventory):
+        foo = inventory.hosts.create(name='foo')
+        update_host_smart_inventory_memberships()
+        smart_inventory.host_filter = 'name=foo or name=bar'
+        smart_inventory.save(update_fields=['host_filter'])
+        inventory.hosts.create(name='bar')
+        foo.name = 'baz'
+        foo.save(update_fields=['name'])
+
+        update_host_smart_inventory_memberships(host_names=['bar'])
+        assert self.members(smart_inventory) == set(['bar', 'baz'])
+        update_host_smart_inventory_memberships(host_names=['baz'])
+        assert self.members(smart_inventory) == set(['bar'])
+
+    def test_hosts_modified_since(self, update_computed_fields, inventory, smart_inventory):
+        started = now()
+        inventory.hosts.create(name='foo')
+        update_host_smart_inventory_memberships(since=(started + timedelta(days=1)).isoformat())
+        assert self.members(smart_inventory) == set()
+        update_host_smart_inventory_memberships(since=started.isoformat())
+        assert self.members(smart_inventory) == set(['foo'])
+
+    def test_smart_inventory_scope(self, update_computed_fields, inventory, smart_inventory):
+        inventory.hosts.create(name='foo')
+        update_host_smart_inventory_memberships(inventory_ids=[smart_inventory.id + 1])
+        assert self.members(smart_inventory) == set()
+        update_host_smart_inventory_memberships(inventory_ids=[smart_inventory.id])
+        assert self.members(smart_inventory) == set(['foo'])
+
+
 class MockSettings:
     AWX_ISOLATED_PERIODIC_CHECK = 60
     CLUSTER_HOST_ID = 'tower_1'
@@ -0,0 +1,201 @@
+# Python
+import pytest
+from Queue import Full as QueueFull
+
+# AWX
+from awx.main.models import JobEvent, SystemJobEvent
+from awx.main.management.commands.run_callback_receiver import (
+    CallbackBrokerWorker,
+    EventBuffer,
+    WorkerState,
+)
+
+
+class TestEventBuffer():
+
+    @pytest.fixture
+    def event_buffer(self):
+        return EventBuffer(3, 0.5)
+
+    def test_disabled_for_single_row(self):
+        assert EventBuffer(1, 0.5).enabled is False
+        assert EventBuffer(2, 0.5).enabled is True
+
+    def test_full_after_max_events(self, event_buffer):
+        key = (JobEvent, 1)
+        assert event_buffer.add(key, {'counter': 1}, 100) is False
+        assert event_buffer.add(key, {'counter': 2}, 100) is False
+        assert event_buffer.add(key, {'counter': 3}, 100) is True
+        assert event_buffer.pop(key) == [{'counter': 1}, {'counter': 2}, {'counter': 3}]
+        assert event_buffer.pop(key) == []
+
+    def test_events_grouped_per_job(self, event_buffer):
+        event_buffer.add((JobEvent, 1), {'counter': 1}, 100)
+        event_buffer.add((JobEvent, 2), {'counter': 1}, 100)
+        event_buffer.add((SystemJobEvent, 1), {'counter': 1}, 100)
+        assert event_buffer.keys() == [(JobEvent, 1), (JobEvent, 2), (SystemJobEvent, 1)]
+
+    def test_expired(self, event_buffer):
+        event_buffer.add((JobEvent, 1), {}, 100)
+        event_buffer.add((JobEvent, 2), {}, 100.25)
+        assert event_buffer.expired(100.4) == []
+        assert event_buffer.expired(100.5) == [(JobEvent, 1)]
+        assert sorted(event_buffer.expired(101)) == [(JobEvent, 1), (JobEvent, 2)]
+
+    def test_timeout(self, event_buffer):
+        assert event_buffer.timeout(100) == 1
+        event_buffer.add((JobEvent, 1), {}, 100)
+        assert event_buffer.timeout(100.25) == 0.25
+        assert event_buffer.timeout(101) == 0
+
+
+@pytest.mark.parametrize('body, expected', [
+    [{'job_id': 1}, (JobEvent, 1)],
+    [{'system_job_id': 2}, (SystemJobEvent, 2)],
+    [{'uuid': 'abc'}, (None, 'unknown job')],
+])
+def test_identify_event(body, expected):
+    worker = CallbackBrokerWorker.__new__(CallbackBrokerWorker)
+    assert worker.identify_event(body) == expected
+
+
+def test_flush_events_bulk_creates_per_job(mocker):
+    worker = CallbackBrokerWorker.__new__(CallbackBrokerWorker)
+    bulk_create = mocker.patch.object(JobEvent, 'bulk_create_from_data')
+    event_buffer = EventBuffer(10, 0.5)
+    event_buffer.add((JobEvent, 1), {'job_id': 1, 'counter': 1}, 100)
+    event_buffer.add((JobEvent, 1), {'job_id': 1, 'counter': 2}, 100)
+    event_buffer.add((JobEvent, 2), {'job_id': 2, 'counter': 1}, 100)
+    assert worker.flush_events(event_buffer, event_buffer.keys()) is True
+    assert bulk_create.call_args_list == [
+        mocker.call([{'job_id': 1, 'counter': 1}, {'job_id': 1, 'counter': 2}]),
+        mocker.call([{'job_id': 2, 'counter': 1}]),
+    ]
+    assert event_buffer.keys() == []
+
+
+def test_flush_events_saves_one_at_a_time_after_bulk_error(mocker):
+    worker = CallbackBrokerWorker.__new__(CallbackBrokerWorker)
+    mocker.patch.object(JobEvent, 'bulk_create_from_data', side_effect=ValueError('NUL byte'))
+    create = mocker.patch.object(JobEvent, 'create_from_data', side_effect=[ValueError('NUL byte'), None])
+    event_buffer = EventBuffer(10, 0.5)
+    event_buffer.add((JobEvent, 1), {'job_id': 1, 'counter': 1}, 100)
+    event_buffer.add((JobEvent, 1), {'job_id': 1, 'counter': 2}, 100)
+    assert worker.flush_events(event_buffer, event_buffer.keys()) is True
+    assert create.call_args_list == [
+        mocker.call(job_id=1, counter=1),
+        mocker.call(job_id=1, counter=2),
+    ]
+
+
+class FakeQueue(object):
+
+    def __init__(self, depth=0):
+        self.items = [None] * depth
+
+    def qsize(self):
+        return len(self.items)
+
+    def put(self, item, block=True, timeout=None):
+        self.items.append(item)
+
+
+class TestJobAffinity():
+
+    @pytest.fixture
+    def receiver(self, mocker, settings):
+        settings.JOB_EVENT_WORKERS = 2
+        settings.JOB_EVENT_MAX_WORKERS = 3
+        settings.JOB_EVENT_WORKER_SCALE_UP_DEPTH = 10
+        settings.JOB_EVENT_WORKER_IDLE_TIMEOUT = 60
+        mocker.patch('awx.main.management.commands.run_callback_receiver.signal')
+        receiver = CallbackBrokerWorker(None, use_workers=False)
+
+        def start_worker():
+            worker = WorkerState(receiver.next_worker_idx, FakeQueue(), mocker.Mock(), [0.0, 0.0, 0.0])
+            receiver.next_worker_idx += 1
+            receiver.workers.append(worker)
+            return worker
+        receiver.start_worker = start_worker
+        start_worker()
+        start_worker()
+        return receiver
+
+    def test_events_for_a_job_share_a_worker(self, receiver):
+        first = receiver.route({'job_id': 1, 'uuid': 'a'})
+        second = receiver.route({'job_id': 2, 'uuid': 'b'})
+        assert first is not second
+        for uuid in 'cdef':
+            assert receiver.route({'job_id': 1, 'uuid': uuid}) is first
+            assert receiver.route({'job_id': 2, 'uuid': uuid}) is second
+
+    def test_job_identifiers_are_namespaced(self, receiver):
+        job = receiver.route({'job_id': 1})
+        assert receiver.route({'project_update_id': 1}) is not job
+
+    def test_eof_releases_job(self, receiver):
+        worker = receiver.route({'job_id': 1})
+        assert receiver.route({'job_id': 1, 'event': 'EOF'}) is worker
+        assert ('job_id', 1) not in receiver.job_workers
+        assert worker.jobs == set()
+        assert worker.idle_since is not None
+
+    def test_new_jobs_go_to_least_loaded_worker(self, receiver):
+        receiver.workers[0].queue = FakeQueue(depth=5)
+        assert receiver.route({'job_id': 1}) is receiver.workers[1]
+
+    def test_scale_up_when_all_workers_are_busy(self, receiver):
+        for worker in receiver.workers:
+            worker.queue = FakeQueue(depth=10)
+        worker = receiver.route({'job_id': 1})
+        assert len(receiver.workers) == 3
+        assert worker is receiver.workers[2]
+        # never beyond JOB_EVENT_MAX_WORKERS
+        worker.queue = FakeQueue(depth=10)
+        receiver.route({'job_id': 2})
+        assert len(receiver.workers) == 3
+
+    def test_scale_down_idle_workers(self, receiver, mocker):
+        mocker.patch('awx.main.management.commands.run_callback_receiver.active_children')
+        extra = receiver.start_worker()
+        extra.idle_since = 100
+        receiver.maintain_workers(130)
+        assert extra in receiver.workers
+        receiver.maintain_workers(160)
+        assert extra not in receiver.workers
+        assert extra.queue.items[-1][1] is None
+        # the minimum number of workers is kept
+        for worker in receiver.workers:
+            worker.idle_since = 0
+        receiver.maintain_workers(1000)
+        assert len(receiver.workers) == 2
+
+    def test_full_queue_counts_blocked_and_dropped(self, receiver, mocker):
+        worker = receiver.workers[0]
+        worker.queue.put = mocker.Mock(side_effect=QueueFull)
+        assert receiver.write_queue_worker(worker, {'job_id': 1}) is None
+        assert worker.blocked == CallbackBrokerWorker.PUT_ATTEMPTS
+        assert worker.dropped == 1
+
+    def test_worker_snapshot(self, receiver):
+        worker = receiver.workers[0]
+        worker.stats = [4.0, 2.0, 1.5]
+        receiver.write_queue_worker(worker, {'job_id': 1})
+        snapshot = worker.snapshot()
+        assert snapshot['enqueued'] == 1
+        assert snapshot['depth'] == 1
+        assert snapshot['processed'] == 4
+        assert snapshot['latency_avg'] == 0.5
+        assert snapshot['latency_max'] == 1.5
+
+    def test_batch_message_routes_each_event(self, receiver, mocker):
+        message = mocker.Mock()
+        receiver.process_task({'events': [
+            {'job_id': 1, 'counter': 1}, {'job_id': 2, 'counter': 1}, {'job_id': 1, 'counter': 2},
+        ]}, message)
+        first, second = receiver.workers
+        assert [item[1] for item in first.queue.items] == [{'job_id': 1, 'counter': 1}, {'job_id': 1, 'counter': 2}]
+        assert [item[1] for item in second.queue.items] == [{'job_id': 2, 'counter': 1}]
+        assert receiver.total_messages == 1
+        assert receiver.total_events == 3
+        message.ack.assert_called_once_with()
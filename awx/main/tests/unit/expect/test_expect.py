@@ -1,3 +1,4 @@
+import base64
 import cStringIO
 import mock
 import os
@@ -5,7 +6,9 @@ import pytest
 import re
 import shutil
 import stat
+import StringIO
 import tempfile
+import threading
 import time
 from collections import OrderedDict
 
@@ -15,8 +18,6 @@ from cryptography.hazmat.primitives import serialization
 
 from awx.main.expect import run, isolated_manager
 
-from django.conf import settings
-
 HERE, FILENAME = os.path.split(__file__)
 
 
@@ -164,6 +165,82 @@ def test_manual_cancellation():
     assert status == 'canceled'
 
 
+def test_large_output_read_completely():
+    stdout = cStringIO.StringIO()
+    status, rc = run.run_pexpect(
+        ['python', '-c', 'print "x" * 500000; print "END"'],
+        HERE,
+        {},
+        stdout,
+        cancelled_callback=lambda: False,
+    )
+    assert status == 'successful'
+    assert stdout.getvalue().rstrip().endswith('END')
+
+
+def test_cancel_fd_wakes_supervisor():
+    stdout = cStringIO.StringIO()
+    read_fd, write_fd = os.pipe()
+    checks = []
+
+    def cancelled_callback():
+        checks.append(os.read(read_fd, 1))
+        return True
+
+    threading.Timer(.1, lambda: os.write(write_fd, 'x')).start()
+    start = time.time()
+    try:
+        status, rc = run.run_pexpect(
+            ['python', '-c', 'import time; time.sleep(30)'],
+            HERE,
+            {},
+            stdout,
+            cancelled_callback=cancelled_callback,
+            pexpect_timeout=60,
+            cancel_fd=read_fd,
+            cancel_poll_interval=60,
+        )
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+    assert status == 'canceled'
+    assert checks == ['x']
+    assert time.time() - start < 10
+
+
+def test_repeated_cancel_notification_while_exiting():
+    stdout = cStringIO.StringIO()
+    read_fd, write_fd = os.pipe()
+    checks = []
+
+    def cancelled_callback():
+        checks.append(os.read(read_fd, 1))
+        return True
+
+    threading.Timer(.1, lambda: os.write(write_fd, 'x')).start()
+    threading.Timer(.3, lambda: os.write(write_fd, 'x')).start()
+    cpu_start = sum(os.times()[:2])
+    try:
+        status, rc = run.run_pexpect(
+            # ignores the SIGTERM of the cancel and exits on its own
+            ['python', '-c', 'import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(5)'],
+            HERE,
+            {},
+            stdout,
+            cancelled_callback=cancelled_callback,
+            pexpect_timeout=60,
+            cancel_fd=read_fd,
+            cancel_poll_interval=60,
+        )
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+    assert status == 'canceled'
+    assert checks == ['x']
+    # the unread second notification does not make the supervisor spin
+    assert sum(os.times()[:2]) - cpu_start < 1
+
+
 def test_build_isolated_job_data(private_data_dir, rsa_key):
     pem, passphrase = rsa_key
     mgr = isolated_manager.IsolatedManager(
@@ -263,7 +340,8 @@ def test_run_isolated_adhoc_command(private_data_dir, rsa_key):
     assert env['AWX_ISOLATED_DATA_DIR'] == private_data_dir
 
 
-def test_check_isolated_job(private_data_dir, rsa_key):
+def test_check_isolated_job(private_data_dir, rsa_key, settings):
+    settings.AWX_ISOLATED_CONTROL_SESSION = False
     pem, passphrase = rsa_key
     stdout = cStringIO.StringIO()
     mgr = isolated_manager.IsolatedManager(['ls', '-la'], HERE, {}, stdout, '')
@@ -313,7 +391,8 @@ def test_check_isolated_job(private_data_dir, rsa_key):
         )
 
 
-def test_check_isolated_job_timeout(private_data_dir, rsa_key):
+def test_check_isolated_job_timeout(private_data_dir, rsa_key, settings):
+    settings.AWX_ISOLATED_CONTROL_SESSION = False
     pem, passphrase = rsa_key
     stdout = cStringIO.StringIO()
     extra_update_fields = {}
@@ -339,3 +418,81 @@ def test_check_isolated_job_timeout(private_data_dir, rsa_key):
         assert stdout.getvalue() == 'checking job status...'
 
     assert extra_update_fields['job_explanation'] == 'Job terminated due to timeout'
+
+
+def test_check_isolated_job_output(private_data_dir):
+    events_dir = os.path.join(private_data_dir, 'artifacts', 'job_events')
+    os.makedirs(events_dir)
+    assert run.check_isolated_job(private_data_dir)['alive'] is False
+
+    with open(os.path.join(private_data_dir, 'pid'), 'w') as f:
+        f.write(str(os.getpid()))
+    with open(os.path.join(private_data_dir, 'artifacts', 'stdout'), 'w') as f:
+        f.write('PLAY [all]\nTASK [ping]\n')
+    for uuid in ('old', 'new'):
+        with open(os.path.join(events_dir, '{}-partial.json'.format(uuid)), 'w') as f:
+            f.write('{"uuid": "%s"}' % uuid)
+    os.utime(os.path.join(events_dir, 'old-partial.json'), (1000, 1000))
+
+    result = run.check_isolated_job(private_data_dir, stdout_offset=11, events_since=2000, max_bytes=5)
+    assert result['alive'] is True
+    assert base64.b64decode(result['stdout']) == 'TASK '
+    assert result['stdout_offset'] == 16
+    assert result['stdout_size'] == 23
+    assert result['job_events'] == {'new-partial.json': '{"uuid": "new"}'}
+
+
+def test_check_isolated_job_over_control_session(private_data_dir, settings):
+    settings.AWX_ISOLATED_CONTROL_SESSION = True
+    stdout = StringIO.StringIO()
+    mgr = isolated_manager.IsolatedManager(['ls', '-la'], HERE, {}, stdout, '')
+    mgr.private_data_dir = private_data_dir
+    mgr.instance = mock.Mock(id=123, pk=123, verbosity=0, spec_set=['id', 'pk', 'verbosity'])
+    mgr.started_at = time.time()
+    mgr.host = 'isolated-host'
+
+    # the "isolated" job runs in remote_dir; the controlling node's copy of
+    # its artifacts is kept in private_data_dir
+    remote_dir = tempfile.mkdtemp(prefix='ansible_awx_unit_test')
+    try:
+        os.makedirs(os.path.join(remote_dir, 'artifacts', 'job_events'))
+        os.makedirs(os.path.join(private_data_dir, 'artifacts', 'job_events'))
+        output = [
+            ('{"uuid": "1"}', u'\u2603 one\n'.encode('utf-8')),
+            ('{"uuid": "2"}', 'two\n'),
+        ]
+
+        def check(session, path, stdout_offset, events_since):
+            assert path == private_data_dir
+            if output:
+                data, text = output.pop(0)
+                event_path = os.path.join(remote_dir, 'artifacts', 'job_events', '{}-partial.json'.format(len(output)))
+                with open(event_path, 'w') as f:
+                    f.write(data)
+                with open(os.path.join(remote_dir, 'artifacts', 'stdout'), 'ab') as f:
+                    f.write(text)
+            result = run.check_isolated_job(remote_dir, stdout_offset, events_since, max_bytes=2)
+            result['alive'] = bool(output)
+            return result
+
+        def _synchronize_job_artifacts(args, cwd, env, buff, **kw):
+            for filename, data in (['status', 'successful'], ['rc', '0']):
+                with open(os.path.join(private_data_dir, 'artifacts', filename), 'w') as f:
+                    f.write(data)
+            return ('successful', 0)
+
+        with mock.patch.object(isolated_manager.IsolatedControlSession, '__init__', return_value=None), \
+                mock.patch.object(isolated_manager.IsolatedControlSession, 'check', check), \
+                mock.patch('awx.main.expect.run.run_pexpect') as run_pexpect:
+            run_pexpect.side_effect = _synchronize_job_artifacts
+            status, rc = mgr.check(interval=0)
+
+        assert (status, rc) == ('successful', 0)
+        assert stdout.getvalue() == u'\u2603 one\ntwo\n'
+        # artifacts are only copied with check_isolated.yml once the job ends
+        assert run_pexpect.call_count == 1
+        for name, data in (('1', '{"uuid": "1"}'), ('0', '{"uuid": "2"}')):
+            with open(os.path.join(private_data_dir, 'artifacts', 'job_events', '{}-partial.json'.format(name))) as f:
+                assert f.read() == data
+    finally:
+        shutil.rmtree(remote_dir)
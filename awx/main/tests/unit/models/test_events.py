@@ -59,3 +59,39 @@ def test_really_long_event_fields(field):
             'job_id': 123,
             field: 'X' * 1021 + '...'
         })
+
+
+@pytest.mark.parametrize('job_identifier, cls', [
+    ['project_update_id', ProjectUpdateEvent],
+    ['inventory_update_id', InventoryUpdateEvent],
+    ['system_job_id', SystemJobEvent],
+])
+def test_event_bulk_create_from_data(job_identifier, cls):
+    with mock.patch.object(cls, 'objects') as manager, \
+            mock.patch('awx.main.models.events.can_bulk_create_events', return_value=True), \
+            mock.patch('awx.main.models.events.transaction') as transaction, \
+            mock.patch('awx.main.models.events.post_save') as post_save:
+        events = cls.bulk_create_from_data([
+            {job_identifier: 123, 'created': datetime(2018, 1, 1).isoformat(), 'extra_key': 'extra_value'},
+            {job_identifier: 123, 'counter': 2},
+        ])
+        manager.bulk_create.assert_called_once_with(events)
+        manager.create.assert_not_called()
+        assert [getattr(e, job_identifier) for e in events] == [123, 123]
+        assert events[0].created == datetime(2018, 1, 1).replace(tzinfo=utc)
+        assert events[1].created is not None
+        assert events[1].counter == 2
+        # websocket emitters receive one post_save per event, once committed
+        post_save.send.assert_not_called()
+        [send_post_save] = [call[0][0] for call in transaction.on_commit.call_args_list]
+        send_post_save()
+        assert post_save.send.call_count == 2
+
+
+def test_event_bulk_create_falls_back_to_single_row():
+    with mock.patch.object(SystemJobEvent, 'objects') as manager, \
+            mock.patch('awx.main.models.events.transaction'), \
+            mock.patch('awx.main.models.events.can_bulk_create_events', return_value=False):
+        SystemJobEvent.bulk_create_from_data([{'system_job_id': 123}, {'system_job_id': 123}])
+        manager.bulk_create.assert_not_called()
+        assert manager.create.call_count == 2
@@ -85,6 +85,7 @@ def job(mocker):
         'awx_meta_vars.return_value': {},
         'inventory.get_script_data.return_value': {}})
     ret.project = mocker.MagicMock(scm_revision='asdf1234')
+    mocker.patch('awx.main.tasks.open_script_data', return_value=None)
     return ret
 
 
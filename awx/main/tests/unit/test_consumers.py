@@ -0,0 +1,66 @@
+import mock
+import pytest
+
+from awx.main import consumers
+from awx.main.consumers import EventFrameBatcher
+
+
+FRAME_FIELDS = {'group_name': 'job_events', 'job': 1}
+
+
+@pytest.fixture
+def emit():
+    with mock.patch.object(consumers, 'emit_channel_notification') as emit:
+        yield emit
+
+
+def event(counter, name='runner_on_ok'):
+    return {'group_name': 'job_events', 'job': 1, 'counter': counter, 'event': name}
+
+
+def test_first_event_sent_right_away(emit):
+    batcher = EventFrameBatcher(max_frame_rate=10, summary_threshold=100)
+    batcher.add('job_events-1', event(1), FRAME_FIELDS, now=100)
+    emit.assert_called_once_with('job_events-1', event(1))
+
+
+def test_events_batched_between_frames(emit):
+    batcher = EventFrameBatcher(max_frame_rate=10, summary_threshold=100)
+    batcher.add('job_events-1', event(1), FRAME_FIELDS, now=100)
+    for counter in range(2, 5):
+        batcher.add('job_events-1', event(counter), FRAME_FIELDS, now=100.01)
+    assert emit.call_count == 1
+    assert batcher.timeout(100.05) == pytest.approx(0.05)
+    batcher.flush(now=100.05)
+    assert emit.call_count == 1
+    batcher.flush(now=100.2)
+    assert emit.call_count == 2
+    group, frame = emit.call_args[0]
+    assert group == 'job_events-1'
+    assert frame == dict(FRAME_FIELDS, events=[event(2), event(3), event(4)])
+    assert batcher.timeout(100.2) is None
+
+
+def test_lagging_group_summarized(emit):
+    batcher = EventFrameBatcher(max_frame_rate=1, summary_threshold=2)
+    batcher.add('job_events-1', event(1), FRAME_FIELDS, now=100)
+    batcher.add('job_events-1', event(2, 'runner_on_failed'), FRAME_FIELDS, now=100.1)
+    batcher.add('job_events-1', event(3), FRAME_FIELDS, now=100.2)
+    batcher.add('job_events-1', event(4), FRAME_FIELDS, now=101)
+    group, frame = emit.call_args[0]
+    assert frame == dict(FRAME_FIELDS, summary={
+        'count': 3, 'first_counter': 2, 'counter': 4, 'events': {'runner_on_ok': 2, 'runner_on_failed': 1}
+    })
+    assert batcher.events_summarized == 3
+
+
+def test_flush_related_groups(emit):
+    with mock.patch.object(consumers, 'event_frame_batcher', EventFrameBatcher(1, 100)):
+        consumers.emit_event_notification('job_events-1', event(1), FRAME_FIELDS)
+        consumers.emit_event_notification('job_events-1', event(2), FRAME_FIELDS)
+        consumers.emit_event_notification('job_events-10', event(1), FRAME_FIELDS)
+        consumers.emit_event_notification('job_events-10', event(2), FRAME_FIELDS)
+        assert emit.call_count == 2
+        consumers.flush_event_notifications(related_id=1)
+        assert emit.call_count == 3
+        assert emit.call_args[0] == ('job_events-1', event(2))
@@ -0,0 +1,61 @@
+import mock
+import pytest
+
+from awx.main import queue
+from awx.main.queue import CallbackQueueDispatcher
+
+
+@pytest.fixture
+def producer():
+    with mock.patch.object(queue, 'Connection'), mock.patch.object(queue, 'Producer') as Producer:
+        yield Producer.return_value
+
+
+def dispatcher(settings, batch_size, compression='zlib'):
+    settings.BROKER_URL = 'amqp://'
+    settings.CALLBACK_QUEUE = 'callback_tasks'
+    settings.CALLBACK_QUEUE_BATCH_SIZE = batch_size
+    settings.CALLBACK_QUEUE_BATCH_TIMEOUT = 60
+    settings.CALLBACK_QUEUE_COMPRESSION = compression
+    return CallbackQueueDispatcher()
+
+
+def published(producer):
+    return [c[0][0] for c in producer.publish.call_args_list]
+
+
+def test_publish_every_event(settings, producer):
+    d = dispatcher(settings, 1, 'bzip2')
+    d.dispatch({'counter': 1})
+    d.dispatch({'counter': 2})
+    assert published(producer) == [{'counter': 1}, {'counter': 2}]
+    assert producer.publish.call_args[1]['compression'] == 'bzip2'
+    assert d.messages_published == 2
+
+
+def test_publish_batches(settings, producer):
+    d = dispatcher(settings, 2)
+    for counter in range(1, 4):
+        d.dispatch({'counter': counter})
+    assert published(producer) == [{'events': [{'counter': 1}, {'counter': 2}]}]
+    d.dispatch({'event': 'EOF'})
+    assert published(producer)[-1] == {'events': [{'counter': 3}, {'event': 'EOF'}]}
+    assert d.batch_timer is None
+
+
+def test_partial_batch_published_after_timeout(settings, producer):
+    d = dispatcher(settings, 10)
+    d.dispatch({'counter': 1})
+    assert published(producer) == []
+    assert d.batch_timer is not None
+    d.batch_timer.function()
+    assert published(producer) == [{'counter': 1}]
+    assert d.batch_timer is None
+
+
+def test_reconnect_after_publish_error(settings, producer):
+    d = dispatcher(settings, 1)
+    producer.publish.side_effect = [Exception('connection reset'), None]
+    d.dispatch({'counter': 1})
+    assert queue.Connection.call_count == 2
+    assert d.messages_published == 1
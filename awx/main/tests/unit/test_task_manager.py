@@ -18,10 +18,10 @@ from django.core.cache import cache
 
 class TestCleanupInconsistentCeleryTasks():
     @mock.patch.object(cache, 'get', return_value=None)
-    @mock.patch.object(TaskManager, 'get_active_tasks', return_value=([], {}))
+    @mock.patch.object(TaskManager, 'get_leased_task_ids', return_value=set())
     @mock.patch.object(TaskManager, 'get_running_tasks', return_value=({'host1': [Job(id=2), Job(id=3),]}, []))
     @mock.patch.object(InstanceGroup.objects, 'prefetch_related', return_value=[])
-    @mock.patch.object(Instance.objects, 'filter', return_value=mock.MagicMock(first=lambda: None))
+    @mock.patch.object(Instance.objects, 'filter', return_value=mock.MagicMock(values_list=lambda *a: []))
     @mock.patch('awx.main.scheduler.task_manager.logger')
     def test_instance_does_not_exist(self, logger_mock, *args):
         logger_mock.error = mock.MagicMock(side_effect=RuntimeError("mocked"))
@@ -35,8 +35,9 @@ class TestCleanupInconsistentCeleryTasks():
                                                   "'job 3 (new)']")
 
     @mock.patch.object(cache, 'get', return_value=None)
-    @mock.patch.object(TaskManager, 'get_active_tasks', return_value=([], {'host1': []}))
+    @mock.patch.object(TaskManager, 'get_leased_task_ids', return_value=set())
     @mock.patch.object(InstanceGroup.objects, 'prefetch_related', return_value=[])
+    @mock.patch.object(Instance.objects, 'filter', return_value=mock.MagicMock(values_list=lambda *a: [('host1', None)]))
     @mock.patch.object(TaskManager, 'get_running_tasks')
     @mock.patch('awx.main.scheduler.task_manager.logger')
     def test_save_failed(self, logger_mock, get_running_tasks, *args):
@@ -51,19 +52,17 @@ class TestCleanupInconsistentCeleryTasks():
             job.save.assert_called_once()
             logger_mock.error.assert_called_once_with("Task job 2 (failed) DB error in marking failed. Job possibly deleted.")
 
+    @mock.patch.object(cache, 'get', return_value=None)
+    @mock.patch.object(TaskManager, 'get_leased_task_ids', return_value=set(['blah']))
     @mock.patch.object(InstanceGroup.objects, 'prefetch_related', return_value=[])
-    @mock.patch('awx.main.scheduler.task_manager.Inspect')
-    def test_multiple_active_instances_sanity_check(self, inspect_mock, *args):
-        class MockInspector:
-            pass
-
-        mock_inspector = MockInspector()
-        mock_inspector.active = lambda: {
-            'celery@host1': [],
-            'celery@host2': []
-        }
-        inspect_mock.return_value = mock_inspector
+    @mock.patch.object(Instance.objects, 'filter', return_value=mock.MagicMock(values_list=lambda *a: [('host1', None)]))
+    @mock.patch.object(TaskManager, 'get_running_tasks')
+    def test_leased_task_not_failed(self, get_running_tasks, *args):
+        job = Job(id=2, modified=tz_now(), status='running', celery_task_id='blah', execution_node='host1')
+        get_running_tasks.return_value = ({'host1': [job]}, [])
         tm = TaskManager()
-        active_task_queues, queues = tm.get_active_tasks()
-        assert 'host1' in queues
-        assert 'host2' in queues
+
+        with mock.patch.object(job, 'save') as save:
+            tm.cleanup_inconsistent_celery_tasks()
+            save.assert_not_called()
+        assert job.status == 'running'
@@ -18,6 +18,7 @@ import six
 import yaml
 
 from django.conf import settings
+from django.db import DatabaseError
 
 
 from awx.main.models import (
@@ -228,13 +229,18 @@ class TestJobExecution:
             # don't emit websocket statuses; they use the DB and complicate testing
             mock.patch.object(UnifiedJob, 'websocket_emit_status', mock.Mock()),
             mock.patch('awx.main.expect.run.run_pexpect', self.run_pexpect),
+            # task leases are persisted in the DB
+            mock.patch.object(tasks.BaseTask, 'start_task_lease', mock.Mock()),
+            # cached inventory script data is versioned by the DB
+            mock.patch.object(tasks, 'open_script_data', lambda *args, **kw: None),
         ]
         for cls in (Job, AdHocCommand):
             self.patches.append(
                 mock.patch.object(cls, 'inventory', mock.Mock(
                     pk=1,
                     get_script_data=lambda *args, **kw: self.INVENTORY_DATA,
-                    spec_set=['pk', 'get_script_data']
+                    write_script_data=lambda f, *args, **kw: json.dump(self.INVENTORY_DATA, f),
+                    spec_set=['pk', 'get_script_data', 'write_script_data']
                 ))
             )
         for p in self.patches:
@@ -435,6 +441,20 @@ class TestGenericRun(TestJobExecution):
         assert update_model_call['status'] == 'error'
         assert update_model_call['emitted_events'] == 0
 
+    def test_task_lease_released_on_error(self):
+        self.task.start_task_lease = mock.Mock()
+        update_model = self.task.update_model.side_effect
+
+        def fail_final_update(pk, **kwargs):
+            if 'emitted_events' in kwargs:
+                raise DatabaseError('connection lost')
+            return update_model(pk, **kwargs)
+
+        self.task.update_model.side_effect = fail_final_update
+        with pytest.raises(DatabaseError):
+            self.task.run(self.pk)
+        self.task.start_task_lease.return_value.stop.assert_called_once_with()
+
     def test_cancel_flag(self):
         self.instance.cancel_flag = True
         with pytest.raises(Exception):
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import socket
+
+import pytest
+
+from awx.main.utils.callback_socket import CallbackEventReceiver, RECORD_HEADER
+
+
+def record(data):
+    payload = json.dumps(data).encode('utf-8')
+    return RECORD_HEADER.pack(len(payload)) + payload
+
+
+@pytest.fixture
+def receiver(tmpdir):
+    receiver = CallbackEventReceiver(os.path.join(tmpdir.strpath, 'callback_events.sock'), wait_timeout=5)
+    yield receiver
+    receiver.close()
+
+
+def connect(receiver):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(receiver.path)
+    return sock
+
+
+def test_no_plugin_connected(receiver):
+    assert receiver.pop('abc') is None
+
+
+def test_records_received_by_uuid(receiver):
+    sock = connect(receiver)
+    try:
+        data = b''.join([
+            record({'uuid': 'abc', 'event': 'runner_on_ok', 'event_data': {'res': u'☃' * 100000}}),
+            record({'uuid': 'def', 'event': 'playbook_on_stats'}),
+        ])
+        # records split across writes are reassembled
+        sock.sendall(data[:3])
+        sock.sendall(data[3:70000])
+        sock.sendall(data[70000:])
+        assert receiver.pop('def') == {'uuid': 'def', 'event': 'playbook_on_stats'}
+        assert receiver.pop('abc')['event_data']['res'] == u'☃' * 100000
+        assert receiver.events == {}
+    finally:
+        sock.close()
+
+
+def test_stop_waiting_when_plugin_disconnects(receiver):
+    sock = connect(receiver)
+    sock.sendall(record({'uuid': 'abc'})[:5])
+    sock.close()
+    assert receiver.pop('abc') is None
+
+
+def test_socket_removed_on_close(tmpdir):
+    path = os.path.join(tmpdir.strpath, 'callback_events.sock')
+    receiver = CallbackEventReceiver(path)
+    assert os.path.exists(path)
+    receiver.close()
+    assert not os.path.exists(path)
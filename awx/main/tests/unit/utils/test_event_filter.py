@@ -147,6 +147,48 @@ def test_large_stdout_blob():
         f.write('x' * 1024)
 
 
+@pytest.mark.timeout(1)
+def test_large_stdout_blob_with_erase_lines():
+    def _callback(*args, **kw):
+        pass
+
+    f = OutputEventFilter(_callback)
+    for x in range(1024 * 10):
+        f.write('\r\x1b[K' + 'x' * 1024)
+
+
+def test_event_written_byte_by_byte(fake_callback, fake_cache, wrapped_handle):
+    fake_cache[':1:ev-{}'.format(EXAMPLE_UUID)] = {'event': 'foo'}
+    buff = StringIO()
+    buff.write('50%\x1b[K100%\r\n')
+    write_encoded_event_data(buff, {'uuid': EXAMPLE_UUID, 'role': 'some_path_to_role'})
+    buff.write('\x1b[0;33mchanged: [localhost]\x1b[0m\r\n')
+    write_encoded_event_data(buff, {})
+    for char in buff.getvalue():
+        wrapped_handle.write(char)
+    wrapped_handle.close()
+
+    assert [event_data['event'] for event_data in fake_callback] == ['verbose', 'foo', 'EOF']
+    assert fake_callback[0]['stdout'] == '50%\x1b[K100%'
+    assert fake_callback[1]['role'] == 'some_path_to_role'
+    assert fake_callback[1]['stdout'] == '\x1b[0;33mchanged: [localhost]\x1b[0m'
+
+
+def test_incomplete_event_is_stdout():
+    stdout = []
+
+    def _callback(event_data):
+        stdout.append(event_data.get('stdout'))
+
+    f = OutputEventFilter(_callback)
+    f.write('one\r\n\x1b[KeyJ1\x1b[4D')
+    f.write('dWlk not an event\r\n')
+    f.write('\x1b[KeyJ1\x1b[4')
+    f.close()
+
+    assert stdout == ['one', '\x1b[KeyJ1\x1b[4DdWlk not an event', '\x1b[KeyJ1\x1b', None]
+
+
 def test_verbose_line_buffering():
     events = []
 
@@ -1,11 +1,12 @@
 
 # Python
+import datetime
 import pytest
 import mock
 from collections import namedtuple
 
 # AWX
-from awx.main.utils.filters import SmartFilter, ExternalLoggerEnabled
+from awx.main.utils.filters import SmartFilter, ExternalLoggerEnabled, UnsupportedLookup
 
 # Django
 from django.db.models import Q
@@ -172,6 +173,67 @@ class TestSmartFilterQueryFromString():
         assert six.text_type(q) == six.text_type(q_expected)
 
 
+@mock.patch('awx.main.utils.filters.get_model', return_value=mockHost())
+class TestCompiledSmartFilter():
+
+    @pytest.mark.parametrize("filter_string,host,expected", [
+        ('name=foo', {'name': 'foo'}, True),
+        ('name=foo', {'name': 'bar'}, False),
+        ('name__icontains=FO', {'name': 'foo'}, True),
+        ('enabled=true', {'enabled': True}, True),
+        ('enabled=false', {'enabled': True}, False),
+        ('description=null', {'description': None}, True),
+        ('groups__name=web', {'groups': [{'name': 'db'}, {'name': 'web'}]}, True),
+        ('groups__name=web', {'groups': []}, False),
+        ('groups__name=web and groups__name=db', {'groups': [{'name': 'db'}, {'name': 'web'}]}, True),
+        ('name=foo and groups__name=web', {'name': 'foo', 'groups': [{'name': 'db'}]}, False),
+        ('name=bar or groups__name=web', {'name': 'foo', 'groups': [{'name': 'web'}]}, True),
+        ('name=a or name=b or name=c and enabled=true', {'name': 'c', 'enabled': False}, False),
+        ('search=foo', {'name': 'xfoox', 'description': ''}, True),
+        ('search=foo', {'name': 'bar', 'description': 'foo'}, True),
+        ('search=foo', {'name': 'bar', 'description': 'baz'}, False),
+        ('ansible_facts__a="true"', {'ansible_facts': {'a': 'true', 'b': 1}}, True),
+        ('ansible_facts__a__b[]=3', {'ansible_facts': {'a': {'b': [1, 3]}}}, True),
+        ('ansible_facts__a__b[]=3', {'ansible_facts': {'a': {'b': [1, 2]}}}, False),
+        ('ansible_facts__a__b[]__c="x"', {'ansible_facts': {'a': {'b': [{'c': 'x', 'd': 'y'}]}}}, True),
+        ('ansible_facts__a=null', {'ansible_facts': {}}, False),
+        ('name__gt=a', {'name': 'b'}, True),
+        ('name__lte=5', {'name': 'foo'}, False),
+        ('id__gte=5', {'id': 7}, True),
+        ('id__lt=5', {'id': None}, False),
+        ('created__gt="2018-01-01"', {'created': datetime.datetime(2018, 6, 1)}, True),
+        ('created__lt="2018-01-01T12:00"', {'created': datetime.datetime(2018, 6, 1)}, False),
+        ('groups__name__isnull=true', {'groups': []}, True),
+        ('groups__name__isnull=true', {'groups': [{'name': 'web'}, {'name': None}]}, True),
+        ('groups__name__isnull=true', {'groups': [{'name': 'web'}]}, False),
+        ('groups__name__isnull=false', {'groups': [{'name': None}, {'name': 'web'}]}, True),
+        ('groups__name__isnull=false', {'groups': []}, False),
+    ])
+    def test_matches(self, mock_get_host_model, filter_string, host, expected):
+        assert SmartFilter.compile(filter_string).matches(host) is expected
+
+    def test_unknown_field(self, mock_get_host_model):
+        with pytest.raises(UnsupportedLookup):
+            SmartFilter.compile('inventory__name=foo').matches({'name': 'foo'})
+
+    @pytest.mark.parametrize("filter_string,host", [
+        ('id__gt=foo', {'id': 7}),
+        ('created__gt=yesterday', {'created': datetime.datetime(2018, 6, 1)}),
+        ('id__gt=true', {'id': 7}),
+    ])
+    def test_incomparable_values(self, mock_get_host_model, filter_string, host):
+        # left to the database, rather than compared the way Python would
+        with pytest.raises(UnsupportedLookup):
+            SmartFilter.compile(filter_string).matches(host)
+
+    def test_compiled_once(self, mock_get_host_model):
+        with mock.patch.object(SmartFilter, '_parse', wraps=SmartFilter._parse) as parse:
+            first = SmartFilter.compile('name=cached')
+            assert SmartFilter.compile('name=cached') is first
+            assert six.text_type(SmartFilter.query_from_string('name=cached')) == six.text_type(first.query)
+        assert parse.call_count == 1
+
+
 '''
 #('"facts__quoted_val"="f\"oo"', 1),
 #('facts__facts__arr[]="foo"', 1),
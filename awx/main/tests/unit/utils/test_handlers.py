@@ -3,6 +3,7 @@ import base64
 import cStringIO
 import logging
 import socket
+import threading
 import datetime
 from dateutil.tz import tzutc
 from uuid import uuid4
@@ -17,7 +18,7 @@ from requests_futures.sessions import FuturesSession
 from awx.main.utils.handlers import (BaseHandler, BaseHTTPSHandler as HTTPSHandler,
                                      TCPHandler, UDPHandler, _encode_payload_for_socket,
                                      PARAM_NAMES, LoggingConnectivityException,
-                                     AWXProxyHandler)
+                                     BatchingHandler, AWXProxyHandler)
 from awx.main.utils.formatters import LogstashFormatter
 
 
@@ -374,3 +375,104 @@ def test_tcp_handler_log_exception(fake_socket, dummy_log_record):
         logger_mock.exception.assert_called_once()
         fake_socket.close.assert_called_once()
         assert not fake_socket.send.called
+
+
+def test_tcp_handler_send_batch_over_persistent_connection():
+    handler = TCPHandler(host='127.0.0.1', port=4399, tcp_timeout=5)
+    sok = mock.Mock()
+    with mock.patch('socket.create_connection', return_value=sok) as connect_mock:
+        assert handler._send_batch(['foo', {'bar': 'baz'}]) == 0
+        assert handler._send_batch(['qux']) == 0
+        connect_mock.assert_called_once_with(('127.0.0.1', 4399), timeout=5.0)
+        assert sok.sendall.call_args_list == [
+            mock.call('foo\n{"bar": "baz"}\n'),
+            mock.call('qux\n'),
+        ]
+        handler.close()
+        sok.close.assert_called_once()
+
+
+def test_tcp_handler_send_batch_reconnects():
+    handler = TCPHandler(host='127.0.0.1', port=4399, tcp_timeout=5)
+    stale, fresh = mock.Mock(), mock.Mock()
+    stale.sendall.side_effect = [None, socket.error('Broken pipe')]
+    with mock.patch('socket.create_connection', side_effect=[stale, fresh]):
+        assert handler._send_batch(['foo']) == 0
+        assert handler._send_batch(['bar', 'baz']) == 0
+    stale.close.assert_called_once()
+    fresh.sendall.assert_called_once_with('bar\nbaz\n')
+
+    with mock.patch('socket.create_connection', side_effect=socket.error('Connection refused')):
+        handler._close_socket()
+        assert handler._send_batch(['foo']) == 1
+
+
+@pytest.mark.parametrize('message_type, requests_sent', [('logstash', 2), ('splunk', 1)])
+def test_https_logging_handler_send_batch(http_adapter, message_type, requests_sent):
+    handler = HTTPSHandler(host='127.0.0.1', message_type=message_type)
+    handler.session.mount('http://', http_adapter)
+    assert handler._send_batch(['{"foo": 1}', '{"bar": 2}']) == 0
+    assert len(http_adapter.requests) == requests_sent
+    if message_type == 'splunk':
+        assert http_adapter.requests[0].body == '{"event": {"foo": 1}}\n{"event": {"bar": 2}}'
+
+
+def test_https_logging_handler_send_batch_failed(http_adapter):
+    http_adapter.status = 500
+    handler = HTTPSHandler(host='127.0.0.1', message_type='splunk')
+    handler.session.mount('http://', http_adapter)
+    assert handler._send_batch(['{"foo": 1}', '{"bar": 2}']) == 2
+
+
+def test_batching_handler_sends_batches(dummy_log_record):
+    target = mock.Mock(spec=BaseHandler)
+    target.format_payload.side_effect = ['one', 'two', 'three']
+    target._send_batch.return_value = 0
+    handler = BatchingHandler(target, batch_size=2, flush_interval=60)
+    for i in range(3):
+        handler.emit(dummy_log_record)
+    handler.close()
+    assert target._send_batch.call_args_list == [
+        mock.call(['one', 'two']),
+        mock.call(['three']),
+    ]
+    target.close.assert_called_once()
+    assert (handler.sent, handler.dropped, handler.failed) == (3, 0, 0)
+
+
+def test_batching_handler_drops_when_full(dummy_log_record):
+    sending, release = threading.Event(), threading.Event()
+
+    def send_batch(batch):
+        sending.set()
+        release.wait()
+        return len(batch) if batch == ['two'] else 0
+
+    target = mock.Mock(spec=BaseHandler)
+    target.format_payload.side_effect = ['one', 'two', 'three', 'four']
+    target._send_batch.side_effect = send_batch
+    handler = BatchingHandler(target, max_queue_size=1, batch_size=1)
+    handler.emit(dummy_log_record)
+    assert sending.wait(5)
+    for i in range(3):
+        handler.emit(dummy_log_record)
+    release.set()
+    handler.close()
+    assert target._send_batch.call_args_list == [mock.call(['one']), mock.call(['two'])]
+    assert (handler.sent, handler.dropped, handler.failed) == (1, 2, 1)
+
+
+def test_proxy_handler_batches_records(dummy_log_record):
+    settings = LazySettings()
+    settings.configure(LOG_AGGREGATOR_PROTOCOL='udp', LOG_AGGREGATOR_HOST='127.0.0.1',
+                       LOG_AGGREGATOR_PORT=4399, LOG_AGGREGATOR_BATCH_SIZE=10)
+    with mock.patch('awx.main.utils.handlers.settings', settings):
+        proxy = AWXProxyHandler()
+        proxy.setFormatter(LogstashFormatter())
+        with mock.patch.object(UDPHandler, '_send_batch', return_value=0) as send_batch:
+            proxy.emit(dummy_log_record)
+            batching_handler = proxy.get_batching_handler()
+            assert batching_handler.handler is proxy.get_handler()
+            assert batching_handler.batch_size == 10
+            proxy.close()
+            send_batch.assert_called_once()
@@ -1,11 +1,12 @@
 # AWX utils
 from awx.main.utils.mem_inventory import (
     MemInventory,
-    mem_data_to_dict, dict_to_mem_data
+    mem_data_to_dict, dict_to_mem_data, load_inventory_json
 )
 
 import pytest
 import json
+from io import BytesIO
 
 
 @pytest.fixture
@@ -126,3 +127,36 @@ def test_host_lists_accepted(JSON_with_lists):
     # Check that marietta's hosts was saved
     h = inventory.get_host('host6.example.com')
     assert h.name == 'host6.example.com'
+
+
+@pytest.mark.inventory_import
+def test_mem_objects_have_slots():
+    inventory = MemInventory()
+    with pytest.raises(AttributeError):
+        inventory.get_host('my_host').foo = 'bar'
+    with pytest.raises(AttributeError):
+        inventory.get_group('my_group').foo = 'bar'
+
+
+# Streaming JSON --> dict tests
+
+@pytest.mark.inventory_import
+@pytest.mark.parametrize('chunk_size', [1, 7, 64 * 1024])
+def test_load_inventory_json(JSON_of_inv, JSON_with_lists, chunk_size):
+    data = dict(JSON_with_lists, **JSON_of_inv)
+    data['_meta']['hostvars']['my_host']['numbers'] = [1, 12345678901234, 1.5e10, None, True]
+    raw = json.dumps(data, indent=2)
+    assert load_inventory_json(BytesIO(raw), chunk_size=chunk_size) == json.loads(raw)
+
+
+@pytest.mark.inventory_import
+def test_load_inventory_json_interns_names(JSON_with_lists):
+    data = load_inventory_json(BytesIO(json.dumps(JSON_with_lists)))
+    assert data['databases']['hosts'][1] is data['webservers'][0]
+
+
+@pytest.mark.inventory_import
+@pytest.mark.parametrize('raw', ['{"all": {}', '{"all": {}} extra', '{"all" {}}', '{"all": {},}', ''])
+def test_load_inventory_json_invalid(raw):
+    with pytest.raises(ValueError):
+        load_inventory_json(BytesIO(raw), chunk_size=2)
@@ -0,0 +1,48 @@
+import mock
+import pytest
+
+from awx.main.utils import pgnotify
+from awx.main.utils.pgnotify import PGListener
+
+
+class Notify(object):
+
+    def __init__(self, channel):
+        self.channel = channel
+
+
+@pytest.fixture
+def connection():
+    with mock.patch.object(pgnotify, 'connection') as connection:
+        connection.vendor = 'postgresql'
+        connection.connection.notifies = []
+        connection.connection.fileno.return_value = 42
+        yield connection
+
+
+def test_listen(connection):
+    listener = PGListener('awx_cancel_1')
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.execute.assert_called_once_with('LISTEN "awx_cancel_1"')
+    assert listener.fileno() == 42
+    assert listener.consume() is False
+    connection.connection.notifies.extend([Notify('awx_cancel_2'), Notify('awx_cancel_1')])
+    assert listener.consume() is True
+    assert connection.connection.notifies == []
+    listener.close()
+    cursor.execute.assert_called_with('UNLISTEN "awx_cancel_1"')
+
+
+def test_stop_listening_when_reconnected(connection):
+    listener = PGListener('awx_cancel_1')
+    connection.connection = mock.Mock(notifies=[Notify('awx_cancel_1')])
+    assert listener.fileno() is None
+    assert listener.consume() is False
+
+
+def test_not_listening_on_other_databases(connection):
+    connection.vendor = 'sqlite'
+    listener = PGListener('awx_cancel_1')
+    assert listener.fileno() is None
+    assert listener.consume() is False
+    connection.cursor.assert_not_called()
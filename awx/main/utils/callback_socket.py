@@ -0,0 +1,149 @@
+# Copyright (c) 2018 Ansible by Red Hat
+# All Rights Reserved.
+
+# Python
+import errno
+import json
+import logging
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+__all__ = ['CallbackEventReceiver', 'RECORD_HEADER']
+
+logger = logging.getLogger('awx.main.utils.callback_socket')
+
+# Every record is a 4 byte, network order length followed by that many bytes
+# of JSON; see awx.lib.awx_display_callback.events.SocketEventWrite.
+RECORD_HEADER = struct.Struct('!I')
+
+
+class CallbackEventReceiver(object):
+    '''
+    Listen on the Unix socket at `path` for the event data the display
+    callback plugin would otherwise store in memcache, and keep it by event
+    uuid until the event is read from the job's stdout.
+
+    Each ansible process opens its own connection and writes one record per
+    event before it writes the event's uuid to stdout.
+    '''
+
+    def __init__(self, path, wait_timeout=1):
+        self.path = path
+        self.wait_timeout = wait_timeout
+        self.events = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._connections = 0
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._listener.bind(path)
+            os.chmod(path, 0o600)
+            self._listener.listen(16)
+        except Exception:
+            self._listener.close()
+            raise
+        self._thread = threading.Thread(target=self._run, name='callback-event-receiver')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        buffers = {}
+        try:
+            while not self._closed:
+                try:
+                    readable = select.select([self._listener] + list(buffers), [], [], 0.25)[0]
+                except select.error as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+                for sock in readable:
+                    if sock is self._listener:
+                        conn = self._listener.accept()[0]
+                        buffers[conn] = bytearray()
+                        with self._cond:
+                            self._connections += 1
+                        continue
+                    try:
+                        data = sock.recv(65536)
+                    except socket.error:
+                        data = None
+                    if not data:
+                        # a partial record left by a process that died is
+                        # dropped; its event data is read from memcache
+                        sock.close()
+                        del buffers[sock]
+                        with self._cond:
+                            self._connections -= 1
+                            self._cond.notify_all()
+                        continue
+                    buffers[sock].extend(data)
+                    self._read_records(buffers[sock])
+        except Exception:
+            logger.exception('Error receiving callback events on %s', self.path)
+        finally:
+            for sock in buffers:
+                sock.close()
+
+    def _read_records(self, buf):
+        records = []
+        offset = 0
+        while len(buf) - offset >= RECORD_HEADER.size:
+            length = RECORD_HEADER.unpack_from(buf, offset)[0]
+            start = offset + RECORD_HEADER.size
+            if len(buf) < start + length:
+                break
+            try:
+                records.append(json.loads(bytes(buf[start:start + length]).decode('utf-8')))
+            except ValueError:
+                logger.error('Discarding malformed callback event record on %s', self.path)
+            offset = start + length
+        del buf[:offset]
+        if records:
+            with self._cond:
+                for record in records:
+                    if isinstance(record, dict) and 'uuid' in record:
+                        self.events[record['uuid']] = record
+                self._cond.notify_all()
+
+    def _connection_pending(self):
+        try:
+            return bool(select.select([self._listener], [], [], 0)[0])
+        except (select.error, socket.error):
+            return False
+
+    def pop(self, uuid):
+        '''
+        Return the data received for event `uuid`, or None if there is none.
+
+        The record is sent before the uuid is written to stdout, but may not
+        have been read off the socket yet; wait up to `wait_timeout` seconds
+        for it as long as a callback plugin is connected.
+        '''
+        deadline = None
+        with self._cond:
+            while uuid not in self.events:
+                if self._closed or not (self._connections or self._connection_pending()):
+                    return None
+                now = time.time()
+                if deadline is None:
+                    deadline = now + self.wait_timeout
+                elif now >= deadline:
+                    return None
+                self._cond.wait(deadline - now)
+            return self.events.pop(uuid)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self.events = {}
+            self._cond.notify_all()
+        self._thread.join(1)
+        self._listener.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
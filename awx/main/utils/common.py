@@ -19,7 +19,6 @@ import tempfile
 import six
 import psutil
 from functools import reduce
-from StringIO import StringIO
 
 from decimal import Decimal
 
@@ -937,17 +936,29 @@ def get_custom_venv_choices():
 class OutputEventFilter(object):
     '''
     File-like object that looks for encoded job events in stdout data.
+
+    Written data is scanned once, as it arrives; stdout and a partially
+    written event are kept between writes.
     '''
 
-    EVENT_DATA_RE = re.compile(r'\x1b\[K((?:[A-Za-z0-9+/=]+\x1b\[\d+D)+)\x1b\[K')
+    EVENT_TOKEN = '\x1b[K'
+    EVENT_CHUNKS_RE = re.compile(r'(?:[A-Za-z0-9+/=]+\x1b\[\d+D)+')
+    EVENT_PARTIAL_CHUNK_RE = re.compile(r'[A-Za-z0-9+/=]*(?:\x1b(?:\[\d*)?)?\Z')
+    # The display callback writes event data in chunks of 78 characters;
+    # anything much longer between escape sequences is not event data.
+    MAX_PARTIAL_CHUNK = 1024
 
     def __init__(self, event_callback):
         self._event_callback = event_callback
         self._event_ct = 0
         self._counter = 1
         self._start_line = 0
-        self._buffer = StringIO()
-        self._last_chunk = ''
+        # Pending stdout, in chunks
+        self._buffer = []
+        # Unscanned data that may continue in the next write
+        self._tail = ''
+        # Chunks of the event being read, or None outside of an event
+        self._event_chunks = None
         self._current_event_data = None
 
     def flush(self):
@@ -958,39 +969,68 @@ class OutputEventFilter(object):
         pass
 
     def write(self, data):
-        self._buffer.write(data)
-
-        # keep a sliding window of the last chunk written so we can detect
-        # event tokens and determine if we need to perform a search of the full
-        # buffer
-        should_search = '\x1b[K' in (self._last_chunk + data)
-        self._last_chunk = data
-
-        # Only bother searching the buffer if we recently saw a start/end
-        # token (\x1b[K)
-        while should_search:
-            value = self._buffer.getvalue()
-            match = self.EVENT_DATA_RE.search(value)
-            if not match:
-                break
-            try:
-                base64_data = re.sub(r'\x1b\[\d+D', '', match.group(1))
-                event_data = json.loads(base64.b64decode(base64_data))
-            except ValueError:
-                event_data = {}
-            self._emit_event(value[:match.start()], event_data)
-            remainder = value[match.end():]
-            self._buffer = StringIO()
-            self._buffer.write(remainder)
-            self._last_chunk = remainder
+        if self._tail:
+            data = self._tail + data
+            self._tail = ''
+        pos = 0
+        end = len(data)
+        while pos < end:
+            if self._event_chunks is None:
+                start = data.find(self.EVENT_TOKEN, pos)
+                if start == -1:
+                    # hold back the beginning of a start token
+                    if '\x1b' in data[-2:]:
+                        for prefix in ('\x1b[', '\x1b'):
+                            if data.endswith(prefix):
+                                self._tail = prefix
+                                end -= len(prefix)
+                                break
+                    self._buffer.append(data[pos:end])
+                    return
+                self._buffer.append(data[pos:start])
+                self._event_chunks = []
+                pos = start + len(self.EVENT_TOKEN)
+                continue
+            match = self.EVENT_CHUNKS_RE.match(data, pos)
+            if match:
+                self._event_chunks.append(match.group())
+                pos = match.end()
+            if self._event_chunks and data.startswith(self.EVENT_TOKEN, pos):
+                self._emit_encoded_event()
+                pos += len(self.EVENT_TOKEN)
+            elif end - pos <= self.MAX_PARTIAL_CHUNK and self.EVENT_PARTIAL_CHUNK_RE.match(data, pos):
+                self._tail = data[pos:]
+                return
+            else:
+                # not an event after all; scan the rest for the next one
+                self._buffer.append(self.EVENT_TOKEN)
+                self._buffer.extend(self._event_chunks)
+                self._event_chunks = None
 
     def close(self):
-        value = self._buffer.getvalue()
+        if self._event_chunks is not None:
+            self._buffer.append(self.EVENT_TOKEN)
+            self._buffer.extend(self._event_chunks)
+            self._event_chunks = None
+        self._buffer.append(self._tail)
+        self._tail = ''
+        value = ''.join(self._buffer)
         if value:
             self._emit_event(value)
-            self._buffer = StringIO()
+            self._buffer = []
         self._event_callback(dict(event='EOF'))
 
+    def _emit_encoded_event(self):
+        try:
+            base64_data = re.sub(r'\x1b\[\d+D', '', ''.join(self._event_chunks))
+            event_data = json.loads(base64.b64decode(base64_data))
+        except (TypeError, ValueError):
+            event_data = {}
+        self._event_chunks = None
+        value = ''.join(self._buffer)
+        self._buffer = []
+        self._emit_event(value, event_data)
+
     def _emit_event(self, buffered_stdout, next_event_data=None):
         next_event_data = next_event_data or {}
         if self._current_event_data:
@@ -1027,12 +1067,12 @@ class OutputVerboseFilter(OutputEventFilter):
     Use for unified job types that do not encode job event data.
     '''
     def write(self, data):
-        self._buffer.write(data)
+        self._buffer.append(data)
 
         # if the current chunk contains a line break
         if data and '\n' in data:
             # emit events for all complete lines we know about
-            lines = self._buffer.getvalue().splitlines(True)  # keep ends
+            lines = ''.join(self._buffer).splitlines(True)  # keep ends
             remainder = None
             # if last line is not a complete line, then exclude it
             if '\n' not in lines[-1]:
@@ -1040,10 +1080,10 @@ class OutputVerboseFilter(OutputEventFilter):
             # emit all complete lines
             for line in lines:
                 self._emit_event(line)
-            self._buffer = StringIO()
+            self._buffer = []
             # put final partial line back on buffer
             if remainder:
-                self._buffer.write(remainder)
+                self._buffer.append(remainder)
 
 
 def is_ansible_variable(key):
@@ -1,3 +1,6 @@
+import datetime
+import numbers
+import operator
 import re
 from functools import reduce
 from pyparsing import (
@@ -14,11 +17,14 @@ import six
 
 from django.apps import apps
 from django.db import models
+from django.db.models.query import QuerySet
 from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 from awx.main.utils.common import get_search_fields
 
-__all__ = ['SmartFilter', 'ExternalLoggerEnabled']
+__all__ = ['SmartFilter', 'CompiledSmartFilter', 'UnsupportedLookup', 'ExternalLoggerEnabled']
 
 
 class FieldFromSettings(object):
@@ -131,6 +137,173 @@ def get_model(name):
     return apps.get_model('main', name)
 
 
+class UnsupportedLookup(Exception):
+    pass
+
+
+def _text(value):
+    return value if isinstance(value, six.text_type) else six.text_type(value)
+
+
+def _exact(value, expected):
+    if expected is None or value is None:
+        return value is expected
+    if isinstance(value, models.Model) and not isinstance(expected, models.Model):
+        value = value.pk
+    if isinstance(value, bool) and isinstance(expected, six.string_types):
+        return value == (expected.lower() in ('t', 'true', '1'))
+    return value == expected or _text(value) == _text(expected)
+
+
+def _json_contains(value, expected):
+    '''
+    Mimic PostgreSQL JSONB containment (`value @> expected`).
+    '''
+    if isinstance(expected, dict):
+        return isinstance(value, dict) and all(
+            k in value and _json_contains(value[k], v) for k, v in expected.items()
+        )
+    if isinstance(expected, list):
+        return isinstance(value, list) and all(
+            any(_json_contains(item, v) for item in value) for v in expected
+        )
+    return value == expected
+
+
+def _comparable(value, expected):
+    '''
+    Convert `expected` to the type of `value` the way the database would
+    compare them, or raise UnsupportedLookup if there is no such conversion.
+    '''
+    if isinstance(value, six.string_types):
+        return _text(expected)
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        if isinstance(expected, numbers.Number) and not isinstance(expected, bool):
+            return expected
+    elif isinstance(value, datetime.datetime):
+        parsed = parse_datetime(_text(expected))
+        if parsed is None:
+            parsed_date = parse_date(_text(expected))
+            if parsed_date is not None:
+                parsed = datetime.datetime.combine(parsed_date, datetime.time())
+        if parsed is not None:
+            if timezone.is_aware(value) and timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed, timezone.get_default_timezone())
+            return parsed
+    elif isinstance(value, datetime.date):
+        parsed = parse_date(_text(expected))
+        if parsed is not None:
+            return parsed
+    elif type(value) is type(expected):
+        return expected
+    raise UnsupportedLookup('cannot compare {!r} to {!r}'.format(value, expected))
+
+
+def _ordering(op):
+    def compare(value, expected):
+        if value is None:
+            return False
+        try:
+            return op(value, _comparable(value, expected))
+        except (TypeError, ValueError):
+            raise UnsupportedLookup('cannot compare {!r} to {!r}'.format(value, expected))
+    return compare
+
+
+SMART_FILTER_LOOKUPS = {
+    'exact': _exact,
+    'iexact': lambda value, expected: value is not None and _text(value).lower() == _text(expected).lower(),
+    'contains': lambda value, expected: value is not None and _text(expected) in _text(value),
+    'icontains': lambda value, expected: value is not None and _text(expected).lower() in _text(value).lower(),
+    'startswith': lambda value, expected: value is not None and _text(value).startswith(_text(expected)),
+    'istartswith': lambda value, expected: value is not None and _text(value).lower().startswith(_text(expected).lower()),
+    'endswith': lambda value, expected: value is not None and _text(value).endswith(_text(expected)),
+    'iendswith': lambda value, expected: value is not None and _text(value).lower().endswith(_text(expected).lower()),
+    'gt': _ordering(operator.gt),
+    'gte': _ordering(operator.ge),
+    'lt': _ordering(operator.lt),
+    'lte': _ordering(operator.le),
+}
+
+
+def _related_values(obj, path):
+    '''
+    Follow a Django lookup path (without its lookup type) from a Host, or a
+    dict standing in for one, and return every value it reaches.  Related
+    managers are read with .all(), so prefetched relations need no query.
+    '''
+    values = [obj]
+    for name in path:
+        next_values = []
+        for value in values:
+            if value is None:
+                continue
+            if isinstance(value, dict):
+                if name not in value:
+                    raise UnsupportedLookup(name)
+                value = value[name]
+            else:
+                try:
+                    value = getattr(value, name)
+                except AttributeError:
+                    raise UnsupportedLookup(name)
+            if hasattr(value, 'all') and callable(value.all):
+                next_values.extend(value.all())
+            elif isinstance(value, (list, tuple, set)):
+                next_values.extend(value)
+            else:
+                next_values.append(value)
+        values = next_values
+    return values
+
+
+def _lookup_predicate(key, expected):
+    '''
+    Return a function testing an object against a single `key=expected`
+    Django filter, e.g. `groups__name__icontains=web`.
+    '''
+    path = key.split('__')
+    lookup = 'exact'
+    if path == [SmartFilter.SEARCHABLE_RELATIONSHIP, 'contains']:
+        path.pop()
+        return lambda obj: any(_json_contains(v, expected) for v in _related_values(obj, path))
+    if len(path) > 1 and path[-1] == 'isnull':
+        path.pop()
+        if expected:
+            # the (outer) join yields NULL for a missing related row too
+            return lambda obj: any(v is None for v in _related_values(obj, path) or [None])
+        return lambda obj: any(v is not None for v in _related_values(obj, path))
+    if len(path) > 1 and path[-1] in SMART_FILTER_LOOKUPS:
+        lookup = path.pop()
+    compare = SMART_FILTER_LOOKUPS[lookup]
+    if lookup == 'exact' and expected is None:
+        return lambda obj: not [v for v in _related_values(obj, path) if v is not None]
+    return lambda obj: any(compare(v, expected) for v in _related_values(obj, path))
+
+
+class CompiledSmartFilter(object):
+    '''
+    The result of parsing a host_filter: the Host queryset it selects and a
+    predicate testing a Host (or a dict of host fields) against it without a
+    database query.  The predicate raises UnsupportedLookup for fields it
+    cannot find on the object it is given.
+    '''
+
+    def __init__(self, query, predicate):
+        self._query = query
+        self.predicate = predicate
+
+    @property
+    def query(self):
+        # Hand out a fresh queryset so callers never share a result cache.
+        if isinstance(self._query, QuerySet):
+            return self._query.all()
+        return self._query
+
+    def matches(self, obj):
+        return self.predicate(obj)
+
+
 class SmartFilter(object):
     SEARCHABLE_RELATIONSHIP = 'ansible_facts'
 
@@ -146,9 +319,12 @@ class SmartFilter(object):
                 kwargs.update(search_kwargs)
                 q = reduce(lambda x, y: x | y, [models.Q(**{u'%s__contains' % _k:_v}) for _k, _v in kwargs.items()])
                 self.result = Host.objects.filter(q)
+                predicates = [_lookup_predicate(u'%s__contains' % _k, _v) for _k, _v in kwargs.items()]
+                self.predicate = lambda obj: any(p(obj) for p in predicates)
             else:
                 kwargs[k] = v
                 self.result = Host.objects.filter(**kwargs)
+                self.predicate = _lookup_predicate(k, v)
 
         def strip_quotes_traditional_logic(self, v):
             if type(v) is six.text_type and v.startswith('"') and v.endswith('"'):
@@ -275,27 +451,59 @@ class SmartFilter(object):
     class BoolBinOp(object):
         def __init__(self, t):
             self.result = None
+            operands = t[0][0::2]
             i = 2
             while i < len(t[0]):
-                if not self.result:
+                if self.result is None:
                     self.result = t[0][0].result
                 right = t[0][i].result
                 self.result = self.execute_logic(self.result, right)
                 i += 2
+            predicates = [operand.predicate for operand in operands]
+            self.predicate = self.combine_predicates(predicates)
 
 
     class BoolAnd(BoolBinOp):
         def execute_logic(self, left, right):
             return left & right
 
+        def combine_predicates(self, predicates):
+            return lambda obj: all(p(obj) for p in predicates)
+
 
     class BoolOr(BoolBinOp):
         def execute_logic(self, left, right):
             return left | right
 
+        def combine_predicates(self, predicates):
+            return lambda obj: any(p(obj) for p in predicates)
+
+    # Compiled filters by (Host model, filter string).
+    _compiled = {}
+    COMPILED_CACHE_SIZE = 1024
+
+    @classmethod
+    def compile(cls, filter_string):
+        '''
+        Return the CompiledSmartFilter for filter_string, parsing it only the
+        first time it is seen by this process.
+        '''
+        key = (get_model('host'), six.text_type(filter_string))
+        compiled = cls._compiled.get(key)
+        if compiled is None:
+            compiled = cls._parse(filter_string)
+            if len(cls._compiled) >= cls.COMPILED_CACHE_SIZE:
+                cls._compiled.clear()
+            cls._compiled[key] = compiled
+        return compiled
 
     @classmethod
     def query_from_string(cls, filter_string):
+        return cls.compile(filter_string).query
+
+
+    @classmethod
+    def _parse(cls, filter_string):
 
         '''
         TODO:
@@ -327,6 +535,6 @@ class SmartFilter(object):
             raise RuntimeError(u"Invalid query %s" % filter_string_raw)
 
         if len(res) > 0:
-            return res[0].result
+            return CompiledSmartFilter(res[0].result, res[0].predicate)
 
         raise RuntimeError("Parsing the filter_string %s went terribly wrong" % filter_string)
@@ -4,7 +4,10 @@
 # Python
 import logging
 import json
+import os
+import Queue
 import requests
+import threading
 import time
 import urlparse
 import socket
@@ -24,7 +27,7 @@ from awx.main.utils.formatters import LogstashFormatter
 
 
 __all__ = ['BaseHTTPSHandler', 'TCPHandler', 'UDPHandler',
-           'AWXProxyHandler']
+           'BatchingHandler', 'AWXProxyHandler']
 
 
 logger = logging.getLogger('awx.main.utils.handlers')
@@ -45,10 +48,22 @@ PARAM_NAMES = {
 }
 
 
+# Message types whose HTTP endpoints accept several newline-delimited
+# records in one request
+BULK_MESSAGE_TYPES = ('splunk',)
+
+
 def unused_callback(sess, resp):
     pass
 
 
+def _delivered(future):
+    try:
+        return future.result().ok
+    except Exception:
+        return False
+
+
 class LoggingConnectivityException(Exception):
     pass
 
@@ -104,10 +119,20 @@ class BaseHandler(logging.Handler):
         """
         return payload
 
-    def _format_and_send_record(self, record):
+    def _send_batch(self, payloads):
+        """Send several messages to log aggregator, waiting for the
+        result. Returns the number of messages that were not delivered.
+        """
+        futures = [self._send(payload) for payload in payloads]
+        return sum(1 for future in futures if not _delivered(future))
+
+    def format_payload(self, record):
         if self.indv_facts:
-            return [self._send(json.loads(self.format(record)))]
-        return [self._send(self.format(record))]
+            return json.loads(self.format(record))
+        return self.format(record)
+
+    def _format_and_send_record(self, record):
+        return [self._send(self.format_payload(record))]
 
     def emit(self, record):
         """
@@ -181,22 +206,25 @@ class BaseHTTPSHandler(BaseHandler):
         ))
         self._add_auth_information()
 
-    def _get_post_kwargs(self, payload_input):
+    def _get_post_data(self, payload_input):
         if self.message_type == 'splunk':
             # Splunk needs data nested under key "event"
             if not isinstance(payload_input, dict):
                 payload_input = json.loads(payload_input)
             payload_input = {'event': payload_input}
         if isinstance(payload_input, dict):
-            payload_str = json.dumps(payload_input)
-        else:
-            payload_str = payload_input
-        kwargs = dict(data=payload_str, background_callback=unused_callback,
+            return json.dumps(payload_input)
+        return payload_input
+
+    def _get_request_kwargs(self, data):
+        kwargs = dict(data=data, background_callback=unused_callback,
                       timeout=self.tcp_timeout)
         if self.verify_cert is False:
             kwargs['verify'] = False
         return kwargs
 
+    def _get_post_kwargs(self, payload_input):
+        return self._get_request_kwargs(self._get_post_data(payload_input))
 
     def _send(self, payload):
         """See:
@@ -206,6 +234,16 @@ class BaseHTTPSHandler(BaseHandler):
         return self.session.post(self._get_host(scheme='http'),
                                  **self._get_post_kwargs(payload))
 
+    def _send_batch(self, payloads):
+        if self.message_type not in BULK_MESSAGE_TYPES:
+            # Each record goes in its own request, over the kept-alive
+            # connections of the session
+            return super(BaseHTTPSHandler, self)._send_batch(payloads)
+        data = '\n'.join(self._get_post_data(payload) for payload in payloads)
+        future = self.session.post(self._get_host(scheme='http'),
+                                   **self._get_request_kwargs(data))
+        return 0 if _delivered(future) else len(payloads)
+
 
 def _encode_payload_for_socket(payload):
     encoded_payload = payload
@@ -219,8 +257,44 @@ def _encode_payload_for_socket(payload):
 class TCPHandler(BaseHandler):
     def __init__(self, tcp_timeout=5, **kwargs):
         self.tcp_timeout = tcp_timeout
+        self._socket = None
         super(TCPHandler, self).__init__(**kwargs)
 
+    def _close_socket(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except socket.error:
+                pass
+            self._socket = None
+
+    def _send_batch(self, payloads):
+        """Write newline-delimited messages to a connection that is kept
+        open between batches.
+        """
+        data = b''.join(_encode_payload_for_socket(payload) + b'\n' for payload in payloads)
+        for attempt in range(2):
+            reused = self._socket is not None
+            try:
+                if not reused:
+                    self._socket = socket.create_connection(
+                        (self._get_host(hostname_only=True), self.port or 0),
+                        timeout=float(self.tcp_timeout)
+                    )
+                self._socket.sendall(data)
+                return 0
+            except (socket.error, IOError):
+                self._close_socket()
+                # The aggregator may have dropped an idle connection, so
+                # retry once on a new one.
+                if not reused:
+                    break
+        return len(payloads)
+
+    def close(self):
+        self._close_socket()
+        super(TCPHandler, self).close()
+
     def _send(self, payload):
         payload = _encode_payload_for_socket(payload)
         sok = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -257,6 +331,135 @@ class UDPHandler(BaseHandler):
         return SocketResult(True, reason=self.message)
 
 
+_STOP = object()
+
+
+class BatchingHandler(logging.Handler):
+    '''
+    Formats records with `handler` and sends them from a background thread,
+    in batches of up to `batch_size` records at least every `flush_interval`
+    seconds.
+
+    emit never waits for the log aggregator: once `max_queue_size` records
+    are waiting to be sent, further records are dropped. The number of
+    records sent, dropped and failed to be delivered are kept in `sent`,
+    `dropped` and `failed`.
+    '''
+
+    last_log_emit = 0
+
+    def __init__(self, handler, max_queue_size=10000, batch_size=100, flush_interval=1):
+        super(BatchingHandler, self).__init__()
+        self.handler = handler
+        self.max_queue_size = max_queue_size
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._stopping = None
+        self._thread = None
+
+    def _start(self):
+        with self._lock:
+            # A forked process does not inherit the thread of its parent.
+            if self._pid == os.getpid():
+                return
+            self._queue = Queue.Queue(self.max_queue_size)
+            self._stopping = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._queue, self._stopping),
+                                            name='external log handler')
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _log_periodically(self, msg, *args):
+        now = time.time()
+        if now - self.last_log_emit > 10:
+            self.last_log_emit = now
+            logger.warning(msg, *args)
+
+    def _send_batch(self, batch):
+        try:
+            failed = self.handler._send_batch(batch)
+        except Exception:
+            logger.exception('failed to emit logs to external aggregator')
+            failed = len(batch)
+        self.sent += len(batch) - failed
+        self.failed += failed
+        if failed:
+            self._log_periodically('failed to emit %d of %d logs to external aggregator, %d failed so far',
+                                   failed, len(batch), self.failed)
+
+    def _run(self, queue, stopping):
+        while True:
+            # After stop is requested, send what is left without waiting.
+            try:
+                payload = queue.get(not stopping.is_set())
+            except Queue.Empty:
+                break
+            batch = []
+            deadline = time.time() + self.flush_interval
+            while payload is not _STOP:
+                batch.append(payload)
+                timeout = deadline - time.time()
+                if len(batch) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    payload = queue.get(not stopping.is_set(), timeout)
+                except Queue.Empty:
+                    break
+            if batch:
+                self._send_batch(batch)
+        self.handler.close()
+
+    def emit(self, record):
+        try:
+            # Records are formatted right away, as the objects they refer
+            # to may change before they would be sent.
+            payload = self.handler.format_payload(record)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(record)
+            return
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(payload)
+        except Queue.Full:
+            with self._lock:
+                self.dropped += 1
+            self._log_periodically('external log aggregator queue is full, %d logs dropped so far',
+                                   self.dropped)
+
+    def stop(self, timeout=None):
+        """Send the records that are left and close the handler, waiting
+        up to `timeout` seconds for that to finish.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = None
+                self.handler.close()
+                return
+            self._pid = None
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(_STOP)
+        except Queue.Full:
+            # The thread is busy and will see the stop event.
+            pass
+        if timeout:
+            self._thread.join(timeout)
+
+    def close(self):
+        self.stop(timeout=self.flush_interval + 5)
+        super(BatchingHandler, self).close()
+
+
 HANDLER_MAPPING = {
     'https': BaseHTTPSHandler,
     'tcp': TCPHandler,
@@ -282,6 +485,7 @@ class AWXProxyHandler(logging.Handler):
         # TODO: process 'level' kwarg
         super(AWXProxyHandler, self).__init__(**kwargs)
         self._handler = None
+        self._batching_handler = None
         self._old_kwargs = {}
 
     def get_handler_class(self, protocol):
@@ -313,9 +517,26 @@ class AWXProxyHandler(logging.Handler):
             self._handler.setFormatter(self.formatter)
         return self._handler
 
-    def emit(self, record):
+    def get_batching_handler(self):
         actual_handler = self.get_handler()
-        return actual_handler.emit(record)
+        if self._batching_handler is None or self._batching_handler.handler is not actual_handler:
+            if self._batching_handler:
+                self._batching_handler.stop()
+            self._batching_handler = BatchingHandler(
+                actual_handler,
+                max_queue_size=getattr(settings, 'LOG_AGGREGATOR_MAX_QUEUE_SIZE', 10000),
+                batch_size=getattr(settings, 'LOG_AGGREGATOR_BATCH_SIZE', 100),
+                flush_interval=getattr(settings, 'LOG_AGGREGATOR_FLUSH_INTERVAL', 1),
+            )
+        return self._batching_handler
+
+    def emit(self, record):
+        self.get_batching_handler().emit(record)
+
+    def close(self):
+        if self._batching_handler:
+            self._batching_handler.close()
+        super(AWXProxyHandler, self).close()
 
     def perform_test(self, custom_settings):
         """
@@ -0,0 +1,145 @@
+# Copyright (c) 2018 Ansible by Red Hat
+# All Rights Reserved.
+
+# Python
+import errno
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+
+# Django
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.utils.timezone import now
+
+__all__ = ['bump_script_data_version', 'get_script_data_version', 'open_script_data']
+
+logger = logging.getLogger('awx.main.utils.inventory_script')
+
+
+class _ScriptDataVersionBumps(object):
+    '''
+    on_commit callback bumping the script data version of every inventory
+    changed in the committed transaction, once each.
+    '''
+
+    def __init__(self):
+        self.inventory_ids = set()
+        self.position = None
+
+    def is_pending(self):
+        # commits, rollbacks and savepoint rollbacks run or drop the
+        # callbacks registered so far
+        callbacks = connection.run_on_commit
+        return self.position < len(callbacks) and callbacks[self.position][1] is self
+
+    def __call__(self):
+        Inventory = apps.get_model('main', 'Inventory')
+        Inventory.objects.filter(pk__in=self.inventory_ids).update(modified=now())
+
+
+def bump_script_data_version(inventory_id):
+    '''
+    Mark the script data of an inventory as changed.
+
+    The modified time of the inventory row is the version. In a transaction
+    the inventories are only collected, and each of them is bumped once
+    with a single UPDATE after the commit, so that a burst of host and group
+    changes neither rewrites nor locks the inventory row for every one of
+    them. Readers may see the new data with the old version until then.
+    '''
+    if not connection.in_atomic_block:
+        bumps = _ScriptDataVersionBumps()
+        bumps.inventory_ids.add(inventory_id)
+        bumps()
+        return
+    bumps = getattr(connection, '_script_data_version_bumps', None)
+    if bumps is None or not bumps.is_pending():
+        bumps = _ScriptDataVersionBumps()
+        connection.on_commit(bumps)
+        bumps.position = len(connection.run_on_commit) - 1
+        connection._script_data_version_bumps = bumps
+    bumps.inventory_ids.add(inventory_id)
+
+
+def get_script_data_version(inventory):
+    '''
+    Return a string that changes whenever the script data of `inventory` may
+    have changed, or None if its changes can not be tracked.
+
+    Saves of the inventory and bump_script_data_version() set the modified
+    time of the inventory row; the latter is called for every host, group
+    and membership change, and by inventory imports.
+    '''
+    if inventory.kind == 'smart':
+        # Smart inventory hosts come from other inventories.
+        return None
+    Inventory = apps.get_model('main', 'Inventory')
+    modified = Inventory.objects.filter(pk=inventory.pk).values_list('modified', flat=True).first()
+    if modified is None:
+        return None
+    return hashlib.sha1(repr([inventory.pk, modified])).hexdigest()
+
+
+def _render_script_data(inventory, version, hostvars, towervars, show_all):
+    cache_root = settings.AWX_INVENTORY_SCRIPT_CACHE_ROOT
+    prefix = 'inventory_{}_{:d}{:d}{:d}_'.format(inventory.pk, hostvars, towervars, show_all)
+    filename = '{}{}.json'.format(prefix, version)
+    path = os.path.join(cache_root, filename)
+    if os.path.exists(path):
+        return path
+    try:
+        os.makedirs(cache_root, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    # Concurrent renders of the same inventory wait for the first one and
+    # then use its output.
+    with open(os.path.join(cache_root, prefix + 'lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(path):
+                return path
+            handle, tmp_path = tempfile.mkstemp(dir=cache_root, prefix=prefix, suffix='.tmp')
+            try:
+                with os.fdopen(handle, 'w') as f:
+                    inventory.write_script_data(f, hostvars=hostvars, towervars=towervars, show_all=show_all)
+                os.rename(tmp_path, path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+            logger.debug('Rendered script data of inventory %s to %s', inventory.pk, path)
+            for name in os.listdir(cache_root):
+                if name.startswith(prefix) and name.endswith('.json') and name != filename:
+                    try:
+                        os.remove(os.path.join(cache_root, name))
+                    except OSError:
+                        pass
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return path
+
+
+def open_script_data(inventory, hostvars=False, towervars=False, show_all=False):
+    '''
+    Return a file object reading the JSON encoded script data of
+    `inventory`, rendered once per version of the inventory and shared by
+    all readers, or None if it can not be cached.
+    '''
+    if not getattr(settings, 'AWX_INVENTORY_SCRIPT_CACHE_ROOT', None):
+        return None
+    for attempt in range(3):
+        version = get_script_data_version(inventory)
+        if version is None:
+            return None
+        path = _render_script_data(inventory, version, bool(hostvars), bool(towervars), bool(show_all))
+        try:
+            return open(path, 'r')
+        except IOError as e:
+            # A newer version replaced it in the meantime.
+            if e.errno != errno.ENOENT:
+                raise
+    return None
@@ -3,9 +3,12 @@
 
 # Python
 import re
+import json
 import logging
 from collections import OrderedDict
 
+import six
+
 
 # Logger is used for any data-related messages so that the log level
 # can be adjusted on command invocation
@@ -13,7 +16,7 @@ logger = logging.getLogger('awx.main.commands.inventory_import')
 
 
 __all__ = ['MemHost', 'MemGroup', 'MemInventory',
-           'mem_data_to_dict', 'dict_to_mem_data']
+           'mem_data_to_dict', 'dict_to_mem_data', 'load_inventory_json']
 
 
 ipv6_port_re = re.compile(r'^\[([A-Fa-f0-9:]{3,})\]:(\d+?)$')
@@ -27,6 +30,8 @@ class MemObject(object):
     Common code shared between in-memory groups and hosts.
     '''
 
+    __slots__ = ('name',)
+
     def __init__(self, name):
         assert name, 'no name'
         self.name = name
@@ -37,6 +42,8 @@ class MemGroup(MemObject):
     In-memory representation of an inventory group.
     '''
 
+    __slots__ = ('children', 'hosts', 'variables', 'parents', 'all_hosts', 'all_groups')
+
     def __init__(self, name):
         super(MemGroup, self).__init__(name)
         self.children = []
@@ -47,7 +54,6 @@ class MemGroup(MemObject):
         # maps host and group names to hosts to prevent redudant additions
         self.all_hosts = {}
         self.all_groups = {}
-        self.variables = {}
         logger.debug('Loaded group: %s', self.name)
 
     def __repr__(self):
@@ -89,11 +95,12 @@ class MemHost(MemObject):
     In-memory representation of an inventory host.
     '''
 
+    __slots__ = ('variables', 'instance_id')
+
     def __init__(self, name, port=None):
         super(MemHost, self).__init__(name)
         self.variables = {}
         self.instance_id = None
-        self.name = name
         if port:
             # was `ansible_ssh_port` in older Ansible versions
             self.variables['ansible_port'] = port
@@ -303,13 +310,162 @@ def dict_to_mem_data(data, inventory=None):
             inventory.all_group.add_child_group(group)
 
     if _meta:
+        hostvars = _meta.get('hostvars', {})
         for k,v in inventory.all_group.all_hosts.iteritems():
-            meta_hostvars = _meta['hostvars'].get(k, {})
+            meta_hostvars = hostvars.pop(k, {})
             if isinstance(meta_hostvars, dict):
-                v.variables.update(meta_hostvars)
+                # Use the loaded dict as is rather than copying it.
+                if v.variables:
+                    v.variables.update(meta_hostvars)
+                else:
+                    v.variables = meta_hostvars
             else:
                 logger.warning('Expected dict of vars for '
                                'host "%s", got %s instead',
                                k, str(type(meta_hostvars)))
 
     return inventory
+
+
+# Streaming JSON decoding
+
+json_whitespace_re = re.compile(r'[ \t\n\r]*')
+
+
+class JSONObjectReader(object):
+    '''
+    Decodes a JSON document read from a file object one value at a time, so
+    that only the raw text of the value being decoded is held in memory.
+    '''
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, f, chunk_size=64 * 1024):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+
+    def _fill(self):
+        '''
+        Read more data into the buffer, at least doubling the unconsumed
+        part of it, and return False at the end of the file.
+        '''
+        chunk = self.f.read(max(self.chunk_size, len(self.buf) - self.pos))
+        if not chunk:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        '''
+        Return the next non-whitespace character without consuming it, or
+        an empty string at the end of the file.
+        '''
+        while True:
+            self.pos = json_whitespace_re.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError('Expected "{}" but found "{}" in JSON'.format(char, found))
+        self.pos += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self._fill():
+                    continue
+                raise
+            # A number may continue in the data not read yet.
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def iter_keys(self):
+        '''
+        Consume a JSON object, yielding its keys.  The value of each key must
+        be consumed before the next one is requested.
+        '''
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise ValueError('Expected object key in JSON')
+            key = self.read_value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect('}')
+                return
+
+    def end(self):
+        if self.peek():
+            raise ValueError('Extra data after JSON document')
+
+
+def _intern_names(names, value):
+    if isinstance(value, six.string_types):
+        return names.setdefault(value, value)
+    return value
+
+
+def _intern_group_names(names, group_data):
+    '''
+    Make the host and child group names of `group_data` share one string
+    object per name.
+    '''
+    if isinstance(group_data, (list, tuple)):
+        return [_intern_names(names, h) for h in group_data]
+    if isinstance(group_data, dict):
+        hosts = group_data.get('hosts')
+        if isinstance(hosts, dict):
+            group_data['hosts'] = dict((_intern_names(names, k), v) for k, v in hosts.iteritems())
+        elif isinstance(hosts, (list, tuple)):
+            group_data['hosts'] = [_intern_names(names, h) for h in hosts]
+        children = group_data.get('children')
+        if isinstance(children, (list, tuple)):
+            group_data['children'] = [_intern_names(names, c) for c in children]
+    return group_data
+
+
+def load_inventory_json(f, chunk_size=64 * 1024):
+    '''
+    Decode the JSON inventory read from file object `f`, as json.load would.
+
+    The hostvars in `_meta` are decoded one host at a time and every group
+    and host name is stored once, so memory use grows with the size of the
+    decoded inventory rather than with the size of the raw JSON.
+    '''
+    reader = JSONObjectReader(f, chunk_size=chunk_size)
+    if reader.peek() != '{':
+        data = reader.read_value()
+        reader.end()
+        return data
+    names = {}
+    data = {}
+    for key in reader.iter_keys():
+        if key == '_meta' and reader.peek() == '{':
+            meta = data['_meta'] = {}
+            for meta_key in reader.iter_keys():
+                if meta_key == 'hostvars' and reader.peek() == '{':
+                    hostvars = meta['hostvars'] = {}
+                    for host_name in reader.iter_keys():
+                        hostvars[_intern_names(names, host_name)] = reader.read_value()
+                else:
+                    meta[meta_key] = reader.read_value()
+        else:
+            data[_intern_names(names, key)] = _intern_group_names(names, reader.read_value())
+    reader.end()
+    return data
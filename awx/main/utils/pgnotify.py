@@ -0,0 +1,76 @@
+# Copyright (c) 2018 Ansible by Red Hat
+# All Rights Reserved.
+
+import logging
+
+from django.db import connection, DatabaseError
+
+__all__ = ['pg_notify', 'PGListener']
+
+logger = logging.getLogger('awx.main.utils.pgnotify')
+
+
+def pg_notify(channel, payload=''):
+    '''
+    Send a Postgres notification on `channel`; it is delivered to listeners
+    when the current transaction commits.  A no-op on other databases.
+    '''
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [channel, payload])
+
+
+class PGListener(object):
+    '''
+    LISTEN for notifications on `channel` on this thread's database
+    connection.
+
+    `fileno()` is the file descriptor that becomes readable when a
+    notification arrives (None when not listening, e.g., on other databases)
+    and `consume()` reads the pending notifications, returning True if any
+    were for `channel`.  Listening stops if Django replaces the connection.
+    '''
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.conn = None
+        if connection.vendor != 'postgresql':
+            return
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('LISTEN "{}"'.format(channel))
+            self.conn = connection.connection
+        except DatabaseError:
+            logger.exception('Could not listen for notifications on %s', channel)
+
+    @property
+    def listening(self):
+        if self.conn is not None and connection.connection is not self.conn:
+            # the LISTEN ended with the connection it was issued on
+            self.conn = None
+        return self.conn is not None
+
+    def fileno(self):
+        return self.conn.fileno() if self.listening else None
+
+    def consume(self):
+        if not self.listening:
+            return False
+        try:
+            self.conn.poll()
+        except Exception:
+            self.conn = None
+            return False
+        notified = any(n.channel == self.channel for n in self.conn.notifies)
+        del self.conn.notifies[:]
+        return notified
+
+    def close(self):
+        if self.listening:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('UNLISTEN "{}"'.format(self.channel))
+            except DatabaseError:
+                pass
+        self.conn = None
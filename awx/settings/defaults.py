@@ -125,6 +125,11 @@ PROJECTS_ROOT = os.path.join(BASE_DIR, 'projects')
 # directory should not be web-accessible
 JOBOUTPUT_ROOT = os.path.join(BASE_DIR, 'job_output')
 
+# Absolute filesystem path to the directory caching the rendered script data
+# of inventories (default for development and tests, default for production
+# defined in production.py). Set to None to render it on every request.
+AWX_INVENTORY_SCRIPT_CACHE_ROOT = os.path.join(BASE_DIR, 'inventory_cache')
+
 # Absolute filesystem path to the directory to store logs
 LOG_ROOT = os.path.join(BASE_DIR)
 
@@ -192,9 +197,37 @@ LOCAL_STDOUT_EXPIRE_TIME = 2592000
 # events into the database
 JOB_EVENT_WORKERS = 4
 
+# All events for a job are routed to the same worker.  When a new job starts
+# and every worker has at least JOB_EVENT_WORKER_SCALE_UP_DEPTH events queued,
+# another worker is started, up to JOB_EVENT_MAX_WORKERS.  Workers beyond
+# JOB_EVENT_WORKERS are stopped after JOB_EVENT_WORKER_IDLE_TIMEOUT seconds
+# without any assigned jobs.
+JOB_EVENT_MAX_WORKERS = 8
+JOB_EVENT_WORKER_SCALE_UP_DEPTH = 1000
+JOB_EVENT_WORKER_IDLE_TIMEOUT = 60
+
 # The maximum size of the job event worker queue before requests are blocked
 JOB_EVENT_MAX_QUEUE_SIZE = 10000
 
+# Each callback receiver worker buffers events per job and saves them with a
+# single bulk INSERT once this many have accumulated, or once the oldest
+# buffered event has waited JOB_EVENT_BUFFER_TIMEOUT seconds.  A buffer size
+# of 1 saves every event individually as it arrives.
+JOB_EVENT_BUFFER_SIZE = 100
+JOB_EVENT_BUFFER_TIMEOUT = 0.5
+
+# Callback receiver workers send each job's websocket event group at most this
+# many frames per second; events saved in between are sent together in one
+# frame.  When more than WEBSOCKET_EVENT_SUMMARY_THRESHOLD events of a group
+# are waiting, the frame carries counters per event type instead of the
+# events.  A frame rate of 0 sends every event in its own frame.
+WEBSOCKET_EVENT_MAX_FRAME_RATE = 10
+WEBSOCKET_EVENT_SUMMARY_THRESHOLD = 1000
+
+# Seconds for which a user's access to a job is remembered when subscribing to
+# its websocket event group.
+WEBSOCKET_ACCESS_CACHE_TIMEOUT = 30
+
 # Disallow sending session cookies over insecure connections
 SESSION_COOKIE_SECURE = True
 
@@ -417,6 +450,19 @@ EMAIL_USE_TLS = False
 # The number of seconds to sleep between status checks for jobs running on isolated nodes
 AWX_ISOLATED_CHECK_INTERVAL = 30
 
+# Check on jobs running on isolated nodes with `awx-expect check` over SSH,
+# fetching only new stdout and event data, instead of running the
+# check_isolated.yml playbook every AWX_ISOLATED_CHECK_INTERVAL.  Checks of
+# the same node share one SSH connection, which is kept open for
+# AWX_ISOLATED_CONTROL_PERSIST seconds after the last check.
+AWX_ISOLATED_CONTROL_SESSION = True
+AWX_ISOLATED_CONTROL_PERSIST = 300
+
+# Canceling a job notifies the task running it through Postgres LISTEN/NOTIFY;
+# while it listens, the task only polls the job's cancel flag this often (in
+# seconds).  Without notifications it polls every PEXPECT_TIMEOUT seconds.
+AWX_CANCEL_POLL_INTERVAL = 30
+
 # The timeout (in seconds) for launching jobs on isolated nodes
 AWX_ISOLATED_LAUNCH_TIMEOUT = 600
 
@@ -520,6 +566,19 @@ CELERYBEAT_SCHEDULE = {
 }
 AWX_INCONSISTENT_TASK_INTERVAL = 60 * 3
 
+# Running jobs hold a lease in the database that the worker running them
+# renews every AWX_TASK_LEASE_RENEW_INTERVAL seconds; the task manager reaper
+# fails running jobs whose lease has not been renewed for
+# AWX_TASK_LEASE_TIMEOUT seconds.
+AWX_TASK_LEASE_RENEW_INTERVAL = 30
+AWX_TASK_LEASE_TIMEOUT = 60 * 2
+
+# When enabled, the task manager keeps the active task set in memory between
+# cycles and only reloads the jobs whose status changed since the last cycle.
+# A full rescan still runs every AWX_TASK_MANAGER_FULL_RESCAN_INTERVAL seconds.
+AWX_INCREMENTAL_TASK_MANAGER = False
+AWX_TASK_MANAGER_FULL_RESCAN_INTERVAL = 60 * 5
+
 # Celery queues that will always be listened to by celery workers
 # Note: Broadcast queues have unique, auto-generated names, with the alias
 # property value of the original queue name.
@@ -646,6 +705,11 @@ CAPTURE_JOB_EVENT_HOSTS = False
 # Rebuild Host Smart Inventory memberships.
 AWX_REBUILD_SMART_MEMBERSHIP = False
 
+# Inventory computed fields are recomputed at most once per this many seconds
+# per inventory; changes made while a recompute is pending are picked up by it.
+# Set to 0 to recompute right away on every change.
+AWX_INVENTORY_COMPUTED_FIELDS_DEBOUNCE = 5
+
 # By default, allow arbitrary Jinja templating in extra_vars defined on a Job Template
 ALLOW_JINJA_IN_EXTRA_VARS = 'template'
 
@@ -953,6 +1017,17 @@ INTERNAL_API_URL = 'http://127.0.0.1:%s' % DEVSERVER_DEFAULT_PORT
 PERSISTENT_CALLBACK_MESSAGES = True
 USE_CALLBACK_QUEUE = True
 CALLBACK_QUEUE = "callback_tasks"
+
+# Jobs publish their events to the callback receiver in messages of up to this
+# many events; a partial batch is published CALLBACK_QUEUE_BATCH_TIMEOUT
+# seconds after its first event, or as soon as the job's output ends.  A batch
+# size of 1 publishes every event as its own message.  Messages are compressed
+# with CALLBACK_QUEUE_COMPRESSION (any kombu compression method, e.g. 'zlib' or
+# 'bzip2', or None).
+CALLBACK_QUEUE_BATCH_SIZE = 100
+CALLBACK_QUEUE_BATCH_TIMEOUT = 0.25
+CALLBACK_QUEUE_COMPRESSION = 'zlib'
+
 FACT_QUEUE = "facts"
 
 SCHEDULER_QUEUE = "scheduler"
@@ -983,6 +1058,14 @@ LOG_AGGREGATOR_ENABLED = False
 LOG_AGGREGATOR_TCP_TIMEOUT = 5
 LOG_AGGREGATOR_VERIFY_CERT = True
 LOG_AGGREGATOR_LEVEL = 'INFO'
+# Records for the external logger are sent from a background thread, in
+# batches of up to LOG_AGGREGATOR_BATCH_SIZE records at least every
+# LOG_AGGREGATOR_FLUSH_INTERVAL seconds. Records beyond
+# LOG_AGGREGATOR_MAX_QUEUE_SIZE waiting to be sent are dropped rather than
+# holding up the process logging them.
+LOG_AGGREGATOR_BATCH_SIZE = 100
+LOG_AGGREGATOR_FLUSH_INTERVAL = 1
+LOG_AGGREGATOR_MAX_QUEUE_SIZE = 10000
 
 # The number of retry attempts for websocket session establishment
 # If you're encountering issues establishing websockets in clustered Tower,
@@ -40,6 +40,9 @@ INTERNAL_API_URL = 'http://127.0.0.1:80'
 # This directory should not be web-accessible
 JOBOUTPUT_ROOT = '/var/lib/awx/job_status/'
 
+# Absolute filesystem path to the directory caching rendered inventory scripts
+AWX_INVENTORY_SCRIPT_CACHE_ROOT = '/var/lib/awx/inventory_cache/'
+
 # The heartbeat file for the tower scheduler
 SCHEDULE_METADATA_LOCATION = '/var/lib/awx/.tower_cycle'
 
@@ -1,5 +1,6 @@
 const PAGE_LIMIT = 5;
 const PAGE_SIZE = 50;
+const RANGE_PAGE_SIZE = 200;
 
 const BASE_PARAMS = {
     order_by: 'start_line',
@@ -93,6 +94,29 @@ function JobEventsApiService ($http, $q) {
     this.next = () => this.getPage(this.state.next);
     this.previous = () => this.getPage(this.state.previous);
 
+    this.getRange = (firstCounter, lastCounter) => {
+        const params = {
+            counter__gte: firstCounter,
+            counter__lte: lastCounter,
+            order_by: 'counter',
+            page_size: RANGE_PAGE_SIZE,
+        };
+        const results = [];
+
+        const getRangePage = page => $http.get(this.endpoint, { params: merge(params, { page }) })
+            .then(({ data }) => {
+                results.push(...data.results);
+
+                if (data.next) {
+                    return getRangePage(page + 1);
+                }
+
+                return results;
+            });
+
+        return getRangePage(1);
+    };
+
     this.last = () => {
         const params = merge({}, this.state.params);
 
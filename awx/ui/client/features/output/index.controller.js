@@ -108,6 +108,7 @@ function stopListening () {
 function startListening () {
     stopListening();
     listeners.push($scope.$on(resource.ws.events, (scope, data) => handleJobEvent(data)));
+    listeners.push($scope.$on(resource.ws.summary, (scope, data) => handleJobEventSummary(data)));
     listeners.push($scope.$on(resource.ws.status, (scope, data) => handleStatusEvent(data)));
 }
 
@@ -123,6 +124,21 @@ function handleJobEvent (data) {
     });
 }
 
+function handleJobEventSummary (data) {
+    // The events were sent as counts only; fetch them before handling any
+    // event that arrives after them.
+    const { first_counter: firstCounter, counter: lastCounter } = data.summary;
+
+    streaming = (streaming || attachToRunningJob())
+        .then(() => resource.events.getRange(firstCounter, lastCounter))
+        .then(events => events.forEach(event => {
+            engine.pushJobEvent(event);
+            status.pushJobEvent(event);
+        }))
+        // keep streaming the events that follow
+        .catch(() => $q.resolve());
+}
+
 function attachToRunningJob () {
     if (!status.state.running) {
         return $q.resolve();
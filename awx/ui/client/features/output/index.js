@@ -114,6 +114,7 @@ function resolveResource (
             related,
             ws: {
                 events: `${WS_PREFIX}-${key}-${id}`,
+                summary: `${WS_PREFIX}-${key}-${id}-summary`,
                 status: `${WS_PREFIX}-${name}`,
             },
             page: {
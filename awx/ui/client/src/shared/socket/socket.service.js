@@ -144,7 +144,18 @@ export default
                     // ex: 'ws-jobs'
                     str = `ws-${data.group_name}`;
                 }
-                $rootScope.$broadcast(str, data);
+                if(Array.isArray(data.events)){
+                    // Several events of a job sent in one frame.
+                    data.events.forEach(event => $rootScope.$broadcast(str, event));
+                }
+                else if(data.summary){
+                    // The job emitted events faster than they could be sent,
+                    // only their counts were sent.
+                    $rootScope.$broadcast(`${str}-summary`, data);
+                }
+                else {
+                    $rootScope.$broadcast(str, data);
+                }
             },
             disconnect: function(){
                 if(this.socket){
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# Copyright (c) 2018 Ansible, Inc.
+# All Rights Reserved
+'''
+Publish job events through CallbackQueueDispatcher to an in-memory kombu
+broker and report, per 10k events, how many broker messages were published
+and the CPU time spent publishing them and decoding them again the way the
+callback receiver does.
+
+Each configuration is given as BATCH_SIZE:COMPRESSION (e.g. 1:bzip2, the
+previous behaviour, or 100:zlib; "none" disables compression).  Events are
+read from a file of callback payloads, one JSON object per line (--file), or
+generated (--events events with roughly --event-bytes of event_data each).
+'''
+import json
+import os
+import sys
+import time
+import uuid
+from argparse import ArgumentParser
+
+# Django
+import django
+
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+if base_dir not in sys.path:
+    sys.path.insert(1, base_dir)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "awx.settings.development") # noqa
+django.setup() # noqa
+
+
+from django.test.utils import override_settings # noqa
+from kombu import Connection # noqa
+
+# awx
+from awx.main.queue import CallbackQueueDispatcher, EVENT_BATCH_KEY # noqa
+
+
+BROKER_URL = 'memory://'
+QUEUE = 'callback_queue_dispatcher_benchmark'
+
+
+def generate_events(n_events, event_bytes):
+    res = {'changed': False, 'stdout': 'x' * event_bytes, 'rc': 0}
+    events = []
+    for counter in range(1, n_events + 1):
+        events.append({
+            'job_id': 1,
+            'event': 'runner_on_ok',
+            'uuid': str(uuid.uuid4()),
+            'counter': counter,
+            'stdout': '\x1b[0;32mok: [host-{}]\x1b[0m'.format(counter),
+            'start_line': counter,
+            'end_line': counter + 1,
+            'event_data': {'host': 'host-{}'.format(counter), 'task': 'ping', 'res': res},
+        })
+    events.append({'job_id': 1, 'event': 'EOF'})
+    return events
+
+
+def cpu_time():
+    return sum(os.times()[:2])
+
+
+def run(events, batch_size, compression):
+    with override_settings(BROKER_URL=BROKER_URL, CALLBACK_QUEUE=QUEUE,
+                           CALLBACK_QUEUE_BATCH_SIZE=batch_size,
+                           CALLBACK_QUEUE_COMPRESSION=compression):
+        dispatcher = CallbackQueueDispatcher()
+    with Connection(BROKER_URL) as conn:
+        # declare the queue so the broker keeps what is published to it
+        queue = conn.SimpleQueue(QUEUE)
+        start = cpu_time()
+        for event in events:
+            dispatcher.dispatch(dict(event))
+        dispatcher.flush()
+        publish_cpu = cpu_time() - start
+
+        received = 0
+        start = cpu_time()
+        while True:
+            try:
+                message = queue.get(block=False)
+            except queue.Empty:
+                break
+            body = message.payload
+            received += len(body[EVENT_BATCH_KEY]) if EVENT_BATCH_KEY in body else 1
+            message.ack()
+        decode_cpu = cpu_time() - start
+        queue.close()
+    dispatcher.close_connection()
+    assert received == len(events), 'published {} events, received {}'.format(len(events), received)
+    return dispatcher.messages_published, publish_cpu, decode_cpu
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('configurations', nargs='*', default=['1:bzip2', '100:zlib'],
+                        help='BATCH_SIZE:COMPRESSION pairs to compare')
+    parser.add_argument('--file', help='Callback payloads to publish, one JSON object per line')
+    parser.add_argument('--events', type=int, default=10000, help='Number of events to generate')
+    parser.add_argument('--event-bytes', type=int, default=1024, help='Approximate size of generated event data')
+    options = parser.parse_args()
+
+    if options.file:
+        with open(options.file) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    else:
+        events = generate_events(options.events, options.event_bytes)
+    per_10k = 10000.0 / len(events)
+
+    print('Publishing {} events; figures are per 10k events'.format(len(events)))
+    print('{:<16} {:>10} {:>14} {:>14}'.format('configuration', 'messages', 'publish cpu', 'decode cpu'))
+    for configuration in options.configurations:
+        batch_size, compression = configuration.split(':')
+        started = time.time()
+        messages, publish_cpu, decode_cpu = run(events, int(batch_size),
+                                                None if compression == 'none' else compression)
+        print('{:<16} {:>10.0f} {:>13.3f}s {:>13.3f}s   ({:.1f}s wall)'.format(
+            configuration, messages * per_10k, publish_cpu * per_10k, decode_cpu * per_10k,
+            time.time() - started
+        ))
+
+
+if __name__ == '__main__':
+    main()
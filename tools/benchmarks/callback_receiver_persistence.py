@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# Copyright (c) 2018 Ansible, Inc.
+# All Rights Reserved
+'''
+Replay a recorded job event stream into the database and report how many
+events per second the callback receiver persistence path sustains when
+saving one row at a time versus in batches (JOB_EVENT_BUFFER_SIZE).
+
+The event stream is read either from an existing job (--job-id) or from a
+file of callback payloads, one JSON object per line (--file).  Everything
+written is rolled back when the benchmark finishes.
+'''
+import os
+import sys
+import json
+import time
+from argparse import ArgumentParser
+
+# Django
+import django
+
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+if base_dir not in sys.path:
+    sys.path.insert(1, base_dir)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "awx.settings.development") # noqa
+django.setup() # noqa
+
+
+from django.conf import settings # noqa
+from django.db import transaction # noqa
+
+# awx
+from awx.main.models import Job, JobEvent # noqa
+
+
+EVENT_FIELDS = [
+    'event', 'event_data', 'uuid', 'parent_uuid', 'counter', 'stdout',
+    'start_line', 'end_line', 'verbosity', 'created',
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+def load_events(options):
+    if options.file:
+        with open(options.file) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    job = Job.objects.get(pk=options.job_id)
+    return [
+        dict((k, v.isoformat() if k == 'created' else v) for k, v in event.items())
+        for event in job.job_events.order_by('counter').values(*EVENT_FIELDS)
+    ]
+
+
+def single_row(events, batch_size):
+    for body in events:
+        JobEvent.create_from_data(**body)
+
+
+def batched(events, batch_size):
+    for i in range(0, len(events), batch_size):
+        JobEvent.bulk_create_from_data(events[i:i + batch_size])
+
+
+def replay(recorded, template_job, save, batch_size):
+    try:
+        with transaction.atomic():
+            job = Job.objects.create(
+                name='callback receiver benchmark',
+                inventory_id=template_job.inventory_id if template_job else None,
+            )
+            events = [dict(body, job_id=job.pk) for body in recorded]
+            start = time.time()
+            save(events, batch_size)
+            elapsed = time.time() - start
+            raise Rollback()
+    except Rollback:
+        pass
+    return elapsed
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--job-id', type=int, help='Replay the events recorded for this job')
+    parser.add_argument('--file', help='Replay callback payloads from this file (one JSON object per line)')
+    parser.add_argument('--batch-size', type=int, default=max(settings.JOB_EVENT_BUFFER_SIZE, 2),
+                        help='Events per bulk insert in batched mode')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per mode; the best run is reported')
+    options = parser.parse_args()
+    if not (options.job_id or options.file):
+        parser.error('one of --job-id or --file is required')
+
+    recorded = load_events(options)
+    if not recorded:
+        parser.error('no events to replay')
+    template_job = Job.objects.filter(pk=options.job_id).first() if options.job_id else None
+
+    print('Replaying {} events'.format(len(recorded)))
+    for name, save in (('single-row', single_row), ('batched ({})'.format(options.batch_size), batched)):
+        elapsed = min(replay(recorded, template_job, save, options.batch_size) for i in range(options.repeat))
+        print('{:<16} {:>10.1f} events/sec ({:.3f}s)'.format(name, len(recorded) / elapsed, elapsed))
+
+
+if __name__ == '__main__':
+    main()
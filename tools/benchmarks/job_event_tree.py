@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# Copyright (c) 2018 Ansible, Inc.
+# All Rights Reserved
+'''
+Compare the per-event approach to propagating failed/changed flags and
+host memberships up the job event tree with the set-based one: host links
+written per flushed batch of events, and flags finalized when a job's
+playbook_on_stats event is saved.
+
+A synthetic job (playbook -> plays -> tasks -> one runner event per host)
+is generated with roughly --events events, both approaches are timed
+against it, and everything written is rolled back.
+'''
+import os
+import sys
+import time
+import uuid
+from argparse import ArgumentParser
+
+# Django
+import django
+
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+if base_dir not in sys.path:
+    sys.path.insert(1, base_dir)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "awx.settings.development") # noqa
+django.setup() # noqa
+
+
+from django.conf import settings # noqa
+from django.db import models, transaction # noqa
+from django.utils.timezone import now # noqa
+
+# awx
+from awx.main.models import Inventory, Job, JobEvent, Organization # noqa
+
+
+class Rollback(Exception):
+    pass
+
+
+def generate_job(n_events, n_hosts, n_plays):
+    organization = Organization.objects.create(name='job event tree benchmark')
+    inventory = Inventory.objects.create(name='job event tree benchmark', organization=organization)
+    hostnames = ['host-{}'.format(i) for i in range(n_hosts)]
+    inventory.hosts.model.objects.bulk_create([
+        inventory.hosts.model(name=name, inventory=inventory) for name in hostnames
+    ])
+    job = Job.objects.create(name='job event tree benchmark', inventory=inventory)
+
+    created = now()
+    events = []
+
+    def event(name, parent_uuid, **kwargs):
+        e = JobEvent(job=job, event=name, uuid=str(uuid.uuid4()), parent_uuid=parent_uuid,
+                     counter=len(events), created=created, modified=created, **kwargs)
+        events.append(e)
+        return e.uuid
+
+    playbook = event('playbook_on_start', '')
+    n_tasks = max(1, n_events // (n_hosts + 1))
+    for p in range(n_plays):
+        play = event('playbook_on_play_start', playbook)
+        for t in range(n_tasks // n_plays):
+            task = event('playbook_on_task_start', play)
+            for i, hostname in enumerate(hostnames):
+                failed = (t + i) % 97 == 0
+                event('runner_on_failed' if failed else 'runner_on_ok', task, host_name=hostname,
+                      failed=failed, changed=(t + i) % 3 == 0)
+    stats = event('playbook_on_stats', playbook, event_data={'ok': dict((h, 1) for h in hostnames)})
+    JobEvent.objects.bulk_create(events, batch_size=1000)
+    return job, JobEvent.objects.get(job=job, uuid=stats)
+
+
+def per_event(job, stats_event):
+    # The approach used before the set-based finalization: one UPDATE pair
+    # for the parents, then a host link walk up the tree for every event.
+    runner_events = JobEvent.objects.filter(job=job, event__startswith='runner_on')
+    changed_events = runner_events.filter(changed=True)
+    failed_events = runner_events.filter(failed=True)
+    JobEvent.objects.filter(uuid__in=changed_events.values_list('parent_uuid', flat=True)).update(changed=True)
+    JobEvent.objects.filter(uuid__in=failed_events.values_list('parent_uuid', flat=True)).update(failed=True)
+
+    def update_hosts(event, extra_host_pks=None):
+        hostnames = set([event.host_name]) if event.host_name else set()
+        if event.event == 'playbook_on_stats':
+            hostnames.update(event._hostnames())
+        qs = job.inventory.hosts.filter(models.Q(name__in=hostnames) | models.Q(pk__in=set(extra_host_pks or [])))
+        qs = qs.exclude(job_events__pk=event.id).only('id')
+        for host in qs:
+            event.hosts.add(host)
+        if event.parent_uuid:
+            parent = JobEvent.objects.filter(uuid=event.parent_uuid)
+            if parent.exists():
+                update_hosts(parent[0], qs.values_list('id', flat=True))
+
+    for event in JobEvent.objects.filter(job=job).order_by('counter').iterator():
+        update_hosts(event)
+
+
+def set_based(job, stats_event):
+    events = list(JobEvent.objects.filter(job=job).order_by('counter'))
+    for i in range(0, len(events), settings.JOB_EVENT_BUFFER_SIZE):
+        JobEvent._bulk_update_hosts(events[i:i + settings.JOB_EVENT_BUFFER_SIZE])
+    stats_event._update_event_tree()
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=100000, help='Approximate number of events in the job')
+    parser.add_argument('--hosts', type=int, default=100, help='Number of hosts in the inventory')
+    parser.add_argument('--plays', type=int, default=5, help='Number of plays in the playbook')
+    options = parser.parse_args()
+    settings.CAPTURE_JOB_EVENT_HOSTS = True
+
+    for name, finalize in (('per-event', per_event), ('set-based', set_based)):
+        try:
+            with transaction.atomic():
+                job, stats_event = generate_job(options.events, options.hosts, options.plays)
+                count = job.job_events.count()
+                start = time.time()
+                finalize(job, stats_event)
+                elapsed = time.time() - start
+                links = JobEvent.hosts.through.objects.filter(jobevent__job=job).count()
+                raise Rollback()
+        except Rollback:
+            pass
+        print('{:<10} {} events, {} host links: {:.3f}s'.format(name, count, links, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# Copyright (c) 2018 Ansible, Inc.
+# All Rights Reserved
+'''
+Feed ansible stdout through OutputEventFilter and report how many MB/s it
+scans, compared with the previous implementation that searched the whole
+buffered stdout whenever an event token was written.
+
+The stdout is read from a file with the raw output of ansible-playbook run
+with the awx_display callback plugin (--file; for example the
+artifacts/stdout file of an isolated job), or generated: --events job
+events, each preceded by --verbose-bytes of module output. Output of
+commands that redraw their progress contains erase line sequences (the
+\x1b[K that also delimits events); --erase-line-every adds one to every
+that many lines of module output.
+'''
+import base64
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from argparse import ArgumentParser
+from StringIO import StringIO
+
+# Django
+import django
+
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+if base_dir not in sys.path:
+    sys.path.insert(1, base_dir)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "awx.settings.development") # noqa
+django.setup() # noqa
+
+
+# awx
+from awx.main.utils import OutputEventFilter # noqa
+
+
+class PreviousOutputEventFilter(OutputEventFilter):
+
+    EVENT_DATA_RE = re.compile(r'\x1b\[K((?:[A-Za-z0-9+/=]+\x1b\[\d+D)+)\x1b\[K')
+
+    def __init__(self, event_callback):
+        super(PreviousOutputEventFilter, self).__init__(event_callback)
+        self._buffer = StringIO()
+        self._last_chunk = ''
+
+    def write(self, data):
+        self._buffer.write(data)
+        should_search = '\x1b[K' in (self._last_chunk + data)
+        self._last_chunk = data
+        while should_search:
+            value = self._buffer.getvalue()
+            match = self.EVENT_DATA_RE.search(value)
+            if not match:
+                break
+            try:
+                base64_data = re.sub(r'\x1b\[\d+D', '', match.group(1))
+                event_data = json.loads(base64.b64decode(base64_data))
+            except ValueError:
+                event_data = {}
+            self._emit_event(value[:match.start()], event_data)
+            remainder = value[match.end():]
+            self._buffer = StringIO()
+            self._buffer.write(remainder)
+            self._last_chunk = remainder
+
+    def close(self):
+        self._buffer = [self._buffer.getvalue()]
+        super(PreviousOutputEventFilter, self).close()
+
+
+def encode_event(data, max_width=78):
+    # pattern written by awx.lib.awx_display_callback.events.EventContext.dump
+    b64data = base64.b64encode(json.dumps(data))
+    chunks = ['\x1b[K']
+    for offset in range(0, len(b64data), max_width):
+        chunk = b64data[offset:offset + max_width]
+        chunks.append('{}\x1b[{}D'.format(chunk, len(chunk)))
+    chunks.append('\x1b[K')
+    return ''.join(chunks)
+
+
+def generate_stdout(n_events, verbose_bytes, erase_line_every):
+    line = '<localhost> EXEC /bin/sh -c \'echo ~ && sleep 0\'\n'
+    lines = [line] * (verbose_bytes // len(line) + 1)
+    if erase_line_every:
+        for i in range(0, len(lines), erase_line_every):
+            lines[i] = '\r\x1b[K' + line
+    verbose = ''.join(lines)[:verbose_bytes]
+    chunks = []
+    for i in range(n_events):
+        chunks.append(verbose)
+        chunks.append(encode_event({'uuid': str(uuid.uuid4())}))
+        chunks.append('\x1b[0;32mok: [host-{}]\x1b[0m\n'.format(i))
+        chunks.append(encode_event({}))
+    return ''.join(chunks)
+
+
+def scan(cls, stdout, chunk_size):
+    events = []
+    f = cls(events.append)
+    start = time.time()
+    for offset in range(0, len(stdout), chunk_size):
+        f.write(stdout[offset:offset + chunk_size])
+    f.close()
+    return time.time() - start, len(events)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--file', help='Raw ansible-playbook stdout to scan')
+    parser.add_argument('--events', type=int, default=1000, help='Number of events to generate')
+    parser.add_argument('--verbose-bytes', type=int, default=64 * 1024,
+                        help='Bytes of verbose output to generate before each event')
+    parser.add_argument('--erase-line-every', type=int, default=0,
+                        help='Add an erase line sequence to every that many lines of verbose output')
+    parser.add_argument('--chunk-size', type=int, default=4096, help='Bytes per write')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per filter; the best run is reported')
+    parser.add_argument('--skip-previous', action='store_true', help='Only time the current filter')
+    options = parser.parse_args()
+
+    if options.file:
+        with open(options.file) as f:
+            stdout = f.read()
+    else:
+        stdout = generate_stdout(options.events, options.verbose_bytes, options.erase_line_every)
+    megabytes = len(stdout) / 1024.0 / 1024.0
+
+    print('Scanning {:.1f} MB of stdout in writes of {} bytes'.format(megabytes, options.chunk_size))
+    filters = [('current', OutputEventFilter)]
+    if not options.skip_previous:
+        filters.append(('previous', PreviousOutputEventFilter))
+    for name, cls in filters:
+        elapsed, n_events = min(scan(cls, stdout, options.chunk_size) for i in range(options.repeat))
+        print('{:<10} {:>10.1f} MB/sec ({:.3f}s, {} events)'.format(name, megabytes / elapsed, elapsed, n_events))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# Copyright (c) 2018 Ansible, Inc.
+# All Rights Reserved
+'''
+Report the wall time and query count of task manager cycles with a
+backlog of pending jobs.
+
+For every requested backlog size, pending jobs are spread over
+--templates job templates, two scheduling cycles are timed (the second
+one sees the jobs the first one started) and everything written is
+rolled back. Jobs are not submitted to celery; starting a job only moves
+it to waiting and consumes capacity.
+'''
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+# Django
+import django
+
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+if base_dir not in sys.path:
+    sys.path.insert(1, base_dir)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "awx.settings.development") # noqa
+django.setup() # noqa
+
+
+from django.conf import settings # noqa
+from django.db import connection, transaction # noqa
+from django.test.utils import CaptureQueriesContext # noqa
+
+# awx
+from awx.main.models import ( # noqa
+    Instance, InstanceGroup, Inventory, Job, JobTemplate, Organization, Project
+)
+from awx.main.scheduler import TaskManager # noqa
+
+
+class Rollback(Exception):
+    pass
+
+
+class BenchmarkTaskManager(TaskManager):
+
+    def start_task(self, task, rampart_group, dependent_tasks=[]):
+        task.status = 'waiting'
+        if rampart_group is not None:
+            task.instance_group = rampart_group
+            self.consume_capacity(task, rampart_group.name)
+        task.save(update_fields=['status', 'instance_group'])
+
+
+def generate_backlog(n_jobs, n_templates, n_hosts, capacity):
+    instance = Instance.objects.create(hostname='task-manager-benchmark', capacity=capacity)
+    group = InstanceGroup.objects.create(name='task-manager-benchmark')
+    group.instances.add(instance)
+    organization = Organization.objects.create(name='task manager benchmark')
+    organization.instance_groups.add(group)
+    inventory = Inventory.objects.create(name='task manager benchmark', organization=organization)
+    inventory.hosts.model.objects.bulk_create([
+        inventory.hosts.model(name='host-{}'.format(i), inventory=inventory) for i in range(n_hosts)
+    ])
+    project = Project.objects.create(name='task manager benchmark', organization=organization,
+                                     playbook_files=['site.yml'])
+    templates = [
+        JobTemplate.objects.create(name='task manager benchmark {}'.format(i), inventory=inventory,
+                                   project=project, playbook='site.yml', allow_simultaneous=i % 2 == 0)
+        for i in range(n_templates)
+    ]
+    for i in range(n_jobs):
+        template = templates[i % n_templates]
+        Job.objects.create(name=template.name, job_template=template, inventory=inventory,
+                           project=project, playbook='site.yml', status='pending',
+                           allow_simultaneous=template.allow_simultaneous)
+
+
+def cycle():
+    with CaptureQueriesContext(connection) as queries:
+        start = time.time()
+        BenchmarkTaskManager()._schedule()
+        elapsed = time.time() - start
+    return elapsed, len(queries)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='Pending job backlog sizes to measure')
+    parser.add_argument('--templates', type=int, default=10, help='Number of job templates')
+    parser.add_argument('--hosts', type=int, default=10, help='Number of hosts in the inventory')
+    parser.add_argument('--capacity', type=int, default=100, help='Capacity of the benchmark instance')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Enable AWX_INCREMENTAL_TASK_MANAGER for the measured cycles')
+    options = parser.parse_args()
+    settings.AWX_INCREMENTAL_TASK_MANAGER = options.incremental
+
+    print('{:>8} {:>14} {:>10} {:>14} {:>10}'.format('pending', 'first cycle', 'queries', 'second cycle', 'queries'))
+    for n_jobs in options.jobs:
+        TaskManager.state.invalidate()
+        try:
+            with transaction.atomic():
+                generate_backlog(n_jobs, options.templates, options.hosts, options.capacity)
+                first, first_queries = cycle()
+                second, second_queries = cycle()
+                raise Rollback()
+        except Rollback:
+            pass
+        print('{:>8} {:>13.3f}s {:>10} {:>13.3f}s {:>10}'.format(
+            n_jobs, first, first_queries, second, second_queries))
+
+
+if __name__ == '__main__':
+    main()